@@ -0,0 +1,12 @@
+from dlgr.griduniverse.simulation import FoodSeekingPolicy, RandomPolicy, Simulation
+
+iterations = 10
+
+for seed in range(iterations):
+    simulation = Simulation(
+        [FoodSeekingPolicy(), FoodSeekingPolicy(), RandomPolicy()],
+        config={"time_per_round": 100.0, "num_rounds": 2},
+        seed=seed,
+    )
+    results = simulation.run()
+    print(results)
@@ -0,0 +1,385 @@
+"""Many Griduniverse games stepped in lockstep.
+
+``BatchEnvironment`` holds a batch of independent games with the same
+configuration in stacked NumPy arrays, one leading axis entry per game, and
+applies the rules of ``Player.move``, ``Gridworld.consume`` and
+``Gridworld.compute_payoffs`` to the whole batch at once. Its API follows
+Gym's vectorized environments::
+
+    env = BatchEnvironment(64, num_players=4, seed=1)
+    observation = env.reset()
+    while True:
+        actions = numpy.random.randint(len(ACTIONS), size=env.action_shape)
+        observation, rewards, dones, info = env.step(actions)
+        if dones.all():
+            break
+
+Only the core of the game is modelled: moving, with its cost, speed limit
+and tremble; consuming non-interactive items, with maturation, respawning,
+public goods and relative deprivation; rounds; and payoffs. Interactive
+items, transitions, contagion, donations, building walls and the timed
+replenishment of items are not.
+"""
+import random
+
+import numpy
+
+from .maze import labyrinth
+from .simulation import build_grid
+
+# The actions players can take, indexed by their code in ``step``
+ACTIONS = ("stay", "up", "down", "left", "right")
+MOVES = numpy.array([[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]])
+
+
+def _proportions(powered, groups, size):
+    """Return the ``experiment.softmax`` proportion of its group's total
+    for each value, given the values raised to the temperature in
+    ``powered``, the group of each in ``groups`` and the number of values
+    in each group in ``size``.
+    """
+    totals = numpy.zeros(size.shape)
+    numpy.add.at(totals, (numpy.arange(len(powered))[:, None], groups), powered)
+    group_total = numpy.take_along_axis(totals, groups, axis=1)
+    group_size = numpy.take_along_axis(size, groups, axis=1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.where(group_total != 0, powered / group_total, group_size)
+
+
+class BatchEnvironment(object):
+    """``num_envs`` games of Griduniverse between ``num_players`` players.
+
+    ``config`` and ``game_config`` configure the games as for
+    ``simulation.Simulation``; each ``step`` advances every game by
+    ``1 / tick_rate`` seconds. Given a ``seed``, the batch is
+    reproducible.
+
+    The state of the games is held in arrays whose first axis is the game:
+    ``walls`` and ``items`` of shape (num_envs, rows, columns), where
+    ``items`` holds the code of the type of the item in each cell, its
+    index in ``item_types`` plus one, or 0 if there is none; and
+    ``positions``, of shape (num_envs, num_players, 2), ``scores``,
+    ``payoffs`` and ``colors``, of shape (num_envs, num_players).
+    """
+
+    def __init__(
+        self,
+        num_envs,
+        num_players,
+        config=None,
+        game_config=None,
+        tick_rate=10.0,
+        seed=None,
+    ):
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.tick_rate = tick_rate
+        self.seed = seed
+        # The batch's own generators, rather than the global ones
+        self.rng = random.Random(seed)
+        self.numpy_rng = numpy.random.default_rng(seed)
+
+        config = dict(config or {})
+        config.setdefault("max_participants", num_players)
+        self.grid = grid = build_grid(
+            config, game_config, rng=self.rng, numpy_rng=self.numpy_rng
+        )
+        self.shape = (num_envs, grid.rows, grid.columns)
+        self.action_shape = (num_envs, num_players)
+
+        # Properties of each item type, indexed by code
+        self.item_types = list(grid.item_config.values())
+        types = [{}] + self.item_types
+
+        def column(name, default=0.0):
+            return numpy.array([item_type.get(name, default) for item_type in types])
+
+        self.calories = column("calories")
+        self.public_good = column("public_good")
+        self.respawn = column("respawn", False).astype(bool)
+        self.maturation_threshold = column("maturation_threshold")
+        self.maturation_speed = column("maturation_speed")
+        self.edible = ~column("interactive", False).astype(bool) & (self.calories != 0)
+        self.edible[0] = False
+        self.item_weights = [None] + [
+            self._weights(item_type.get("distribution")) for item_type in types[1:]
+        ]
+        self.player_weights = self._weights(grid.player_config.get("distribution"))
+
+    def _weights(self, distribution):
+        weights = getattr(distribution, "weights", None)
+        if weights is None:
+            return numpy.ones(self.shape[1] * self.shape[2])
+        return numpy.asarray(weights, dtype=float).ravel()
+
+    def reset(self):
+        """Start a new game in each environment, and return the first
+        ``observation``.
+        """
+        grid = self.grid
+        num_envs, rows, columns = self.shape
+        self.time = 0.0
+        self.round = 0
+        self.round_start = 0.0
+        self.items_consumed = numpy.zeros(num_envs, dtype=int)
+
+        self.walls = numpy.zeros(self.shape, dtype=bool)
+        if grid.walls_density:
+            for walls in self.walls:
+                for wall in labyrinth(
+                    columns=columns,
+                    rows=rows,
+                    density=grid.walls_density,
+                    contiguity=grid.walls_contiguity,
+                    rng=self.rng,
+                ):
+                    walls[tuple(wall.position)] = True
+
+        self.items = numpy.zeros(self.shape, dtype=numpy.int16)
+        self.item_times = numpy.zeros(self.shape)
+        # No players yet, while the items are placed
+        self.positions = numpy.zeros((num_envs, 0, 2), dtype=int)
+        for code, item_type in enumerate(self.item_types, 1):
+            count = int(item_type.get("item_count", 0))
+            self._spawn_items(code, numpy.full(num_envs, count))
+
+        cells, found = self._sample_cells(
+            self._empty(), self.num_players, self.player_weights
+        )
+        if not found.all():
+            raise ValueError("There is no room on the grid for the players.")
+        self.positions = numpy.stack(divmod(cells, columns), axis=-1)
+        self.colors = self.numpy_rng.integers(grid.num_colors, size=self.action_shape)
+        self.scores = numpy.full(self.action_shape, float(grid.initial_score))
+        self.payoffs = numpy.zeros(self.action_shape)
+        self.motion_timestamps = numpy.zeros(self.action_shape)
+        return self.observation()
+
+    def observation(self):
+        """Return copies of the arrays holding the state of the games."""
+        return {
+            "walls": self.walls.copy(),
+            "items": self.items.copy(),
+            "positions": self.positions.copy(),
+            "colors": self.colors.copy(),
+            "scores": self.scores.copy(),
+            "payoffs": self.payoffs.copy(),
+        }
+
+    @property
+    def game_over(self):
+        return self.round >= self.grid.num_rounds
+
+    @property
+    def consumption_active(self):
+        return not self.grid.alternate_consumption_donation or not self.round % 2
+
+    def step(self, actions):
+        """Have every player take an action, an array of shape
+        (num_envs, num_players) of codes from ``ACTIONS``, and advance the
+        games by one tick.
+
+        Returns the ``observation``, the change in each player's score, an
+        array which is true for the games that are over, and a dict of
+        information about the step.
+        """
+        actions = numpy.asarray(actions)
+        if actions.shape != self.action_shape:
+            raise ValueError(
+                "Expected actions of shape {}, not {}.".format(
+                    self.action_shape, actions.shape
+                )
+            )
+        previous_scores = self.scores.copy()
+
+        # The same phases as ``simulation.Simulation.step``
+        moved = self._move(actions)
+        if self.consumption_active:
+            self._consume()
+        self._compute_payoffs()
+        self._check_round_completion()
+        self.time += 1.0 / self.tick_rate
+
+        rewards = self.scores - previous_scores
+        dones = numpy.full(self.num_envs, self.game_over)
+        info = {"round": self.round, "time": self.time, "moved": moved}
+        return self.observation(), rewards, dones, info
+
+    def _player_mask(self):
+        mask = numpy.zeros(self.shape, dtype=bool)
+        envs = numpy.arange(self.num_envs)[:, None]
+        mask[envs, self.positions[..., 0], self.positions[..., 1]] = True
+        return mask
+
+    def _empty(self):
+        """Return a boolean array of shape (num_envs, rows * columns) which
+        is true for the empty cells.
+        """
+        empty = ~self.walls & (self.items == 0) & ~self._player_mask()
+        return empty.reshape(self.num_envs, -1)
+
+    def _sample_cells(self, mask, count, weights):
+        """Draw ``count`` distinct cells for each game, in proportion to
+        ``weights``, from those where ``mask`` is true.
+
+        Returns the flat indexes of the cells, of shape (num_envs, count),
+        and an array which is false where a game ran out of cells.
+        """
+        count = min(count, mask.shape[1])
+        # Perturbing log weights with Gumbel noise and taking the top
+        # ``count`` samples without replacement.
+        with numpy.errstate(divide="ignore"):
+            keys = numpy.log(weights) - numpy.log(
+                -numpy.log(self.numpy_rng.random(mask.shape))
+            )
+        keys[~mask] = -numpy.inf
+        if count < mask.shape[1]:
+            cells = numpy.argpartition(-keys, count, axis=1)[:, :count]
+        else:
+            cells = numpy.argsort(-keys, axis=1)
+        found = numpy.take_along_axis(keys, cells, axis=1) > -numpy.inf
+        return cells, found
+
+    def _spawn_items(self, code, counts):
+        """Spawn ``counts[i]`` items of type ``code`` in game ``i``."""
+        if not counts.any():
+            return
+        cells, found = self._sample_cells(
+            self._empty(), int(counts.max()), self.item_weights[code]
+        )
+        found &= numpy.arange(cells.shape[1]) < counts[:, None]
+        envs = numpy.nonzero(found)[0]
+        rows, columns = divmod(cells[found], self.shape[2])
+        self.items[envs, rows, columns] = code
+        self.item_times[envs, rows, columns] = self.time
+
+    def _move(self, actions):
+        """Move the players, one after another as in the game loop, and
+        return a boolean array of the moves made.
+        """
+        grid = self.grid
+        envs = numpy.arange(self.num_envs)
+        moved = numpy.zeros(self.action_shape, dtype=bool)
+
+        if grid.motion_tremble_rate:
+            tremble = (actions > 0) & (
+                self.numpy_rng.random(actions.shape) < grid.motion_tremble_rate
+            )
+            other = (
+                actions - 1 + self.numpy_rng.integers(1, 4, size=actions.shape)
+            ) % 4 + 1
+            actions = numpy.where(tremble, other, actions)
+
+        elapsed = self.time - self.round_start
+        if grid.motion_speed_limit <= 0:
+            waited = numpy.ones(self.action_shape, dtype=bool)
+        else:
+            wait_time = 1.0 / grid.motion_speed_limit
+            waited = elapsed > self.motion_timestamps + wait_time
+
+        occupied = numpy.zeros(self.shape, dtype=int)
+        numpy.add.at(
+            occupied,
+            (envs[:, None], self.positions[..., 0], self.positions[..., 1]),
+            1,
+        )
+        limit = numpy.array(self.shape[1:]) - 1
+        for player in range(self.num_players):
+            action = actions[:, player]
+            position = self.positions[:, player]
+            target = numpy.clip(position + MOVES[action], 0, limit)
+            rows, columns = target[:, 0], target[:, 1]
+            allowed = (
+                (action > 0)
+                & waited[:, player]
+                & (self.scores[:, player] >= grid.motion_cost)
+                & ~self.walls[envs, rows, columns]
+            )
+            if not grid.player_overlap:
+                # Moving off the edge of the grid leaves the player where
+                # they are, a cell occupied by themselves.
+                allowed &= occupied[envs, rows, columns] == 0
+            if not allowed.any():
+                continue
+
+            movers = envs[allowed]
+            occupied[movers, position[allowed, 0], position[allowed, 1]] -= 1
+            occupied[movers, rows[allowed], columns[allowed]] += 1
+            self.positions[allowed, player] = target[allowed]
+            self.motion_timestamps[allowed, player] = elapsed
+            self.scores[allowed, player] -= grid.motion_cost
+            moved[:, player] = allowed
+        return moved
+
+    def _consume(self):
+        """Players consume the edible items in their cells."""
+        grid = self.grid
+        envs = numpy.arange(self.num_envs)
+        public_good = numpy.zeros(self.num_envs)
+        respawn = numpy.zeros((self.num_envs, len(self.calories)), dtype=int)
+        for player in range(self.num_players):
+            rows, columns = self.positions[:, player, 0], self.positions[:, player, 1]
+            codes = self.items[envs, rows, columns]
+            edible = self.edible[codes]
+            if not edible.any():
+                continue
+            age = self.time - self.item_times[envs, rows, columns]
+            maturity = numpy.round(
+                1 - numpy.exp(-age * self.maturation_speed[codes]), 1
+            )
+            edible &= maturity >= self.maturation_threshold[codes]
+            if not edible.any():
+                continue
+
+            eaten = codes[edible]
+            self.items[envs[edible], rows[edible], columns[edible]] = 0
+            deprivation = numpy.where(
+                self.colors[edible, player] > 0, 1.0, grid.relative_deprivation
+            )
+            self.scores[edible, player] += self.calories[eaten] * deprivation
+            public_good[edible] += self.public_good[eaten]
+            numpy.add.at(respawn, (envs[edible], eaten), self.respawn[eaten])
+            self.items_consumed += edible
+
+        self.scores += public_good[:, None]
+        for code in range(1, len(self.calories)):
+            self._spawn_items(code, respawn[:, code])
+
+    def _compute_payoffs(self):
+        """Compute payoffs from scores, as in ``Gridworld.compute_payoffs``."""
+        grid = self.grid
+        envs = numpy.arange(self.num_envs)[:, None]
+        num_groups = len(grid.player_colors)
+        size = numpy.zeros((self.num_envs, num_groups))
+        numpy.add.at(size, (envs, self.colors), 1)
+
+        intra = _proportions(
+            self.scores**grid.intragroup_competition,
+            self.colors,
+            size,
+        )
+        group_scores = numpy.zeros((self.num_envs, num_groups))
+        numpy.add.at(group_scores, (envs, self.colors), self.scores)
+        powered = group_scores**grid.intergroup_competition
+        total = powered.sum(axis=1, keepdims=True)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            inter = numpy.where(total != 0, powered / total, float(num_groups))
+
+        self.payoffs = (
+            self.scores.sum(axis=1, keepdims=True)
+            * intra
+            * numpy.take_along_axis(inter, self.colors, axis=1)
+            * grid.dollars_per_point
+        )
+
+    def _check_round_completion(self):
+        grid = self.grid
+        if self.time - self.round_start < grid.time_per_round:
+            return
+        self.round += 1
+        if self.game_over:
+            return
+        self.round_start = self.time
+        if grid.leaderboard_individual or grid.leaderboard_group:
+            self.round_start += grid.leaderboard_time
+        self.motion_timestamps[:] = 0
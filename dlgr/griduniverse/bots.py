@@ -20,6 +20,7 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
 
+from .broadcast import apply_state
 from .maze_utils import find_path_astar, maze_to_graph, positions_to_maze
 
 logger = logging.getLogger("griduniverse")
@@ -323,10 +324,19 @@ class HighPerformanceBaseGridUniverseBot(HighPerformanceBotBase, BaseGridUnivers
         channel, payload = message.split(":", 1)
         data = json.loads(payload)
         if channel == "quorum":
-            handler = "handle_quorum"
+            self.handle_quorum(data)
         else:
-            handler = "handle_{}".format(data["type"])
-        getattr(self, handler, lambda x: None)(data)
+            self.handle(data)
+
+    def handle(self, data):
+        """Pass a message from the server to its handler, if there is one."""
+        handler = getattr(self, "handle_{}".format(data["type"]), lambda x: None)
+        handler(data)
+
+    def handle_batch(self, data):
+        """Handle each of a batch of messages the server sent together."""
+        for message in data["messages"]:
+            self.handle(message)
 
     def publish(self, message):
         """Sends a message from this bot to the `griduniverse_ctrl` channel."""
@@ -335,16 +345,38 @@ class HighPerformanceBaseGridUniverseBot(HighPerformanceBotBase, BaseGridUnivers
     def handle_state(self, data):
         """Receive a grid state update an store it"""
         if "grid" in data:
-            # grid is a json encoded dictionary, we want to selectively
-            # update this rather than overwrite it as not all grid changes
-            # are sent each time (such as food and walls)
-            data["grid"] = json.loads(data["grid"])
-            if "grid" not in self.grid:
-                self.grid["grid"] = {}
-            self.grid["grid"].update(data["grid"])
-            data["grid"] = self.grid["grid"]
+            # grid is a dictionary, usually holding only the changes since
+            # the previous state, which we apply to our copy of the full
+            # state. Older servers and replays send it encoded as JSON.
+            payload = data["grid"]
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            state = apply_state(self.grid.get("grid"), payload)
+            if state is None:
+                # We missed a delta, so ask the server for a keyframe
+                self.publish({"type": "state_resync", "player_id": self.participant_id})
+                del data["grid"]
+            else:
+                data["grid"] = state
         self.grid.update(data)
 
+    def handle_room(self, data):
+        """Listen on the channel of the room the server routed us to."""
+        from dallinger.experiment_server.sockets import chat_backend
+
+        if data["player_id"] == self.participant_id:
+            chat_backend.subscribe(self, data["channel"])
+
+    def handle_player_channel(self, data):
+        """Listen on the channel of the messages meant for us only, which
+        is also where our view of the grid is sent when the room sends each
+        player only what they can see.
+        """
+        from dallinger.experiment_server.sockets import chat_backend
+
+        if data["player_id"] == self.participant_id:
+            chat_backend.subscribe(self, data["channel"])
+
     def handle_stop(self, data):
         """Receive an update that the round has finished and mark the
         remaining time as zero"""
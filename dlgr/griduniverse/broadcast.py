@@ -0,0 +1,159 @@
+"""Incremental broadcasting of the grid state to clients."""
+
+
+def _item_key(item):
+    return tuple(item["position"])
+
+
+def _wall_key(wall):
+    if isinstance(wall, dict):
+        return tuple(wall["position"])
+    return tuple(wall)
+
+
+def _diff(previous, current):
+    """Return the values of ``current`` that are new or changed relative to
+    ``previous``, and the keys of ``previous`` which are gone.
+    """
+    changed = [value for key, value in current.items() if previous.get(key) != value]
+    removed = [key for key in previous if key not in current]
+    return changed, removed
+
+
+class StateTracker(object):
+    """Tracks the grid state which has been sent to clients.
+
+    Each call to ``update`` returns a versioned payload containing only the
+    players, items and walls which changed since the previous call. Every
+    ``keyframe_interval`` updates, or after a resync has been requested, the
+    payload is instead a keyframe holding the complete state.
+    """
+
+    def __init__(self, keyframe_interval=50):
+        self.keyframe_interval = keyframe_interval
+        self.version = 0
+        self.players = {}
+        self.items = {}
+        self.walls = {}
+        self._updates_since_keyframe = 0
+        self._resync_requested = True
+
+    def request_keyframe(self):
+        """Make the next update a keyframe, e.g. for a client who joined late
+        or missed a delta.
+        """
+        self._resync_requested = True
+
+    @property
+    def keyframe_due(self):
+        return (
+            self._resync_requested
+            or self._updates_since_keyframe >= self.keyframe_interval
+        )
+
+    def update(self, grid_state):
+        """Return the payload to send for ``grid_state``.
+
+        ``grid_state`` is the output of ``Gridworld.serialize``. Items and
+        walls may be left out when they are known to be unchanged, but must
+        be included whenever ``keyframe_due`` is true.
+        """
+        keyframe = self.keyframe_due
+        self.version += 1
+        payload = {
+            key: value
+            for key, value in grid_state.items()
+            if key not in ("players", "items", "walls")
+        }
+        payload["version"] = self.version
+        payload["keyframe"] = keyframe
+
+        players = {player["id"]: player for player in grid_state["players"]}
+        if keyframe:
+            payload["players"] = grid_state["players"]
+            payload["items"] = grid_state["items"]
+            payload["walls"] = grid_state["walls"]
+            self.players = players
+            self.items = {_item_key(item): item for item in grid_state["items"]}
+            self.walls = {_wall_key(wall): wall for wall in grid_state["walls"]}
+            self._updates_since_keyframe = 0
+            self._resync_requested = False
+            return payload
+
+        payload["base_version"] = self.version - 1
+        payload["players"], players_removed = _diff(self.players, players)
+        if players_removed:
+            payload["players_removed"] = players_removed
+        self.players = players
+
+        if "items" in grid_state:
+            items = {_item_key(item): item for item in grid_state["items"]}
+            items_changed, items_removed = _diff(self.items, items)
+            if items_changed:
+                payload["items_changed"] = items_changed
+            if items_removed:
+                payload["items_removed"] = [list(key) for key in items_removed]
+            self.items = items
+
+        if "walls" in grid_state:
+            walls = {_wall_key(wall): wall for wall in grid_state["walls"]}
+            walls_added = [wall for key, wall in walls.items() if key not in self.walls]
+            if walls_added:
+                payload["walls_added"] = walls_added
+            self.walls = walls
+
+        self._updates_since_keyframe += 1
+        return payload
+
+
+def apply_state(state, payload):
+    """Apply a payload produced by ``StateTracker.update`` to a complete
+    grid state, returning the new complete state.
+
+    Returns ``None`` if the payload is a delta which can't be applied to
+    ``state``, in which case a keyframe should be requested.
+    """
+    if "version" not in payload:
+        # Unversioned states (e.g. from replays) only omit unchanged sections
+        merged = dict(state or {})
+        merged.update(payload)
+        return merged
+
+    if payload["keyframe"]:
+        return dict(payload)
+
+    if not state or state.get("version") != payload["base_version"]:
+        return None
+
+    merged = dict(state)
+    merged.update(
+        {
+            key: value
+            for key, value in payload.items()
+            if key
+            not in (
+                "players",
+                "players_removed",
+                "items_changed",
+                "items_removed",
+                "walls_added",
+            )
+        }
+    )
+
+    players = {player["id"]: player for player in state.get("players", [])}
+    for player_id in payload.get("players_removed", ()):
+        players.pop(player_id, None)
+    for player in payload["players"]:
+        players[player["id"]] = player
+    merged["players"] = list(players.values())
+
+    items = {_item_key(item): item for item in state.get("items", [])}
+    for position in payload.get("items_removed", ()):
+        items.pop(tuple(position), None)
+    for item in payload.get("items_changed", ()):
+        items[_item_key(item)] = item
+    merged["items"] = list(items.values())
+
+    merged["walls"] = list(state.get("walls", [])) + payload.get("walls_added", [])
+    return merged
@@ -1,86 +1,230 @@
-import random
+"""Probability distributions over the cells of the grid, used to place items
+and players.
+
+A distribution is configured by name, optionally followed by arguments,
+e.g. "sinusoidal 15". ``get_distribution`` returns the distribution for a
+grid of a given size, which computes the relative weight of every cell once
+and then draws any number of positions from it with ``sample``.
+
+The ``[name]_probability_distribution`` functions draw a single position
+from the distribution called ``name``. Custom distributions can still be
+added as functions with such a name, which ``get_distribution`` falls back
+to.
+"""
+import functools
 
 import numpy
 
 
-def _is_valid_boundary(rows, columns, row, column):
-    """Truncate random sample"""
-    if row < rows and row >= 0 and column < columns and column >= 0:
-        return True
-    return False
+def _normal(size, mu, sigma):
+    return numpy.exp(-((numpy.arange(size) - mu) ** 2) / (2.0 * sigma**2))
+
+
+class Distribution(object):
+    """A probability distribution over the cells of a ``rows`` by
+    ``columns`` grid.
+
+    Subclasses implement ``_weights``, returning an array of shape
+    (rows, columns) of the relative probability of each cell. The weights
+    and their cumulative distribution are computed once, on construction,
+    and are available as ``weights`` for masking or visualization.
+    """
+
+    def __init__(self, rows, columns, *args):
+        self.rows = rows
+        self.columns = columns
+        self.args = args
+        self.weights = self._weights()
+        cdf = numpy.cumsum(self.weights.ravel(), dtype=float)
+        self.cdf = cdf / cdf[-1]
+
+    def _weights(self):
+        raise NotImplementedError()
+
+    def _positions(self, cells):
+        return [[int(cell) // self.columns, int(cell) % self.columns] for cell in cells]
+
+    def sample(self, n=1, mask=None, rng=None):
+        """Return ``n`` [row, column] positions drawn from the distribution.
+
+        If ``mask`` is given, the positions are distinct cells where
+        ``mask`` is true, and fewer than ``n`` are returned if there aren't
+        enough of them. They are drawn with ``rng``, a
+        ``numpy.random.Generator``, or else ``numpy.random``.
+        """
+        if rng is None:
+            rng = numpy.random
+        if mask is None:
+            cells = numpy.searchsorted(self.cdf, rng.random(n), side="right")
+            return self._positions(cells)
+
+        p = (self.weights * mask).ravel()
+        candidates = numpy.count_nonzero(p)
+        if not candidates:
+            return []
+        cells = rng.choice(
+            p.size, size=min(n, candidates), replace=False, p=p / p.sum()
+        )
+        return self._positions(cells)
+
+
+class RandomDistribution(Distribution):
+    def _weights(self):
+        return numpy.ones((self.rows, self.columns))
+
+
+class SinusoidalDistribution(Distribution):
+    def _weights(self):
+        frequency = 10
+        if len(self.args):
+            try:
+                frequency = int(self.args[0])
+            except ValueError:
+                pass
+        grid = numpy.tile(numpy.linspace(0, 1, self.columns), (self.rows, 1))
+        return 0.5 + 0.5 * numpy.sin(frequency * grid)
+
+
+class HorizontalGradientDistribution(Distribution):
+    """Linearly increasing towards the last row"""
+
+    def _weights(self):
+        row_weights = 2 * numpy.arange(self.rows) + 1.0
+        return numpy.tile(row_weights[:, numpy.newaxis], (1, self.columns))
+
+
+class VerticalGradientDistribution(Distribution):
+    """Linearly increasing towards the last column"""
+
+    def _weights(self):
+        column_weights = 2 * numpy.arange(self.columns) + 1.0
+        return numpy.tile(column_weights, (self.rows, 1))
+
+
+class EdgeBiasDistribution(Distribution):
+    """Highest along the edges, falling off as a normal distribution"""
+
+    sigma = 15
+
+    def _weights(self):
+        rows, columns = self.rows, self.columns
+        row_distance = numpy.arange(rows)
+        row_distance = numpy.minimum(row_distance, rows - 1 - row_distance)
+        column_distance = numpy.arange(columns)
+        column_distance = numpy.minimum(column_distance, columns - 1 - column_distance)
+        scale = 2.0 * self.sigma**2
+        row_weights = numpy.exp(-(row_distance**2) / scale)
+        column_weights = numpy.exp(-(column_distance**2) / scale)
+        return row_weights[:, numpy.newaxis] + column_weights[numpy.newaxis, :]
+
+
+class CenterBiasDistribution(Distribution):
+    """Normal distribution in two dimensions"""
+
+    sigma = 15
+
+    def _weights(self):
+        mu = self.rows / 2
+        row_weights = _normal(self.rows, mu, self.sigma)
+        column_weights = _normal(self.columns, mu, self.sigma)
+        return row_weights[:, numpy.newaxis] * column_weights[numpy.newaxis, :]
+
+
+class FunctionDistribution(object):
+    """A distribution given by a custom ``[name]_probability_distribution``
+    function, which returns a single [row, column] position per call.
+
+    Its weights are unknown, so ``weights`` is None and masked samples are
+    found by drawing from the function until enough cells are accepted, or
+    ``max_attempts`` draws per position have been made. The function draws
+    its own random numbers, so ``rng`` is ignored.
+    """
+
+    weights = None
+    max_attempts = 1000
+
+    def __init__(self, function, rows, columns, *args):
+        self.function = function
+        self.rows = rows
+        self.columns = columns
+        self.args = args
+
+    def sample(self, n=1, mask=None, rng=None):
+        if mask is None:
+            return [
+                self.function(self.rows, self.columns, *self.args) for _ in range(n)
+            ]
+
+        positions = []
+        chosen = set()
+        n = min(n, int(mask.sum()))
+        for _ in range(n * self.max_attempts):
+            if len(positions) == n:
+                break
+            position = self.function(self.rows, self.columns, *self.args)
+            if tuple(position) not in chosen and mask[tuple(position)]:
+                chosen.add(tuple(position))
+                positions.append(position)
+        return positions
+
+
+DISTRIBUTIONS = {
+    "random": RandomDistribution,
+    "sinusoidal": SinusoidalDistribution,
+    "horizontal_gradient": HorizontalGradientDistribution,
+    "vertical_gradient": VerticalGradientDistribution,
+    "edge_bias": EdgeBiasDistribution,
+    "center_bias": CenterBiasDistribution,
+}
+
+
+def get_distribution(name, rows, columns, *args):
+    """Return the distribution called ``name`` over a ``rows`` by ``columns``
+    grid, or None if there is no such distribution.
+
+    Distributions without arguments are shared between all callers asking
+    for the same name and size. Those with arguments are made afresh, so
+    that the cache can't grow with every argument passed.
+    """
+    if args:
+        return _make_distribution(name, rows, columns, *args)
+    return _shared_distribution(name, rows, columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_distribution(name, rows, columns):
+    return _make_distribution(name, rows, columns)
+
+
+def _make_distribution(name, rows, columns, *args):
+    if name in DISTRIBUTIONS:
+        return DISTRIBUTIONS[name](rows, columns, *args)
+    function = globals().get(f"{name}_probability_distribution")
+    if function is not None:
+        return FunctionDistribution(function, rows, columns, *args)
+    return None
 
 
 def random_probability_distribution(rows, columns, *args):
     """A probability distribution function always returns a [row, column] pair."""
-    row = random.randint(0, rows - 1)
-    column = random.randint(0, columns - 1)
-    return [row, column]
+    return get_distribution("random", rows, columns, *args).sample()[0]
 
 
 def sinusoidal_probability_distribution(rows, columns, *args):
-    frequency = 10
-    if len(args):
-        try:
-            frequency = int(args[0])
-        except ValueError:
-            pass
-    grid = numpy.tile(numpy.linspace(0, 1, columns), (rows, 1))
-    p = 0.5 + 0.5 * numpy.sin(frequency * grid)
-    p = p / numpy.sum(p)
-    value = numpy.random.choice(rows * columns, p=p.flatten())
-    row = value / columns
-    column = value - (row * columns)
-    return [int(row), int(column)]
+    return get_distribution("sinusoidal", rows, columns, *args).sample()[0]
 
 
 def horizontal_gradient_probability_distribution(rows, columns, *args):
-    """Vertical gradient on the x axis"""
-    size = columns - 1
-    column = random.randint(0, size)
-    row = random.triangular(0, size, size)
-    return [int(row), int(column)]
+    return get_distribution("horizontal_gradient", rows, columns, *args).sample()[0]
 
 
 def vertical_gradient_probability_distribution(rows, columns, *args):
-    """Vertical gradient on the y axis"""
-    size = rows - 1
-    row = random.randint(0, size)
-    column = random.triangular(0, size, size)
-    return [int(row), int(column)]
+    return get_distribution("vertical_gradient", rows, columns, *args).sample()[0]
 
 
 def edge_bias_probability_distribution(rows, columns, *args):
-    """Do the inverse to a normal distribution"""
-    mu = rows / 2  # mean
-    sigma = 15  # standard deviation
-    row = numpy.random.normal(mu, sigma)
-    column = numpy.random.normal(mu, sigma)
-    valid = False
-    while not valid:
-        if row > mu and column > mu:
-            row = mu + numpy.random.normal(mu, sigma)
-            column = random.randint(0, columns - 1)
-        elif row > mu and column < mu:
-            row = abs(numpy.random.normal(mu, sigma) - mu)
-            column = random.randint(0, columns - 1)
-        elif row < mu and column > mu:
-            column = mu + numpy.random.normal(mu, sigma)
-            row = random.randint(0, columns - 1)
-        else:
-            column = abs(numpy.random.normal(mu, sigma) - mu)
-            row = random.randint(0, columns - 1)
-        valid = _is_valid_boundary(rows, columns, row, column)
-    return [int(row), int(column)]
+    return get_distribution("edge_bias", rows, columns, *args).sample()[0]
 
 
 def center_bias_probability_distribution(rows, columns, *args):
-    """Do normal distribution in two dimensions"""
-    mu = rows / 2  # mean
-    sigma = 15  # standard deviation
-    valid = False
-    while not valid:
-        row = numpy.random.normal(mu, sigma)
-        column = numpy.random.normal(mu, sigma)
-        # Create some cutoff for values
-        valid = _is_valid_boundary(rows, columns, row, column)
-    return [int(row), int(column)]
+    return get_distribution("center_bias", rows, columns, *args).sample()[0]
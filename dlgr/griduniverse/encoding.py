@@ -0,0 +1,391 @@
+"""JSON encoding of the messages sent to clients.
+
+``dumps`` and ``loads`` use orjson when it is installed, which is several
+times faster than the standard library, and fall back to ``json``
+otherwise. Install it with the ``fast`` extra::
+
+    pip install dlgr.griduniverse[fast]
+
+``StateEncoder`` encodes the state messages broadcast many times a second
+in a single pass, reusing the encoding of the walls if they haven't
+changed since the previous message.
+
+``BinaryStateEncoder`` instead packs the grid of state messages in a
+compact binary format described by ``SCHEMA``, which is sent to clients
+when they connect. See ``pack_grid`` for the layout.
+"""
+import base64
+import json
+import logging
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger("griduniverse")
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(value):
+    """Return ``value`` encoded as a JSON string."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            # orjson is stricter than json, e.g. about the size of integers
+            pass
+    return json.dumps(value, separators=(",", ":"))
+
+
+def loads(text):
+    """Return the value encoded in the JSON string ``text``."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class StateEncoder(object):
+    """Encodes state messages, whose ``grid`` is a payload from
+    ``broadcast.StateTracker.update``.
+
+    The encoding of the complete list of walls in keyframes is kept and
+    reused as long as it is unchanged. Players aren't: deltas only hold the
+    players who have changed, and comparing a player with the last one sent
+    costs about as much as encoding them again.
+    """
+
+    def __init__(self):
+        self._walls = (None, None)
+
+    def encode(self, message):
+        """Return the state ``message`` encoded as a JSON string."""
+        fields = []
+        for key, value in message["grid"].items():
+            if key == "walls":
+                encoded = self._encode_walls(value)
+            else:
+                encoded = dumps(value)
+            fields.append("{}:{}".format(dumps(key), encoded))
+        grid = "{" + ",".join(fields) + "}"
+
+        header = dumps({key: value for key, value in message.items() if key != "grid"})
+        if header == "{}":
+            return '{"grid":' + grid + "}"
+        return header[:-1] + ',"grid":' + grid + "}"
+
+    def _encode_walls(self, walls):
+        if self._walls[0] != walls:
+            self._walls = (walls, dumps(walls))
+        return self._walls[1]
+
+
+# How the records in state payloads are packed in the binary format. Each
+# field is one of:
+#
+#   int   a signed 32 bit integer, or null
+#   num   a 64 bit float, or null, packed as NaN
+#   bool  a byte: 0, 1, or 2 for null
+#   val   a 16 bit index into the table of JSON values sent to the client
+#   pos   a [row, column] pair of 16 bit integers, or null
+#
+# or the name of a record, preceded by a byte which is 0 if it is null.
+SCHEMA = {
+    "version": 1,
+    "records": {
+        "item": [
+            ["id", "int"],
+            ["item_id", "val"],
+            ["position", "pos"],
+            ["maturity", "num"],
+            ["creation_timestamp", "num"],
+            ["remaining_uses", "int"],
+        ],
+        "player": [
+            ["id", "int"],
+            ["position", "pos"],
+            ["score", "num"],
+            ["payoff", "num"],
+            ["color", "val"],
+            ["motion_auto", "bool"],
+            ["motion_direction", "val"],
+            ["motion_speed_limit", "num"],
+            ["motion_timestamp", "num"],
+            ["name", "val"],
+            ["identity_visible", "bool"],
+            ["recruiter_id", "val"],
+            ["current_item", "item"],
+        ],
+        "wall": [
+            ["position", "pos"],
+            ["color", "val"],
+        ],
+    },
+    # Walls of the default color are serialized as bare positions
+    "bare": {"wall": "position"},
+    # The kind of the elements of each list in the payload which is packed
+    "sections": {
+        "players": "player",
+        "players_removed": "int",
+        "items": "item",
+        "items_changed": "item",
+        "items_removed": "pos",
+        "walls": "wall",
+        "walls_added": "wall",
+    },
+}
+
+_FORMATS = {"int": "i", "num": "d", "bool": "B", "val": "H", "pos": "HH"}
+_NULL_INT = -(2**31)
+_NULL_POS = 0xFFFF
+
+
+class ValueTable(object):
+    """The JSON values, such as player names and colors, which have been
+    sent to a client, and are referred to by their index in the table.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    @staticmethod
+    def _key(value):
+        if isinstance(value, (list, dict)):
+            return dumps(value)
+        # Keep e.g. 1, 1.0 and True apart
+        return (type(value), value)
+
+    def index(self, value):
+        key = self._key(value)
+        index = self._indexes.get(key)
+        if index is None:
+            index = len(self.values)
+            if index >= 0xFFFF:
+                raise ValueError("Too many distinct values to pack")
+            self._indexes[key] = index
+            self.values.append(value)
+        return index
+
+    def truncate(self, length):
+        """Forget the values after the first ``length``."""
+        for value in self.values[length:]:
+            del self._indexes[self._key(value)]
+        del self.values[length:]
+
+
+class _Packer(object):
+    """Collects the struct format and arguments of a packed payload."""
+
+    def __init__(self, schema, table):
+        self.schema = schema
+        self.table = table
+        self.format = ["<"]
+        self.args = []
+
+    def pack(self, kind, value):
+        if kind in self.schema["records"]:
+            self.format.append("B")
+            self.args.append(value is not None)
+            if value is not None:
+                self.pack_record(kind, value)
+            return
+        self.format.append(_FORMATS[kind])
+        if kind == "int":
+            if value is None:
+                value = _NULL_INT
+            elif (
+                isinstance(value, bool)
+                or not isinstance(value, int)
+                or not _NULL_INT < value < 2**31
+            ):
+                raise ValueError("Can't pack {!r} as an int".format(value))
+            self.args.append(value)
+        elif kind == "num":
+            if value is None:
+                value = float("nan")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError("Can't pack {!r} as a number".format(value))
+            self.args.append(value)
+        elif kind == "bool":
+            if value is not None and not isinstance(value, bool):
+                raise ValueError("Can't pack {!r} as a bool".format(value))
+            self.args.append(2 if value is None else int(value))
+        elif kind == "val":
+            self.args.append(self.table.index(value))
+        elif kind == "pos":
+            if value is None:
+                value = (_NULL_POS, _NULL_POS)
+            elif len(value) != 2 or not all(
+                isinstance(x, int) and 0 <= x < _NULL_POS for x in value
+            ):
+                raise ValueError("Can't pack {!r} as a position".format(value))
+            self.args.extend(value)
+
+    def pack_record(self, kind, record):
+        fields = self.schema["records"][kind]
+        bare = self.schema["bare"].get(kind)
+        if bare is not None and not isinstance(record, dict):
+            record = {bare: record}
+        elif len(record) != len(fields) or any(
+            name not in record for name, _ in fields
+        ):
+            raise ValueError("Can't pack {!r} as a {}".format(record, kind))
+        for name, field_kind in fields:
+            self.pack(field_kind, record.get(name))
+
+
+def pack_grid(payload, table=None, schema=SCHEMA):
+    """Return the grid state ``payload`` packed in the binary format.
+
+    The packed payload starts with the length of a JSON header, as an
+    unsigned 32 bit integer. The header holds the ``state`` fields which
+    aren't packed, the ``values`` added to the value ``table`` from index
+    ``values_start`` on, and the key and length of each packed list in the
+    payload, as ``sections``. The elements of those lists follow it. All
+    numbers are little-endian.
+
+    Passing the same ``table`` for each payload sent to a client avoids
+    sending the same values, such as player names, every time.
+
+    Raises ``ValueError`` if the payload doesn't fit ``schema``.
+    """
+    if table is None:
+        table = ValueTable()
+    values_start = len(table)
+    packer = _Packer(schema, table)
+    state = {}
+    sections = []
+    try:
+        for key, value in payload.items():
+            kind = schema["sections"].get(key)
+            if kind is None:
+                state[key] = value
+                continue
+            sections.append([key, len(value)])
+            for element in value:
+                if kind in schema["records"]:
+                    packer.pack_record(kind, element)
+                else:
+                    packer.pack(kind, element)
+        body = struct.pack("".join(packer.format), *packer.args)
+    except (ValueError, TypeError, struct.error) as e:
+        # The client won't get the values added to the table
+        table.truncate(values_start)
+        raise ValueError(str(e))
+
+    header = {
+        "state": state,
+        "values_start": values_start,
+        "values": table.values[values_start:],
+        "sections": sections,
+    }
+    header = dumps(header).encode("utf-8")
+    return struct.pack("<I", len(header)) + header + body
+
+
+class _Unpacker(object):
+    def __init__(self, schema, data, offset, values):
+        self.schema = schema
+        self.data = data
+        self.offset = offset
+        self.values = values
+
+    def _read(self, fmt):
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def unpack(self, kind):
+        if kind in self.schema["records"]:
+            (present,) = self._read("B")
+            return self.unpack_record(kind) if present else None
+        values = self._read(_FORMATS[kind])
+        if kind == "int":
+            return None if values[0] == _NULL_INT else values[0]
+        if kind == "num":
+            return None if values[0] != values[0] else values[0]
+        if kind == "bool":
+            return None if values[0] == 2 else bool(values[0])
+        if kind == "val":
+            return self.values[values[0]] if values[0] < len(self.values) else None
+        if values[0] == _NULL_POS:
+            return None
+        return list(values)
+
+    def unpack_record(self, kind):
+        record = {
+            name: self.unpack(field) for name, field in self.schema["records"][kind]
+        }
+        bare = self.schema["bare"].get(kind)
+        if bare is not None and all(
+            value is None for name, value in record.items() if name != bare
+        ):
+            return record[bare]
+        return record
+
+
+def unpack_grid(data, values=None, schema=SCHEMA):
+    """Return the grid state payload packed in ``data`` by ``pack_grid``.
+
+    ``values`` is the list of values received by the client so far, which
+    is updated with those in ``data``. Values missed along with an earlier
+    payload unpack as None, but the payload is then a delta which can't be
+    applied anyway.
+    """
+    if values is None:
+        values = []
+    (length,) = struct.unpack_from("<I", data)
+    end = 4 + length
+    header = loads(data[4:end].decode("utf-8"))
+    start = header["values_start"]
+    del values[start:]
+    values.extend([None] * (start - len(values)))
+    values.extend(header["values"])
+
+    unpacker = _Unpacker(schema, data, end, values)
+    payload = dict(header["state"])
+    for key, count in header["sections"]:
+        kind = schema["sections"][key]
+        if kind in schema["records"]:
+            payload[key] = [unpacker.unpack_record(kind) for _ in range(count)]
+        else:
+            payload[key] = [unpacker.unpack(kind) for _ in range(count)]
+    return payload
+
+
+class BinaryStateEncoder(StateEncoder):
+    """Encodes state messages with their grid packed by ``pack_grid``, and
+    encoded in base64 as messages are sent to clients as text.
+
+    The table of values sent to clients is started afresh with each
+    keyframe, which is what clients joining late or resyncing receive
+    first. Grids which don't fit ``SCHEMA`` are sent as JSON instead.
+    """
+
+    def __init__(self):
+        super(BinaryStateEncoder, self).__init__()
+        self.table = ValueTable()
+
+    def encode(self, message):
+        if message["grid"].get("keyframe", True):
+            self.table = ValueTable()
+        try:
+            packed = pack_grid(message["grid"], self.table)
+        except ValueError as e:
+            logger.warning("Sending state as JSON, as it can't be packed: {}".format(e))
+            return super(BinaryStateEncoder, self).encode(message)
+        message = dict(message, format="binary")
+        message["grid"] = base64.b64encode(packed).decode("ascii")
+        return dumps(message)
+
+
+# The encoders of state messages in each format
+STATE_ENCODERS = {"json": StateEncoder, "binary": BinaryStateEncoder}
@@ -3,6 +3,7 @@
 import collections
 import csv
 import datetime
+import heapq
 import itertools
 import json
 import logging
@@ -10,27 +11,37 @@ import math
 import os
 import random
 import string
+import tempfile
 import time
 import uuid
-from dataclasses import dataclass, field
 
 import dallinger
 import flask
 import gevent
+import numpy
 import yaml
 from cached_property import cached_property
 from dallinger import db
 from dallinger.compat import unicode
 from dallinger.config import get_config
 from dallinger.experiment import Experiment
-from faker import Factory
-from sqlalchemy import create_engine, func
+from sqlalchemy import create_engine, func, or_
 from sqlalchemy.orm import scoped_session, sessionmaker
 
-from . import distributions
+from . import distributions, encoding
 from .bots import Bot
+from .broadcast import StateTracker
+from .inputs import MoveQueue
+from .layers import GridLayers
 from .maze import Wall, labyrinth
 from .models import Event
+from .outbox import Outbox
+from .pseudonyms import pseudonyms
+from .recorder import EventRecorder
+from .replay_index import ReplayIndex
+from .rooms import LOBBY_CHANNEL, Room
+from .scheduler import Interval, TickScheduler
+from .snapshots import DELTA_KEYS, SnapshotPolicy
 
 logger = logging.getLogger(__file__)
 
@@ -112,6 +123,22 @@ GU_PARAMS = {
     "donation_multiplier": float,
     "num_recruits": int,
     "state_interval": float,
+    "state_keyframe_interval": int,
+    "event_batch_size": int,
+    "event_flush_interval": float,
+    "event_queue_size": int,
+    "publish_queue_size": int,
+    "snapshot_interval": float,
+    "snapshot_keyframe_interval": float,
+    "replay_index_dir": unicode,
+    "replay_keyframe_interval": float,
+    "replay_room": unicode,
+    "tick_rate": float,
+    "tick_max_catch_up": int,
+    "num_rooms": int,
+    "state_format": unicode,
+    "interest_management": bool,
+    "interest_margin": int,
 }
 
 DEFAULT_ITEM_CONFIG = {
@@ -147,6 +174,59 @@ def softmax(vector, temperature=1):
         return [float(len(vector)) for _ in vector]
 
 
+def _discard_from_index(index, key, value):
+    """Remove a value from a set-valued index, dropping empty entries."""
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
+
+
+def wall_clock():
+    """The current time; time.time is looked up on each call, so that it
+    can be patched.
+    """
+    return time.time()
+
+
+def read_game_config(path=None):
+    """Load the game configuration, by default from game_config.yml."""
+    if path is None:
+        path = os.path.join(os.path.dirname(__file__), GAME_CONFIG_FILE)
+    with open(path, "r") as game_config_stream:
+        return yaml.safe_load(game_config_stream)
+
+
+def parse_game_config(game_config):
+    """Return the item, transition and player configuration defined by
+    ``game_config``, with defaults filled in.
+    """
+    item_config = {o["item_id"]: o for o in game_config.get("items", ())}
+
+    # If any item is missing a key, add it with default value.
+    item_defaults = game_config.get("item_defaults", {})
+    for item in item_config.values():
+        for prop in item_defaults:
+            if prop not in item:
+                item[prop] = item_defaults[prop]
+
+    transition_config = {}
+    transition_defaults = game_config.get("transition_defaults", {})
+    for t in game_config.get("transitions", ()):
+        transition = transition_defaults.copy()
+        transition.update(t)
+        if transition["last_use"]:
+            transition_config[
+                ("last", t["actor_start"], t["target_start"])
+            ] = transition
+        else:
+            transition_config[(t["actor_start"], t["target_start"])] = transition
+
+    player_config = game_config.get("player_config")
+    return item_config, transition_config, player_config
+
+
 class Gridworld(object):
     """A Gridworld in the Griduniverse."""
 
@@ -163,22 +243,21 @@ class Gridworld(object):
 
     GREEN = [0.51, 0.69, 0.61]
     WHITE = [1.00, 1.00, 1.00]
-    wall_locations = None
-    item_locations = None
+    # Side length of the square buckets used to answer neighborhood queries
+    player_bucket_size = 8
+    # Number of item changes remembered for ``item_changes_since``
+    item_log_size = 1000
     walls_updated = True
     items_updated = True
 
-    def __new__(cls, **kwargs):
-        if not hasattr(cls, "instance"):
-            cls.instance = super(Gridworld, cls).__new__(cls)
-        return cls.instance
-
     def __init__(self, **kwargs):
-        # If Singleton is already initialized, do nothing
-        if hasattr(self, "num_players"):
-            return
-
         self.log_event = kwargs.get("log_event", lambda x: None)
+        # The source of the current time, which simulations may replace
+        self.clock = kwargs.get("clock", wall_clock)
+        # The sources of random numbers, a random.Random and a
+        # numpy.random.Generator, which simulations may seed
+        self.rng = kwargs.get("rng", random)
+        self.numpy_rng = kwargs.get("numpy_rng", numpy.random)
 
         # Players
         self.num_players = kwargs.get("max_participants", 3)
@@ -195,6 +274,7 @@ class Gridworld(object):
         self.rows = kwargs.get("rows", 25)
         self.window_columns = kwargs.get("window_columns", min(self.columns, 25))
         self.window_rows = kwargs.get("window_rows", min(self.rows, 25))
+        self.layers = GridLayers(self.rows, self.columns)
         self.block_size = kwargs.get("block_size", 10)
         self.padding = kwargs.get("padding", 1)
         self.chat_visibility_threshold = kwargs.get("chat_visibility_threshold", 0.4)
@@ -282,6 +362,7 @@ class Gridworld(object):
 
         # Set some variables.
         self.players = {}
+        self._clear_player_index()
         self.item_locations = {}
         self.items_consumed = []
         self.start_timestamp = kwargs.get("start_timestamp", None)
@@ -290,14 +371,16 @@ class Gridworld(object):
 
         if self.contagion_hierarchy:
             self.contagion_hierarchy = range(self.num_colors)
-            random.shuffle(self.contagion_hierarchy)
+            self.rng.shuffle(self.contagion_hierarchy)
 
         if self.costly_colors:
             self.color_costs = [2**i for i in range(self.num_colors)]
-            random.shuffle(self.color_costs)
+            self.rng.shuffle(self.color_costs)
 
         # Items and transitions
         self.item_config = kwargs.get("item_config", DEFAULT_ITEM_CONFIG)
+        # The ItemType shared by the grid's items of each item id
+        self.item_types = {}
         self.transition_config = kwargs.get("transition_config", {})
         self.player_config = kwargs.get("player_config", {})
 
@@ -316,10 +399,7 @@ class Gridworld(object):
 
         # Get item spawning probability distribution and public good calories
         for item_type in self.item_config.values():
-            (
-                item_type["probability_function"],
-                item_type["probability_function_args"],
-            ) = self._get_probablity_func_for_config(
+            item_type["distribution"] = self._get_distribution_for_config(
                 item_type.get("probability_distribution", "")
             )
 
@@ -330,29 +410,21 @@ class Gridworld(object):
             )
 
         # Player probability distribution
-        (
-            self.player_config["probability_function"],
-            self.player_config["probability_function_args"],
-        ) = self._get_probablity_func_for_config(
+        self.player_config["distribution"] = self._get_distribution_for_config(
             self.player_config.get("probability_distribution", "")
         )
 
-    def _get_probablity_func_for_config(self, probability_distribution):
-        probability_function_args = []
-        parts = probability_distribution.split()
-        if len(parts) > 1:
-            probability_distribution = parts[0]
-            probability_function_args = parts[1:]
-        probability_distribution = (
-            f"{probability_distribution}_probability_distribution"
+    def _get_distribution_for_config(self, probability_distribution):
+        parts = probability_distribution.split() or ["random"]
+        distribution = distributions.get_distribution(
+            parts[0], self.rows, self.columns, *parts[1:]
         )
-        probability_function = getattr(distributions, probability_distribution, None)
-        if probability_function is None:
-            logger.info(
-                f"Unknown item probability distribution: {probability_distribution}."
+        if distribution is None:
+            logger.info(f"Unknown item probability distribution: {parts[0]}.")
+            distribution = distributions.get_distribution(
+                "random", self.rows, self.columns
             )
-            probability_function = distributions.random_probability_distribution
-        return probability_function, probability_function_args
+        return distribution
 
     def can_occupy(self, position):
         if self.player_overlap:
@@ -371,7 +443,7 @@ class Gridworld(object):
     def elapsed_round_time(self):
         if self.start_timestamp is None:
             return 0
-        return time.time() - self.start_timestamp
+        return self.clock() - self.start_timestamp
 
     @property
     def remaining_round_time(self):
@@ -447,7 +519,7 @@ class Gridworld(object):
             if self.game_over:
                 return
 
-            self.start_timestamp = time.time()
+            self.start_timestamp = self.clock()
             # Delay round for leaderboard display
             if self.leaderboard_individual or self.leaderboard_group:
                 self.start_timestamp += self.leaderboard_time
@@ -530,6 +602,7 @@ class Gridworld(object):
                 rows=self.rows,
                 density=self.walls_density,
                 contiguity=self.walls_contiguity,
+                rng=self.rng,
             )
             logger.info(
                 "Built {} walls in {} seconds.".format(len(walls), time.time() - start)
@@ -539,7 +612,7 @@ class Gridworld(object):
     def _start_if_ready(self):
         # Don't start unless we have a least one player
         if self.players and not self.game_started:
-            self.start_timestamp = time.time()
+            self.start_timestamp = self.clock()
 
     @property
     def game_started(self):
@@ -549,6 +622,29 @@ class Gridworld(object):
     def game_over(self):
         return self.round >= self.num_rounds
 
+    @property
+    def wall_locations(self):
+        return self.__dict__.get("_wall_locations")
+
+    @wall_locations.setter
+    def wall_locations(self, value):
+        self._wall_locations = value
+        self.layers.set_walls(value)
+
+    def add_wall(self, wall):
+        self.wall_locations[tuple(wall.position)] = wall
+        self.layers.add_wall(wall.position)
+
+    @property
+    def item_locations(self):
+        return self.__dict__.get("_item_locations")
+
+    @item_locations.setter
+    def item_locations(self, value):
+        self._item_locations = value
+        self.layers.set_items(value)
+        self._reset_item_tracking()
+
     def serialize(self, include_walls=True, include_items=True):
         grid_data = {
             "players": [player.serialize() for player in self.players.values()],
@@ -565,7 +661,7 @@ class Gridworld(object):
 
         return grid_data
 
-    def deserialize(self, state):
+    def _check_size(self, state):
         if self.rows != state["rows"] or self.columns != state["columns"]:
             raise ValueError(
                 "State has wrong grid size ({}x{}, configured as {}x{})".format(
@@ -575,11 +671,15 @@ class Gridworld(object):
                     self.columns,
                 )
             )
+
+    def deserialize(self, state):
+        self._check_size(state)
         self.round = state.get("round", 0)
         # @@@ can't set donation_active because it's a property
         # self.donation_active = state['donation_active']
 
         self.players = {}
+        self._clear_player_index()
         for player_state in state["players"]:
             # Avoid mutating the caller's data
             new_state = player_state.copy()
@@ -593,23 +693,141 @@ class Gridworld(object):
             self.players[player.id] = player
 
         if "walls" in state:
-            self.wall_locations = {}
+            walls = {}
             for wall_state in state["walls"]:
                 if isinstance(wall_state, list):
                     wall_state = {"position": wall_state}
                 wall = Wall(**wall_state)
-                self.wall_locations[tuple(wall.position)] = wall
+                walls[tuple(wall.position)] = wall
+            self.wall_locations = walls
 
         if "items" in state:
-            self.item_locations = {}
+            items = {}
             for item_state in state["items"]:
-                item_props = self.item_config[item_state["item_id"]]
-                invalid_params = ["item_id", "maturity"]
-                item_params = {
-                    k: v for k, v in item_state.items() if k not in invalid_params
-                }
-                obj = Item(item_props, **item_params)
-                self.item_locations[tuple(obj.position)] = obj
+                obj = self._item_from_state(item_state)
+                items[tuple(obj.position)] = obj
+            self.item_locations = items
+        else:
+            # A delta snapshot, see ``snapshots.SnapshotPolicy``
+            for position in state.get("items_removed", ()):
+                if tuple(position) in self.item_locations:
+                    self.remove_item(position)
+            for item_state in state.get("items_changed", ()):
+                self.add_item(self._item_from_state(item_state))
+
+    def apply_state(self, state):
+        """Bring the grid to ``state`` in place, like ``deserialize``.
+
+        Players, walls and items which are unchanged are left alone, and
+        changed players are updated rather than rebuilt, so applying a
+        sequence of states, as when replaying, creates few new objects.
+        """
+        self._check_size(state)
+        self.round = state.get("round", 0)
+
+        players = {}
+        for player_state in state["players"]:
+            player = self.players.get(player_state["id"])
+            if player is None:
+                new_state = player_state.copy()
+                new_state["color_name"] = new_state.pop("color", None)
+                player = Player(
+                    pseudonym_locale=self.pseudonyms_locale,
+                    pseudonym_gender=self.pseudonyms_gender,
+                    grid=self,
+                    **new_state,
+                )
+            else:
+                self._update_player(player, player_state)
+            players[player.id] = player
+        for player_id, player in self.players.items():
+            if player_id not in players:
+                self._index_player(player, player.position, None)
+        self.players = players
+
+        if "walls" in state:
+            positions = [
+                tuple(
+                    wall_state
+                    if isinstance(wall_state, list)
+                    else wall_state["position"]
+                )
+                for wall_state in state["walls"]
+            ]
+            if set(positions) != set(self.wall_locations):
+                if set(self.wall_locations) - set(positions):
+                    self.wall_locations = {}
+                for position in positions:
+                    if position not in self.wall_locations:
+                        self.add_wall(Wall(position=list(position)))
+
+        if "items" in state:
+            current = self.item_locations
+            positions = set()
+            for item_state in state["items"]:
+                position = tuple(item_state["position"])
+                positions.add(position)
+                item = current.get(position)
+                if item is None or not self._same_item(item, item_state):
+                    self.add_item(self._item_from_state(item_state))
+                elif item.remaining_uses != item_state.get(
+                    "remaining_uses", item.remaining_uses
+                ):
+                    item.remaining_uses = item_state["remaining_uses"]
+                    self.mark_item_changed(position)
+            for position in [p for p in current if p not in positions]:
+                self.remove_item(position)
+        else:
+            for position in state.get("items_removed", ()):
+                if tuple(position) in self.item_locations:
+                    self.remove_item(position)
+            for item_state in state.get("items_changed", ()):
+                self.add_item(self._item_from_state(item_state))
+
+    def _update_player(self, player, player_state):
+        position = player_state.get("position", [0, 0])
+        if player.position != position:
+            player.position = position
+        if "color" in player_state and player_state["color"] != player.color:
+            player.color_idx = Gridworld.player_color_names.index(player_state["color"])
+            player.color_name = player.color = player_state["color"]
+        for name in (
+            "score",
+            "payoff",
+            "motion_auto",
+            "motion_direction",
+            "motion_speed_limit",
+            "name",
+            "identity_visible",
+            "recruiter_id",
+        ):
+            if name in player_state:
+                setattr(player, name, player_state[name])
+
+    @staticmethod
+    def _same_item(item, item_state):
+        return (
+            item.id == item_state.get("id")
+            and item.item_id == item_state["item_id"]
+            and item.creation_timestamp == item_state.get("creation_timestamp")
+        )
+
+    def item_type(self, item_id):
+        """Return the ``ItemType`` shared by the grid's items of ``item_id``.
+
+        A new one is made if the config of ``item_id`` has been replaced.
+        """
+        config = self.item_config[item_id]
+        item_type = self.item_types.get(item_id)
+        if item_type is None or item_type.config is not config:
+            item_type = self.item_types[item_id] = ItemType(config, self.clock)
+        return item_type
+
+    def _item_from_state(self, item_state):
+        item_type = self.item_type(item_state["item_id"])
+        invalid_params = ["item_id", "maturity"]
+        item_params = {k: v for k, v in item_state.items() if k not in invalid_params}
+        return Item(item_type, **item_params)
 
     def instructions(self):
         instructions_file_path = os.path.join(
@@ -622,21 +840,21 @@ class Gridworld(object):
     def consume(self):
         """Players consume the non-interactive items"""
         consumed = 0
+        respawn = collections.Counter()
         for player in self.players.values():
             position = tuple(player.position)
             if position in self.item_locations:
                 item = self.item_locations[position]
                 if item.interactive or not item.calories:
                     continue
-                if item.maturity < item.maturation_threshold:
+                if item.maturity_at(self.clock()) < item.maturation_threshold:
                     continue
-                del self.item_locations[position]
+                self.remove_item(position)
                 # Update existence and count of item.
                 self.items_consumed.append(item)
-                self.items_updated = True
                 if item.respawn:
                     # respawn same type of item.
-                    self.spawn_item(item_id=item.item_id)
+                    respawn[item.item_id] += 1
                 else:
                     self.item_config[item.item_id]["item_count"] -= 1
 
@@ -644,7 +862,7 @@ class Gridworld(object):
                 if player.color_idx > 0:
                     calories = item.calories
                 else:
-                    calories = item.calories * self.grid.relative_deprivation
+                    calories = item.calories * self.relative_deprivation
 
                 player.score += calories
                 consumed += 1
@@ -653,6 +871,9 @@ class Gridworld(object):
             for player_to in self.players.values():
                 player_to.score += item.public_good * consumed
 
+        for item_id, count in respawn.items():
+            self.spawn_items(count, item_id)
+
     def spawn_item(self, position=None, item_id=None):
         """Respawn an item for a single position"""
         if not item_id:
@@ -661,21 +882,23 @@ class Gridworld(object):
             while item_id is None:
                 # As many loops as it takes until one is chosen.
                 for obj in self.item_config.values():
-                    spawn_rate = random.random()
+                    spawn_rate = self.rng.random()
                     if spawn_rate < obj.get("spawn_rate", 0.1):
                         item_id = obj.get("item_id", 1)
 
         if not position:
             position = self._find_empty_position(item_id)
+            if position is None:
+                logger.warning(f"No empty cell to spawn item {item_id} in.")
+                return
 
-        item_props = self.item_config[item_id]
         new_item = Item(
             id=(len(self.item_locations) + len(self.items_consumed)),
             position=position,
-            item_config=item_props,
+            item_config=self.item_type(item_id),
+            creation_timestamp=self.clock(),
         )
-        self.item_locations[tuple(position)] = new_item
-        self.items_updated = True
+        self.add_item(new_item)
         logger.warning(f"Spawning new item: {new_item}")
         self.log_event(
             {
@@ -684,21 +907,143 @@ class Gridworld(object):
             }
         )
 
-    def items_changed(self, last_items):
-        locations = self.item_locations
-        if len(last_items) != len(locations):
-            return True
-        for item in last_items:
-            position = tuple(item["position"])
-            if position not in locations:
-                return True
-            found = locations[position]
-            if found.id != item["id"] or found.maturity != item["maturity"]:
-                return True
-        return False
-
-    def trigger_transitions(self, time=time.time):
-        now = time()
+    def spawn_items(self, count, item_id, positions=None):
+        """Spawn ``count`` items of type ``item_id`` in one go, at
+        ``positions`` or else at empty cells chosen by the item's
+        distribution, recording a single event. Returns the new items.
+        """
+        if positions is None:
+            positions = self.find_empty_positions(count, item_id=item_id)
+        if not positions:
+            return []
+
+        item_type = self.item_type(item_id)
+        first_id = len(self.item_locations) + len(self.items_consumed)
+        now = self.clock()
+        new_items = [
+            Item(
+                id=first_id + i,
+                position=position,
+                item_config=item_type,
+                creation_timestamp=now,
+            )
+            for i, position in enumerate(positions)
+        ]
+        for new_item in new_items:
+            self._place_item(tuple(new_item.position), new_item)
+        self.items_updated = True
+        logger.info(f"Spawned {len(new_items)} items of type {item_id}")
+        self.log_event(
+            {
+                "type": "spawn items",
+                "item_id": item_id,
+                "positions": [list(position) for position in positions],
+            }
+        )
+        return new_items
+
+    def add_item(self, item, position=None):
+        """Place an item on the grid, replacing any item already there."""
+        position = tuple(item.position if position is None else position)
+        self._place_item(position, item)
+        self.items_updated = True
+
+    def _place_item(self, position, item):
+        self.item_locations[position] = item
+        self.layers.add_item(position, item)
+        self._log_item_change(position)
+        self._schedule_maturity(position, item)
+
+    def remove_item(self, position):
+        """Take the item at ``position`` off the grid and return it."""
+        position = tuple(position)
+        item = self.item_locations.pop(position)
+        self.layers.remove_item(position)
+        self.items_updated = True
+        self._log_item_change(position)
+        return item
+
+    def mark_item_changed(self, position):
+        """Record that the item at ``position`` was modified in place."""
+        self.items_updated = True
+        self._log_item_change(tuple(position))
+
+    def _reset_item_tracking(self):
+        """Start tracking changes to a new set of item locations.
+
+        ``item_generation`` counts the changes made to items on the grid,
+        including changes in their displayed (rounded) maturity, so that
+        consumers can cheaply tell whether anything changed since they last
+        looked. The positions of recent changes are kept in a log, and the
+        times at which each item's maturity will next change are kept in a
+        heap, so neither requires scanning all items.
+        """
+        self.item_generation = self.__dict__.get("item_generation", 0) + 1
+        self._item_log = []
+        self._item_log_start = self.item_generation
+        self._maturity_schedule = []
+        self._maturity_sequence = itertools.count()
+        for position, item in (self.item_locations or {}).items():
+            self._schedule_maturity(position, item)
+
+    def _log_item_change(self, position):
+        self.item_generation += 1
+        self._item_log.append(position)
+        if len(self._item_log) > self.item_log_size:
+            dropped = len(self._item_log) // 2
+            del self._item_log[:dropped]
+            self._item_log_start += dropped
+
+    def _schedule_maturity(self, position, item, step=None):
+        """Queue the time at which the rounded maturity of ``item`` will
+        next change; ``step`` is its current maturity in tenths.
+        """
+        speed = item.item_config.get("maturation_speed", 0)
+        if speed <= 0:
+            return
+        if step is None:
+            age = self.clock() - item.creation_timestamp
+            step = math.floor((1 - math.exp(-age * speed)) * 10 + 0.5)
+        threshold = (step + 0.5) / 10
+        if threshold >= 1:
+            return
+        due = item.creation_timestamp - math.log(1 - threshold) / speed
+        heapq.heappush(
+            self._maturity_schedule,
+            (due, next(self._maturity_sequence), step + 1, position, item),
+        )
+
+    def update_item_maturity(self, now=None):
+        """Log changes for items whose rounded maturity has changed."""
+        if now is None:
+            now = self.clock()
+        schedule = self._maturity_schedule
+        while schedule and schedule[0][0] <= now:
+            due, _, step, position, item = heapq.heappop(schedule)
+            # Skip items which have since been removed or replaced
+            if self.item_locations.get(position) is item:
+                self._log_item_change(position)
+                self._schedule_maturity(position, item, step)
+
+    def items_changed_since(self, generation):
+        """Have any items changed since ``item_generation`` was
+        ``generation``?
+        """
+        self.update_item_maturity()
+        return generation != self.item_generation
+
+    def item_changes_since(self, generation):
+        """Return the positions of items changed since ``item_generation``
+        was ``generation``, or None if the changes are no longer known.
+        """
+        self.update_item_maturity()
+        if generation is None or generation < self._item_log_start:
+            return None
+        offset = generation - self._item_log_start
+        return set(self._item_log[offset:])
+
+    def trigger_transitions(self, time=None):
+        now = (time or self.clock)()
         to_change = []
         for position, item in self.item_locations.items():
             item_type = self.item_config.get(item.item_id)
@@ -710,16 +1055,45 @@ class Gridworld(object):
                     new_target_item = target and Item(
                         id=item.id,
                         position=position,
-                        item_config=self.item_config[target],
+                        item_config=self.item_type(target),
+                        creation_timestamp=now,
                     )
                     to_change.append((position, new_target_item))
-        if to_change:
-            self.items_updated = True
         for position, new_target_item in to_change:
             if new_target_item is None:
-                del self.item_locations[position]
+                self.remove_item(position)
             else:
-                self.item_locations[position] = new_target_item
+                self.add_item(new_target_item, position)
+
+    def apply_timed_events(self):
+        """Apply the changes which happen once per second."""
+        # Grow or shrink the item stores.
+        self.replenish_items()
+        # Trigger automatic transitions.
+        self.trigger_transitions()
+
+        abundances = {}
+        for player in self.players.values():
+            # Apply tax.
+            player.score = max(player.score - self.tax, 0)
+            if player.color not in abundances:
+                abundances[player.color] = 0
+            abundances[player.color] += 1
+
+        # Apply frequency-dependent payoff.
+        if self.frequency_dependence:
+            for player in self.players.values():
+                relative_frequency = 1.0 * abundances[player.color] / len(self.players)
+                payoff = (
+                    fermi(
+                        beta=self.frequency_dependence,
+                        p1=relative_frequency,
+                        p2=0.5,
+                    )
+                    * self.frequency_dependent_payoff_rate
+                )
+
+                player.score = max(player.score + payoff, 0)
 
     def replenish_items(self):
         items_by_type = collections.defaultdict(list)
@@ -760,25 +1134,30 @@ class Gridworld(object):
             )
             add_items = items_to_add_or_remove > 1
 
+            if add_items:
+                self.spawn_items(items_to_add_or_remove, item_type["item_id"])
+                continue
+
             for i in range(abs(items_to_add_or_remove)):
-                if add_items:
-                    self.spawn_item(item_id=item_type["item_id"])
-                    self.items_updated = True
-                elif item_type["limit_quantity"]:
-                    random_of_type = random.choice(items_of_this_type)
+                if item_type["limit_quantity"]:
+                    random_of_type = self.rng.choice(items_of_this_type)
                     try:
-                        del self.item_locations[tuple(random_of_type.position)]
-                        self.items_updated = True
+                        self.remove_item(random_of_type.position)
                     except (KeyError, TypeError):
                         pass
                 else:
                     break
 
     def spawn_player(self, id=None, **kwargs):
-        """Spawn a player."""
+        """Spawn a player at an empty cell, or raise ValueError if there is
+        none.
+        """
+        position = self._find_empty_position(player=True)
+        if position is None:
+            raise ValueError("No empty cell to spawn player {} in".format(id))
         player = Player(
             id=id,
-            position=self._find_empty_position(player=True),
+            position=position,
             num_possible_colors=self.num_colors,
             motion_speed_limit=self.motion_speed_limit,
             motion_cost=self.motion_cost,
@@ -798,24 +1177,41 @@ class Gridworld(object):
 
     def _find_empty_position(self, item_id=None, player=False):
         """Select an empty cell, using the configured probability distribution."""
-        rows = self.rows
-        columns = self.columns
-        empty_cell = False
+        positions = self.find_empty_positions(1, item_id=item_id, player=player)
+        if not positions:
+            return None
+        return positions[0]
+
+    def find_empty_positions(self, count, item_id=None, player=False):
+        """Select up to ``count`` distinct empty cells, using the configured
+        probability distribution.
+
+        Positions are drawn in one go from the distribution's weights with
+        the occupied cells masked out. Fewer than ``count`` positions are
+        returned if there aren't enough empty cells.
+        """
         if item_id:
-            prob_func = self.item_config[item_id]["probability_function"]
-            func_args = self.item_config[item_id]["probability_function_args"]
+            distribution = self.item_config[item_id]["distribution"]
         elif player:
-            prob_func = self.player_config["probability_function"]
-            func_args = self.player_config["probability_function_args"]
+            distribution = self.player_config["distribution"]
         else:
-            prob_func = distributions.random_probability_distribution
-            func_args = []
+            distribution = distributions.get_distribution(
+                "random", self.rows, self.columns
+            )
 
-        while not empty_cell:
-            position = prob_func(rows, columns, *func_args)
-            empty_cell = self._empty(position)
+        return distribution.sample(count, mask=self.empty_mask(), rng=self.numpy_rng)
 
-        return position
+    def player_layer(self):
+        """Return the number of players in each cell, as an array."""
+        return self.layers.player_layer(list(self.players.values()))
+
+    def empty_mask(self):
+        """Return a boolean array which is true for the empty cells."""
+        return self.layers.empty_mask(list(self.players.values()))
+
+    def item_counts(self):
+        """Return the number of items on the grid of each ``item_id``."""
+        return self.layers.item_counts()
 
     def _empty(self, position):
         """Determine whether a particular cell is empty."""
@@ -825,11 +1221,77 @@ class Gridworld(object):
             or self.has_wall(position)
         )
 
+    def _clear_player_index(self):
+        """Reset the spatial indexes of players.
+
+        Players are indexed both by exact position, for occupancy checks,
+        and by coarse bucket, for neighborhood queries. Both indexes are
+        maintained by ``Player.position`` as players move.
+        """
+        self._players_by_position = {}
+        self._players_by_bucket = {}
+
+    def _bucket(self, position):
+        size = self.player_bucket_size
+        return (position[0] // size, position[1] // size)
+
+    def _index_player(self, player, old_position, new_position):
+        """Move a player between cells of the spatial indexes."""
+        if old_position is not None:
+            old_position = tuple(old_position)
+            _discard_from_index(self._players_by_position, old_position, player)
+            _discard_from_index(
+                self._players_by_bucket, self._bucket(old_position), player
+            )
+        if new_position is not None:
+            new_position = tuple(new_position)
+            self._players_by_position.setdefault(new_position, set()).add(player)
+            self._players_by_bucket.setdefault(self._bucket(new_position), set()).add(
+                player
+            )
+
+    def _is_current_player(self, player):
+        # The index may hold players that have since been replaced or
+        # removed from ``self.players``; those are skipped on lookup.
+        return self.players.get(player.id) is player
+
+    def players_at(self, position):
+        """Return the players occupying a position."""
+        return [
+            p
+            for p in self._players_by_position.get(tuple(position), ())
+            if self._is_current_player(p)
+        ]
+
+    def players_near(self, position, d=1):
+        """Return the players within manhattan distance `d` of a position."""
+        row, column = position
+        min_row, min_column = self._bucket((row - d, column - d))
+        max_row, max_column = self._bucket((row + d, column + d))
+        num_buckets = (max_row - min_row + 1) * (max_column - min_column + 1)
+        if num_buckets > len(self._players_by_bucket):
+            # For large radii it's cheaper to visit the occupied buckets only
+            buckets = [
+                players
+                for (b_row, b_column), players in self._players_by_bucket.items()
+                if min_row <= b_row <= max_row and min_column <= b_column <= max_column
+            ]
+        else:
+            buckets = [
+                self._players_by_bucket.get((b_row, b_column), ())
+                for b_row in range(min_row, max_row + 1)
+                for b_column in range(min_column, max_column + 1)
+            ]
+        return [
+            p
+            for players in buckets
+            for p in players
+            if abs(p.position[0] - row) + abs(p.position[1] - column) <= d
+            and self._is_current_player(p)
+        ]
+
     def has_player(self, position):
-        for player in self.players.values():
-            if player.position == position:
-                return True
-        return False
+        return bool(self.players_at(position))
 
     def has_item(self, position):
         return tuple(position) in self.item_locations
@@ -860,50 +1322,142 @@ class Gridworld(object):
             return 1
 
 
-@dataclass
-class Item:
+class GridworldRegistry(object):
+    """The gridworlds hosted by this process, by name.
+
+    A new ``Griduniverse`` is built for every web request, so the gridworld
+    of a game is kept here, created by the first request to ask for it and
+    shared by the later ones.
+    """
+
+    def __init__(self):
+        self._gridworlds = {}
+
+    def __contains__(self, name):
+        return name in self._gridworlds
+
+    def __getitem__(self, name):
+        return self._gridworlds[name]
+
+    def __len__(self):
+        return len(self._gridworlds)
+
+    def get_or_create(self, name, **kwargs):
+        """Return the gridworld called ``name``, creating it with
+        ``kwargs`` if there is none.
+        """
+        grid = self._gridworlds.get(name)
+        if grid is None:
+            grid = self._gridworlds[name] = Gridworld(**kwargs)
+        return grid
+
+    def remove(self, name):
+        """Forget the gridworld called ``name``, if there is one."""
+        self._gridworlds.pop(name, None)
+
+    def clear(self):
+        self._gridworlds.clear()
+
+
+gridworlds = GridworldRegistry()
+
+
+class ItemType(object):
+    """The type shared by all items with the same ``item_config``.
+
+    Each ``Gridworld`` keeps one record per item id (see
+    ``Gridworld.item_type``), so that its items only hold a reference to
+    the record. The config is held by reference too, so changes to it are
+    seen by every item of the type. Items tell their age by ``clock``, the
+    clock of their grid.
+    """
+
+    __slots__ = ("config", "item_id", "clock")
+
+    def __init__(self, config, clock=wall_clock):
+        self.config = config
+        self.item_id = config["item_id"]
+        self.clock = clock
+
+
+class Item(object):
     """A generic object supporting configuration via a game_config.yml
     definition.
 
     All instances sharing an item_id will share a reference to the same
     item_config, and values will be looked up from this common key/value map.
     Only values that vary by instance will be stored on the object itself.
+    ``item_config`` may also be given as the ``ItemType`` shared by items of
+    the same config.
     """
 
-    item_config: dict
-    id: int = field(default_factory=lambda: uuid.uuid4().int)
-    creation_timestamp: float = field(default_factory=time.time)
-    position: tuple = (0, 0)
-    remaining_uses: int = field(default=None)
+    __slots__ = ("item_type", "id", "creation_timestamp", "position", "remaining_uses")
+
+    # Item properties derived from the item's type are immutable, along with
+    # things like the `id` and `creation_timestamp`
+    _mutable = frozenset(["position", "remaining_uses"])
+
+    def __init__(
+        self,
+        item_config,
+        id=None,
+        creation_timestamp=None,
+        position=(0, 0),
+        remaining_uses=None,
+    ):
+        if isinstance(item_config, ItemType):
+            item_type = item_config
+        else:
+            item_type = ItemType(item_config)
+        init = object.__setattr__
+        init(self, "item_type", item_type)
+        init(self, "id", uuid.uuid4().int if id is None else id)
+        init(
+            self,
+            "creation_timestamp",
+            item_type.clock() if creation_timestamp is None else creation_timestamp,
+        )
+        init(self, "position", position)
+        if remaining_uses is None:
+            remaining_uses = item_type.config["n_uses"]
+        init(self, "remaining_uses", remaining_uses)
+
+    @property
+    def item_config(self):
+        return self.item_type.config
 
-    def __post_init__(self):
-        object.__setattr__(self, "item_id", self.item_config["item_id"])
-        if self.remaining_uses is None:
-            self.remaining_uses = self.item_config["n_uses"]
+    @property
+    def item_id(self):
+        return self.item_type.item_id
 
     def __getattr__(self, name):
         """We look up unknown properties from the `item_config`"""
-        item_config = self.__dict__.get("item_config", {})
-        if name in item_config:
-            return item_config[name]
-        raise AttributeError(name)
+        try:
+            config = object.__getattribute__(self, "item_type").config
+            return config[name]
+        except (AttributeError, KeyError):
+            raise AttributeError(name)
 
     def __setattr__(self, name, value):
-        """Item properties derived from the item's type should be immutable, along
-        with things like the `id` and `creation_timestamp`"""
-        if name in {"item_config", "id", "creation_timestamp", "item_id"}:
-            try:
-                # These properties need to be able to have initial values set in
-                # `__init__`
-                self.__dict__[name]
-                raise TypeError("Cannot change immutable item config.")
-            except KeyError:
-                pass
-        elif name in self.item_config:
-            # The remaining properties from `item_config` can never be overridden
+        if name not in self._mutable:
             raise TypeError("Cannot change immutable item config.")
+        object.__setattr__(self, name, value)
 
-        super().__setattr__(name, value)
+    def _fields(self):
+        return (
+            self.item_type.config,
+            self.id,
+            self.creation_timestamp,
+            self.position,
+            self.remaining_uses,
+        )
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
 
     def __repr__(self):
         return (
@@ -923,11 +1477,11 @@ class Item:
 
     @property
     def maturity(self):
-        return round(1 - math.exp(-self._age * self.maturation_speed), 1)
+        return self.maturity_at(self.item_type.clock())
 
-    @property
-    def _age(self):
-        return time.time() - self.creation_timestamp
+    def maturity_at(self, now):
+        age = now - self.creation_timestamp
+        return round(1 - math.exp(-age * self.maturation_speed), 1)
 
 
 class IllegalMove(Exception):
@@ -940,10 +1494,39 @@ class IllegalMove(Exception):
 class Player(object):
     """A player."""
 
+    __slots__ = (
+        "id",
+        "grid",
+        "_position",
+        "motion_auto",
+        "motion_direction",
+        "motion_speed_limit",
+        "num_possible_colors",
+        "motion_cost",
+        "motion_tremble_rate",
+        "score",
+        "payoff",
+        "pseudonym_locale",
+        "pseudonym_gender",
+        "identity_visible",
+        "recruiter_id",
+        "add_wall",
+        "current_item",
+        "color_idx",
+        "color_name",
+        "color",
+        "_profile",
+        "name",
+        "motion_timestamp",
+        "last_timestamp",
+    )
+
     def __init__(self, **kwargs):
         super(Player, self).__init__()
 
         self.id = kwargs.get("id", uuid.uuid4())
+        self.grid = kwargs.get("grid", None)
+        self._position = None
         self.position = kwargs.get("position", [0, 0])
         self.motion_auto = kwargs.get("motion_auto", False)
         self.motion_direction = kwargs.get("motion_direction", "right")
@@ -951,10 +1534,10 @@ class Player(object):
         self.num_possible_colors = kwargs.get("num_possible_colors", 2)
         self.motion_cost = kwargs.get("motion_cost", 0)
         self.motion_tremble_rate = kwargs.get("motion_tremble_rate", 0)
-        self.grid = kwargs.get("grid", None)
         self.score = kwargs.get("score", 0)
         self.payoff = kwargs.get("payoff", 0)
         self.pseudonym_locale = kwargs.get("pseudonym_locale", "en_US")
+        self.pseudonym_gender = kwargs.get("pseudonym_gender", None)
         self.identity_visible = kwargs.get("identity_visible", True)
         self.recruiter_id = kwargs.get("recruiter_id", "")
         self.add_wall = None
@@ -970,29 +1553,63 @@ class Player(object):
         elif "color_name" in kwargs:
             self.color_idx = Gridworld.player_color_names.index(kwargs["color_name"])
         else:
-            self.color_idx = random.randint(0, self.num_possible_colors - 1)
+            self.color_idx = self._rng.randint(0, self.num_possible_colors - 1)
 
         self.color_name = Gridworld.player_color_names[self.color_idx]
         self.color = Gridworld.player_color_names[self.color_idx]
 
-        # Determine the player's profile.
-        self.fake = Factory.create(self.pseudonym_locale)
-        self.profile = self.fake.simple_profile(
-            sex=kwargs.get("pseudonym_gender", None)
-        )
-        self.name = kwargs.get("name", self.profile["name"])
-        self.username = self.profile["username"]
-        self.gender = self.profile["sex"]
-        self.birthdate = self.profile["birthdate"]
+        # Determine the player's profile. Players restored with a name, as
+        # when deserializing, only get the rest of a profile if it's used.
+        self._profile = None
+        if "name" in kwargs:
+            self.name = kwargs["name"]
+        else:
+            self.name = self.profile["name"]
 
         self.motion_timestamp = 0
         self.last_timestamp = 0
 
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = pseudonyms.profile(
+                self.pseudonym_locale, self.pseudonym_gender
+            )
+        return self._profile
+
+    @property
+    def username(self):
+        return self.profile["username"]
+
+    @property
+    def gender(self):
+        return self.profile["sex"]
+
+    @property
+    def birthdate(self):
+        return self.profile["birthdate"]
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        """Update the position, keeping the grid's player index in sync."""
+        old_position = self._position
+        self._position = value
+        if self.grid is not None:
+            self.grid._index_player(self, old_position, value)
+
+    @property
+    def _rng(self):
+        return random if self.grid is None else self.grid.rng
+
     def tremble(self, direction):
         """Change direction with some probability."""
         directions = ["up", "down", "left", "right"]
         directions.remove(direction)
-        direction = random.choice(directions)
+        direction = self._rng.choice(directions)
         return direction
 
     def move(self, direction, tremble_rate=None, timestamp=None):
@@ -1004,7 +1621,7 @@ class Player(object):
         if tremble_rate is None:
             tremble_rate = self.motion_tremble_rate
 
-        if random.random() < tremble_rate:
+        if self._rng.random() < tremble_rate:
             direction = self.tremble(direction)
 
         self.motion_direction = direction
@@ -1056,7 +1673,7 @@ class Player(object):
         # now that player moved, check if wall needs to be built
         if self.add_wall is not None:
             new_wall = Wall(position=self.add_wall)
-            self.grid.wall_locations[tuple(new_wall.position)] = new_wall
+            self.grid.add_wall(new_wall)
             self.add_wall = None
             wall_msg = {"type": "wall_built", "wall": new_wall.serialize()}
             msgs["wall"] = wall_msg
@@ -1074,11 +1691,7 @@ class Player(object):
         """Return all adjacent players."""
         if self.grid is None:
             return []
-        return [
-            p
-            for p in self.grid.players.values()
-            if (self.is_neighbor(p, d=d) and (p is not self))
-        ]
+        return [p for p in self.grid.players_near(self.position, d=d) if p is not self]
 
     def serialize(self):
         return {
@@ -1134,60 +1747,103 @@ class Griduniverse(Experiment):
     channel = "griduniverse_ctrl"
     state_count = 0
     replay_path = "/grid"
+    # The name of the game's gridworld in ``gridworlds``
+    grid_name = "griduniverse"
 
     def __init__(self, session=None):
         """Initialize the experiment."""
         self.config = get_config()
         super(Griduniverse, self).__init__(session)
-        self.experiment_repeats = 1
+        # One network per room
+        self.experiment_repeats = self.config.get("num_rooms", 1)
         self.redis_conn = db.redis_conn
+        self.tick_scheduler = TickScheduler(
+            hz=self.config.get("tick_rate", 100.0),
+            max_catch_up=self.config.get("tick_max_catch_up", 5),
+        )
+        # Node and network ids events are recorded against, by node id
+        # (None for the environment)
+        self._event_origins = {}
+        # The games hosted by the experiment, by name, and the room of each
+        # player, by player id
+        self.rooms = {}
+        self.room_by_player_id = {}
         if session:
             self.setup()
-            self.grid = Gridworld(
-                log_event=self.record_event,
-                item_config=self.item_config,
-                transition_config=self.transition_config,
-                player_config=self.player_config,
-                **self.config.as_dict(),
-            )
+            networks = sorted(self.networks(), key=lambda network: network.id)
+            for network in networks:
+                name = self._room_name(network.id, len(networks))
+                self.rooms[name] = self._make_room(name, network.id)
+            # The grid of the first room, which holds the settings shared by
+            # all rooms
+            self.grid = self.first_room.grid
             self.session.commit()
 
+    def _room_name(self, network_id, num_networks):
+        """Return the name of the room of the network ``network_id``, out of
+        ``num_networks``.
+        """
+        if num_networks == 1:
+            return self.grid_name
+        return "{}_{}".format(self.grid_name, network_id)
+
+    def _make_room(self, name, network_id):
+        grid = gridworlds.get_or_create(
+            name,
+            log_event=self.record_event,
+            item_config=self.item_config,
+            transition_config=self.transition_config,
+            player_config=self.player_config,
+            **self.config.as_dict(),
+        )
+        return Room(
+            name,
+            grid,
+            network_id=network_id,
+            state_tracker=StateTracker(
+                keyframe_interval=self.config.get("state_keyframe_interval", 50)
+            ),
+            snapshot_policy=SnapshotPolicy(
+                interval=self.config.get("snapshot_interval", 0.0),
+                keyframe_interval=self.config.get("snapshot_keyframe_interval", 10.0),
+            ),
+            state_format=self.config.get("state_format", "json"),
+            interest_margin=(
+                self.config.get("interest_margin", 2)
+                if self.config.get("interest_management", False)
+                else None
+            ),
+        )
+
+    def room_for(self, player_id):
+        """Return the room of ``player_id``, or the first room if they
+        haven't been routed to one.
+        """
+        room = self.room_by_player_id.get(player_id)
+        if room is None:
+            room = self.first_room
+        return room
+
+    @property
+    def first_room(self):
+        return next(iter(self.rooms.values()))
+
     def configure(self):
         super(Griduniverse, self).configure()
+        # Participants per room
         self.num_participants = self.config.get("max_participants", 3)
         self.quorum = self.num_participants
         self.initial_recruitment_size = self.config.get(
-            "num_recruits", self.num_participants
+            "num_recruits", self.num_participants * self.config.get("num_rooms", 1)
         )
         self.network_factory = self.config.get("network", "FullyConnected")
 
-        game_config_file = os.path.join(os.path.dirname(__file__), GAME_CONFIG_FILE)
-        with open(game_config_file, "r") as game_config_stream:
-            self.game_config = yaml.safe_load(game_config_stream)
-        self.item_config = {o["item_id"]: o for o in self.game_config.get("items", ())}
-
-        # If any item is missing a key, add it with default value.
-        item_defaults = self.game_config.get("item_defaults", {})
-        for item in self.item_config.values():
-            for prop in item_defaults:
-                if prop not in item:
-                    item[prop] = item_defaults[prop]
-
-        self.transition_config = {}
-        transition_defaults = self.game_config.get("transition_defaults", {})
-        for t in self.game_config.get("transitions", ()):
-            transition = transition_defaults.copy()
-            transition.update(t)
-            if transition["last_use"]:
-                self.transition_config[
-                    ("last", t["actor_start"], t["target_start"])
-                ] = transition
-            else:
-                self.transition_config[
-                    (t["actor_start"], t["target_start"])
-                ] = transition
-
-        self.player_config = self.game_config.get("player_config")
+        self.game_config = read_game_config()
+        (
+            self.item_config,
+            self.transition_config,
+            self.player_config,
+        ) = parse_game_config(self.game_config)
         # This is accessed by the grid.html template to load the configuration on the client side:
         # TODO: could this instead be passed as an arg to the template in
         # the /grid route?
@@ -1207,8 +1863,17 @@ class Griduniverse(Experiment):
 
     @property
     def environment(self):
-        environment = self.socket_session.query(dallinger.nodes.Environment).one()
-        return environment
+        """The environment of the first room."""
+        return self.environment_for(self.rooms and self.first_room.network_id)
+
+    def environment_for(self, network_id=None):
+        """Return the environment node of the network ``network_id``, or of
+        the only network if None.
+        """
+        query = self.socket_session.query(dallinger.nodes.Environment)
+        if network_id:
+            query = query.filter_by(network_id=network_id)
+        return query.one()
 
     @cached_property
     def socket_session(self):
@@ -1220,6 +1885,22 @@ class Griduniverse(Experiment):
         )
         return session
 
+    @cached_property
+    def event_recorder(self):
+        return EventRecorder(
+            self.socket_session,
+            batch_size=self.config.get("event_batch_size", 500),
+            flush_interval=self.config.get("event_flush_interval", 0.25),
+            max_queue_size=self.config.get("event_queue_size", 10000),
+        )
+
+    @cached_property
+    def outbox(self):
+        return Outbox(
+            self.redis_conn,
+            max_queue_size=self.config.get("publish_queue_size", 1000),
+        )
+
     @property
     def background_tasks(self):
         if self.config.get("replay", False):
@@ -1227,6 +1908,7 @@ class Griduniverse(Experiment):
         return [
             self.send_state_thread,
             self.game_loop,
+            self.event_recorder.run,
         ]
 
     def create_network(self):
@@ -1282,6 +1964,7 @@ class Griduniverse(Experiment):
         mapping = {
             "connect": self.handle_connect,
             "disconnect": self.handle_disconnect,
+            "state_resync": self.handle_state_resync,
         }
         if not self.config.get("replay", False):
             # Ignore these events in replay mode
@@ -1314,46 +1997,69 @@ class Griduniverse(Experiment):
         message = self.parse_message(raw_message)
         if message is not None:
             message["server_time"] = time.time()
+            if message.get("type") == "move" and self._queue_move(message):
+                # The game loop resolves and records the move on its next tick
+                return
             self.dispatch((message))
             if "player_id" in message:
                 self.record_event(message, message["player_id"])
 
+    def _queue_move(self, msg):
+        """Queue the move ``msg`` if the game loop is running in its
+        player's room, returning whether it was queued.
+        """
+        room = self.room_for(msg["player_id"])
+        if room.move_queue is None:
+            return False
+        room.move_queue.add(msg)
+        return True
+
     def parse_message(self, raw_message):
         """Strip the channel prefix off the raw message, then return
         the parsed JSON.
         """
         if raw_message.startswith(self.channel + ":"):
             body = raw_message.replace(self.channel + ":", "")
-            message = json.loads(body)
+            message = encoding.loads(body)
 
             return message
 
     def record_event(self, details, player_id=None):
-        """Record an event in the Info table."""
-        session = self.socket_session
+        """Record an event in the Info table.
+
+        Events are written in batches by ``event_recorder``.
+        """
         if player_id == "spectator":
             return
-        elif player_id:
-            node_id = self.node_by_player_id[player_id]
-            node = session.query(dallinger.models.Node).get(node_id)
-        else:
-            node = self.environment
+        node_id, network_id = self._event_origin(player_id)
+        self.event_recorder.record(node_id, network_id, details)
 
-        try:
-            info = Event(origin=node, details=details)
-        except ValueError:
-            logger.info(
-                "Tried to record an event after node#{} failure: {}".format(
-                    node.id, details
-                )
-            )
-            return
-        session.add(info)
-        session.commit()
+    def _event_origin(self, player_id=None):
+        """Return the ids of the node and network for events from
+        ``player_id``, or from the environment if None.
+        """
+        node_id = self.node_by_player_id[player_id] if player_id else None
+        if node_id not in self._event_origins:
+            if node_id is None:
+                node = self.environment
+            else:
+                node = self.socket_session.query(dallinger.models.Node).get(node_id)
+            self._event_origins[node_id] = (node.id, node.network_id)
+        return self._event_origins[node_id]
 
-    def publish(self, msg):
-        """Publish a message to all griduniverse clients"""
-        self.redis_conn.publish("griduniverse", json.dumps(msg))
+    def publish(self, msg, room=None, channel=None):
+        """Publish a message to the clients in ``room``, or to those in the
+        lobby if None, or else on ``channel``. ``msg`` may already be encoded
+        as a JSON string.
+
+        Messages are published in batches by ``outbox`` while the game loop
+        runs.
+        """
+        if channel is None:
+            channel = LOBBY_CHANNEL if room is None else room.channel
+        if not isinstance(msg, str):
+            msg = encoding.dumps(msg)
+        self.outbox.publish(channel, msg)
 
     def handle_connect(self, msg):
         player_id = msg["player_id"]
@@ -1364,60 +2070,202 @@ class Griduniverse(Experiment):
                 self.grid.start_timestamp = time.time()
         if player_id == "spectator":
             logger.info("A spectator has connected.")
+            self._negotiate_state_format(msg, self.rooms.values())
+            # Make sure the newcomer gets the full state rather than a delta
+            for room in self.rooms.values():
+                room.state_tracker.request_keyframe()
+                if room.manages_interest:
+                    self._send_spectator_channel(room)
             return
 
         logger.info("Client {} has connected.".format(player_id))
         client_count = len(self.node_by_player_id)
-        logger.info("Grid num players: {}".format(self.grid.num_players))
-        if client_count < self.grid.num_players:
+        capacity = sum(room.grid.num_players for room in self.rooms.values())
+        logger.info("Grid num players: {}".format(capacity))
+        if player_id in self.room_by_player_id:
+            room = self.room_by_player_id[player_id]
+            self._negotiate_state_format(msg, [room])
+            self._route_player(player_id, room)
+        elif client_count < capacity:
             participant = self.session.query(dallinger.models.Participant).get(
                 player_id
             )
             network = self.get_network_for_participant(participant)
             if network:
+                room = self._room_for_network(network.id)
+                if (
+                    player_id not in room.grid.players
+                    and not room.grid.empty_mask().any()
+                ):
+                    # Don't give the player a node they can't play with
+                    logger.warning(
+                        "{} is full, not adding player {}".format(room, player_id)
+                    )
+                    return
                 logger.info("Found an open network. Adding participant node...")
                 node = self.create_node(participant, network)
                 self.node_by_player_id[player_id] = node.id
                 self.session.add(node)
                 self.session.commit()
-                logger.info("Spawning player on the grid...")
+                logger.info("Spawning player in {}...".format(room))
                 # We use the current node id modulo the number of colours
                 # to pick the user's colour. This ensures that players are
                 # allocated to colours uniformly.
-                if player_id not in self.grid.players:
-                    self.grid.spawn_player(
+                if player_id not in room.grid.players:
+                    room.grid.spawn_player(
                         id=player_id,
-                        color_name=self.grid.limited_player_color_names[
-                            node.id % self.grid.num_colors
+                        color_name=room.grid.limited_player_color_names[
+                            node.id % room.grid.num_colors
                         ],
                         recruiter_id=participant.recruiter_id,
                     )
+                self._negotiate_state_format(msg, [room])
+                self._route_player(player_id, room)
             else:
                 logger.info("No free network found for player {}".format(player_id))
 
+    def _room_for_network(self, network_id):
+        for room in self.rooms.values():
+            if room.network_id == network_id:
+                return room
+        return self.first_room
+
+    def _negotiate_state_format(self, msg, rooms):
+        """Agree on the format of the state messages sent to the client
+        connecting with ``msg``, which lists the ``formats`` it can decode.
+
+        Rooms send their state in the configured ``state_format`` as long
+        as all of their clients can decode it, and in JSON otherwise. Clients
+        which can decode binary state are sent its schema on the lobby
+        channel, which they listen on while connecting.
+        """
+        formats = msg.get("formats", ["json"])
+        for room in rooms:
+            if room.state_format not in formats:
+                logger.info(
+                    "Client {} can't decode {} state, sending {} JSON.".format(
+                        msg["player_id"], room.state_format, room
+                    )
+                )
+                room.set_state_format("json")
+        if "binary" in formats and self.config.get("state_format", "json") == "binary":
+            self.publish(
+                {
+                    "type": "state_schema",
+                    "player_id": msg["player_id"],
+                    "format": "binary",
+                    "schema": encoding.SCHEMA,
+                }
+            )
+
+    def _route_player(self, player_id, room):
+        """Send ``player_id`` to ``room``, telling their client to listen on
+        its channel if that isn't the lobby, and on their own channel.
+        """
+        self.room_by_player_id[player_id] = room
+        # Make sure the newcomer gets the full state rather than a delta
+        room.state_tracker.request_keyframe()
+        self._send_player_channel(player_id, room)
+        if room.channel != LOBBY_CHANNEL:
+            self.publish(
+                {
+                    "type": "room",
+                    "player_id": player_id,
+                    "room": room.name,
+                    "channel": room.channel,
+                }
+            )
+
+    def _send_player_channel(self, player_id, room):
+        """Tell the client of ``player_id`` which channel of ``room`` the
+        messages meant for them only are published on, which is also where
+        their view of the room is if it manages interest.
+
+        They are told on the lobby channel, which they listen on while
+        connecting.
+        """
+        if room.manages_interest:
+            room.view_for(player_id).state_tracker.request_keyframe()
+        self.publish(
+            {
+                "type": "player_channel",
+                "player_id": player_id,
+                "room": room.name,
+                "channel": room.player_channel(player_id),
+            }
+        )
+
+    def _send_spectator_channel(self, room):
+        """Tell spectators, on the channel of ``room``, which channel their
+        view of it is published on, and send them a keyframe.
+        """
+        view = room.view_for(None)
+        view.state_tracker.request_keyframe()
+        self.publish(
+            {
+                "type": "state_channel",
+                "player_id": "spectator",
+                "room": room.name,
+                "channel": view.channel,
+            },
+            room,
+        )
+
+    def send_to_player(self, player_id, msg, room=None):
+        """Publish ``msg`` to the client of ``player_id`` only, on their
+        channel in ``room``, or in the room they are in if None.
+        """
+        if room is None:
+            room = self.room_for(player_id)
+        self.publish(msg, channel=room.player_channel(player_id))
+
     def handle_disconnect(self, msg):
-        logger.info("Client {} has disconnected.".format(msg["player_id"]))
+        player_id = msg["player_id"]
+        logger.info("Client {} has disconnected.".format(player_id))
+        # Spectators aren't routed to a room, and keep their shared view
+        room = self.room_by_player_id.get(player_id)
+        if room is not None:
+            room.remove_view(player_id)
+
+    def handle_state_resync(self, msg):
+        """A client has missed a state delta, so send everyone in its room,
+        or in every room if it doesn't say, a keyframe.
+        """
+        player_id = msg.get("player_id")
+        if player_id is None or player_id == "spectator":
+            rooms = self.rooms.values()
+            player_id = None
+        else:
+            rooms = [self.room_for(player_id)]
+        for room in rooms:
+            room.state_tracker.request_keyframe()
+            if player_id in room.views:
+                room.views[player_id].state_tracker.request_keyframe()
 
     def handle_chat_message(self, msg):
         """Publish the given message to all clients."""
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
         message = {
             "type": "chat",
             "message": msg,
         }
 
-        self.grid.chat_message_history.append(
+        grid.chat_message_history.append(
             (
-                self.grid.players[msg["player_id"]],
+                grid.players[msg["player_id"]],
                 msg["server_time"],
                 msg["contents"],
             )
         )
         # We only publish if it wasn't already broadcast
         if not msg.get("broadcast", False):
-            self.publish(message)
+            self.publish(message, room)
 
     def handle_change_color(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
+        player = grid.players[msg["player_id"]]
         color_name = msg["color"]
         color_idx = Gridworld.player_color_names.index(color_name)
         old_color = Gridworld.player_color_names[player.color_idx]
@@ -1427,11 +2275,11 @@ class Griduniverse(Experiment):
         if player.color_idx == color_idx:
             return  # Requested color change is no change at all.
 
-        if self.grid.costly_colors:
-            if player.score < self.grid.color_costs[color_idx]:
+        if grid.costly_colors:
+            if player.score < grid.color_costs[color_idx]:
                 return
             else:
-                player.score -= self.grid.color_costs[color_idx]
+                player.score -= grid.color_costs[color_idx]
 
         player.color = msg["color"]
         player.color_idx = color_idx
@@ -1443,50 +2291,77 @@ class Griduniverse(Experiment):
             "new_color": player.color_name,
         }
         # Put the message back on the channel
-        self.publish(message)
+        self.publish(message, room)
         self.record_event(message, message["player_id"])
 
     def handle_move(self, msg):
-        player = self.grid.players[msg["player_id"]]
-        try:
-            msgs = player.move(msg["move"], timestamp=msg.get("timestamp"))
-        except IllegalMove:
+        room = self.room_for(msg["player_id"])
+        if not self._apply_move(room, msg):
             error_msg = {
                 "type": "move_rejection",
-                "player_id": player.id,
+                "player_id": msg["player_id"],
             }
-            self.publish(error_msg)
-        else:
-            if msgs is not None:
-                msg["actual"] = msgs["direction"]
-                if msgs.get("wall"):
-                    wall_msg = msgs.get("wall")
-                    self.publish(wall_msg)
-                    self.record_event(wall_msg)
+            self.send_to_player(msg["player_id"], error_msg, room)
+
+    def _apply_move(self, room, msg):
+        """Move the player who sent ``msg`` in ``room``, returning False if
+        the move is illegal.
+        """
+        player = room.grid.players[msg["player_id"]]
+        try:
+            msgs = player.move(msg["move"], timestamp=msg.get("timestamp"))
+        except IllegalMove:
+            return False
+        if msgs is not None:
+            msg["actual"] = msgs["direction"]
+            if msgs.get("wall"):
+                wall_msg = msgs.get("wall")
+                self.publish(wall_msg, room)
+                self.record_event(wall_msg)
+        return True
+
+    def resolve_moves(self, room):
+        """Resolve the moves queued in ``room`` since the previous tick, in
+        the order given by ``MoveQueue.drain``, then send each player whose
+        moves were rejected one ``move_rejection``.
+        """
+        rejected = []
+        for msg in room.move_queue.drain():
+            player_id = msg["player_id"]
+            if player_id in room.grid.players and not self._apply_move(room, msg):
+                if player_id not in rejected:
+                    rejected.append(player_id)
+            self.record_event(msg, player_id)
+        for player_id in rejected:
+            self.send_to_player(
+                player_id, {"type": "move_rejection", "player_id": player_id}, room
+            )
 
     def handle_donation(self, msg):
         """Send a donation from one player to one or more other players."""
-        if not self.grid.donation_active:
+        room = self.room_for(msg["donor_id"])
+        grid = room.grid
+        if not grid.donation_active:
             return
 
         recipients = []
         recipient_id = msg["recipient_id"]
 
-        if recipient_id.startswith("group:") and self.grid.group_donation_enabled:
+        if recipient_id.startswith("group:") and grid.group_donation_enabled:
             color_id = recipient_id[6:]
-            recipients = self.grid.players_with_color(color_id)
-        elif recipient_id == "all" and self.grid.donation_public:
-            recipients = self.grid.players.values()
-        elif self.grid.donation_individual:
-            recipient = self.grid.players.get(recipient_id)
+            recipients = grid.players_with_color(color_id)
+        elif recipient_id == "all" and grid.donation_public:
+            recipients = grid.players.values()
+        elif grid.donation_individual:
+            recipient = grid.players.get(recipient_id)
             if recipient:
                 recipients.append(recipient)
-        donor = self.grid.players[msg["donor_id"]]
+        donor = grid.players[msg["donor_id"]]
         donation = msg["amount"]
 
         if donor.score >= donation and len(recipients):
             donor.score -= donation
-            donated = donation * self.grid.donation_multiplier
+            donated = donation * grid.donation_multiplier
             if len(recipients) > 1:
                 donated = round(donated / len(recipients), 2)
             for recipient in recipients:
@@ -1498,34 +2373,39 @@ class Griduniverse(Experiment):
                 "amount": donation,
                 "received": donated,
             }
-            self.publish(message)
+            self.publish(message, room)
             self.record_event(message, message["donor_id"])
 
     def handle_plant_food(self, msg):
+        grid = self.room_for(msg["player_id"]).grid
         # Legacy. For now, take planting info from first defined item.
         planting_cost = list(self.item_config.values())[0]["planting_cost"]
-        player = self.grid.players[msg["player_id"]]
+        player = grid.players[msg["player_id"]]
         position = msg["position"]
         can_afford = player.score >= planting_cost
-        if can_afford and not self.grid.has_item(position):
+        if can_afford and not grid.has_item(position):
             player.score -= planting_cost
-            self.grid.spawn_item(position=position)
+            grid.spawn_item(position=position)
 
     def handle_toggle_visible(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        grid = self.room_for(msg["player_id"]).grid
+        player = grid.players[msg["player_id"]]
         player.identity_visible = msg["identity_visible"]
 
     def handle_build_wall(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        grid = self.room_for(msg["player_id"]).grid
+        player = grid.players[msg["player_id"]]
         position = msg["position"]
-        can_afford = player.score >= self.grid.wall_building_cost
+        can_afford = player.score >= grid.wall_building_cost
         msg["success"] = can_afford
         if can_afford:
-            player.score -= self.grid.wall_building_cost
+            player.score -= grid.wall_building_cost
             player.add_wall = position
 
     def handle_item_consume(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
+        player = grid.players[msg["player_id"]]
         player_item = player.current_item
         if player_item is None or not player_item.calories:
             error_msg = {
@@ -1533,29 +2413,31 @@ class Griduniverse(Experiment):
                 "player_id": player.id,
                 "player_item": player_item and player_item.serialize(),
             }
-            self.publish(error_msg)
+            self.send_to_player(player.id, error_msg, room)
             return
 
         player_item.remaining_uses -= 1
         if not player_item.remaining_uses:
-            self.grid.items_consumed.append(player_item)
+            grid.items_consumed.append(player_item)
             player.current_item = None
 
         if player.color_idx > 0:
             calories = player_item.calories
         else:
-            calories = player_item.calories * self.grid.relative_deprivation
+            calories = player_item.calories * grid.relative_deprivation
 
         player.score += calories
         if player_item.public_good:
-            for player_to in self.grid.players.values():
+            for player_to in grid.players.values():
                 player_to.score += player_item.public_good
 
     def handle_item_pick_up(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
+        player = grid.players[msg["player_id"]]
         player_item = player.current_item
         position = tuple(msg["position"])
-        location_item = self.grid.item_locations.get(position)
+        location_item = grid.item_locations.get(position)
         if player_item is not None or location_item is None:
             error_msg = {
                 "type": "action_error",
@@ -1564,18 +2446,19 @@ class Griduniverse(Experiment):
                 "item": location_item and location_item.serialize(),
                 "player_item": player_item and player_item.serialize(),
             }
-            self.publish(error_msg)
+            self.send_to_player(player.id, error_msg, room)
             return
+        grid.remove_item(position)
         location_item.position = None
-        del self.grid.item_locations[position]
         player.current_item = location_item
-        self.grid.items_updated = True
 
     def handle_item_transition(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
+        player = grid.players[msg["player_id"]]
         player_item = player.current_item
         position = tuple(msg["position"])
-        location_item = self.grid.item_locations.get(position)
+        location_item = grid.item_locations.get(position)
         transition = None
 
         actor_key = player_item and player_item.item_id
@@ -1602,7 +2485,7 @@ class Griduniverse(Experiment):
                 "item": location_item and location_item.serialize(),
                 "player_item": player_item and player_item.serialize(),
             }
-            self.publish(error_msg)
+            self.send_to_player(player.id, error_msg, room)
             return
 
         # these values may be positive or negative, so we may add or remove uses
@@ -1611,43 +2494,41 @@ class Griduniverse(Experiment):
             player_item.remaining_uses += modify_actor_uses
         if location_item and location_item.remaining_uses:
             location_item.remaining_uses += modify_target_uses
+            grid.mark_item_changed(position)
 
         # An item that is replaced or has no remaining uses has been "consumed"
         if player_item and (
             (player_item.remaining_uses < 1) or transition["actor_end"] != actor_key
         ):
-            self.grid.items_consumed.append(player_item)
+            grid.items_consumed.append(player_item)
             player.current_item = None
-            self.grid.items_updated = True
+            grid.items_updated = True
         if location_item and (
             (location_item.remaining_uses < 1) or transition["target_end"] != target_key
         ):
-            del self.grid.item_locations[position]
-            self.grid.items_consumed.append(location_item)
-            self.grid.items_updated = True
+            grid.remove_item(position)
+            grid.items_consumed.append(location_item)
 
         # The player's item type has changed
         if transition["actor_end"] != actor_key:
             if transition["actor_end"] is not None:
-                replacement_item_config = self.item_config.get(transition["actor_end"])
                 replacement_item = Item(
-                    id=len(self.grid.item_locations) + len(self.grid.items_consumed),
-                    item_config=replacement_item_config,
+                    id=len(grid.item_locations) + len(grid.items_consumed),
+                    item_config=grid.item_type(transition["actor_end"]),
                 )
             else:
                 replacement_item = None
             player.current_item = replacement_item
-            self.grid.items_updated = True
+            grid.items_updated = True
 
         # The location's item type has changed
         if transition["target_end"] != target_key:
             new_target_item = Item(
-                id=len(self.grid.item_locations) + len(self.grid.items_consumed),
+                id=len(grid.item_locations) + len(grid.items_consumed),
                 position=position,
-                item_config=self.item_config[transition["target_end"]],
+                item_config=grid.item_type(transition["target_end"]),
             )
-            self.grid.item_locations[position] = new_target_item
-            self.grid.items_updated = True
+            grid.add_item(new_target_item)
 
         # Possibly distribute calories to participating players
         transition_calories = transition.get("calories")
@@ -1659,10 +2540,12 @@ class Griduniverse(Experiment):
             player.score += transition_calories % (len(neighbors) + 1)
 
     def handle_item_drop(self, msg):
-        player = self.grid.players[msg["player_id"]]
+        room = self.room_for(msg["player_id"])
+        grid = room.grid
+        player = grid.players[msg["player_id"]]
         player_item = player.current_item
         position = tuple(msg["position"])
-        location_item = self.grid.item_locations.get(position)
+        location_item = grid.item_locations.get(position)
         if player_item is None or location_item is not None:
             error_msg = {
                 "type": "action_error",
@@ -1671,169 +2554,232 @@ class Griduniverse(Experiment):
                 "item": location_item and location_item.serialize(),
                 "player_item": player_item and player_item.serialize(),
             }
-            self.publish(error_msg)
+            self.send_to_player(player.id, error_msg, room)
             return
         player_item.position = position
-        self.grid.item_locations[position] = player_item
+        grid.add_item(player_item)
         player.current_item = None
-        self.grid.items_updated = True
 
     def send_state_thread(self):
-        """Publish the current state of the grid and game"""
-        count = 0
-        last_player_count = 0
+        """Publish the current state of the grid and game in every room,
+        until each room's game is over.
+
+        Only the players, items and walls which changed since the previous
+        message are published, with periodic keyframes of the full state.
+        See ``broadcast.StateTracker``.
+        """
         gevent.sleep(1.00)
-        last_walls = []
-        last_items = []
+        rooms = list(self.rooms.values())
 
         # Sleep until we have walls
-        while self.grid.walls_density and not self.grid.wall_locations:
+        while any(
+            room.grid.walls_density and not room.grid.wall_locations for room in rooms
+        ):
             gevent.sleep(0.1)
 
-        while True:
+        while rooms:
             gevent.sleep(self.config.get("state_interval", 0.050))
+            for room in list(rooms):
+                self.send_state(room)
+                if room.grid.game_over:
+                    rooms.remove(room)
+            self.outbox.flush()
+
+    def send_state(self, room):
+        """Publish the current state of the grid and game in ``room``."""
+        if room.manages_interest:
+            return self._send_views(room)
+        grid = room.grid
+        tracker = room.state_tracker
+        room.state_count += 1
+
+        keyframe = tracker.keyframe_due
+        update_items = keyframe or grid.items_changed_since(room.last_generation)
+        update_walls = keyframe or len(grid.wall_locations) != len(tracker.walls)
+
+        grid_state = grid.serialize(
+            include_walls=update_walls, include_items=update_items
+        )
 
-            # Send all item data once every 40 loops
-            update_walls = update_items = False
-            if (count % 50) == 0:
-                update_items = True
-            count += 1
-
-            player_count = len(self.grid.players)
-            if not last_player_count or player_count != last_player_count:
-                update_walls = True
-                update_items = True
-                last_player_count = player_count
-
-            if not last_walls:
-                update_walls = True
-
-            if not last_items or self.grid.items_changed(last_items):
-                update_items = True
+        if update_items:
+            room.last_generation = grid.item_generation
 
-            grid_state = self.grid.serialize(
-                include_walls=update_walls, include_items=update_items
-            )
-
-            if update_walls:
-                last_walls = grid_state["walls"]
+        message = {
+            "type": "state",
+            "grid": tracker.update(grid_state),
+            "count": room.state_count,
+            "remaining_time": grid.remaining_round_time,
+            "round": grid.round,
+        }
 
-            if update_items:
-                last_items = grid_state["items"]
+        self.publish(room.state_encoder.encode(message), room)
 
+    def _send_views(self, room):
+        """Publish the part of the state of ``room`` each of its players can
+        see on their own channel, and all of it to its spectators.
+        """
+        grid = room.grid
+        room.state_count += 1
+        room.indexed_state.update(grid)
+        for view in list(room.views.values()):
+            payload = view.update(grid, room.indexed_state)
+            if payload is None:
+                continue
             message = {
                 "type": "state",
-                "grid": json.dumps(grid_state),
-                "count": count,
-                "remaining_time": self.grid.remaining_round_time,
-                "round": self.grid.round,
+                "grid": payload,
+                "count": room.state_count,
+                "remaining_time": grid.remaining_round_time,
+                "round": grid.round,
             }
-
-            self.publish(message)
-            if self.grid.game_over:
-                return
+            self.publish(view.state_encoder.encode(message), channel=view.channel)
 
     def game_loop(self):
-        """Update the world state."""
+        """Update the world state of every room, until each room's game is
+        over.
+        """
         gevent.sleep(0.1)
+        rooms = list(self.rooms.values())
+        for room in rooms:
+            self.populate_grid(room.grid)
+            if not self.config.get("replay", False):
+                # Moves are resolved in batches while the loop runs
+                room.move_queue = MoveQueue()
+
+        while not any(room.grid.game_started for room in rooms):
+            gevent.sleep(0.01)
+
+        scheduler = self.tick_scheduler
+
+        def tick(now):
+            for room in rooms:
+                if room.grid.game_started:
+                    self.tick_room(room, now)
+            with scheduler.phase("publish"):
+                self.outbox.flush()
+
+        def over():
+            for room in list(rooms):
+                if room.grid.game_over:
+                    rooms.remove(room)
+                    self._stop_move_queue(room)
+                    self.publish({"type": "stop"}, room)
+                    self.record_snapshot(room, time.time(), force=True)
+            return not rooms
+
+        # Messages sent during a tick are published together at its end
+        self.outbox.start()
+        scheduler.run(tick, until=over)
+        logger.info(
+            "Game loop ran {ticks} ticks with {overruns} overruns "
+            "and {skipped_ticks} skipped ticks".format_map(scheduler.stats)
+        )
+        for name, timing in scheduler.summary().items():
+            logger.info(
+                "Tick phase {}: mean {:.2f}ms, max {:.2f}ms".format(
+                    name, timing["mean_ms"], timing["max_ms"]
+                )
+            )
+
+        for room in self.rooms.values():
+            self._stop_move_queue(room)
+        self.outbox.stop()
+        self.event_recorder.stop()
+        self.socket_session.commit()
+        return
+
+    def _stop_move_queue(self, room):
+        """Resolve the moves still queued in ``room``, which arrived during
+        its last tick, and go back to handling moves as they arrive.
+        """
+        if room.move_queue is None:
+            return
+        self.resolve_moves(room)
+        logger.info(
+            "{} resolved {moves} moves in {batches} batches of at most "
+            "{max_batch}".format(room, **room.move_queue.stats)
+        )
+        room.move_queue = None
+
+    def populate_grid(self, grid):
+        """Lay out the walls and items of ``grid`` for a new game."""
         map_csv_path = self.config.get("map_csv", None)
         if map_csv_path is not None:
-            self.grid.load_map(map_csv_path)
+            grid.load_map(map_csv_path)
         elif not self.config.get("replay", False):
-            self.grid.build_labyrinth()
+            grid.build_labyrinth()
             logger.info("Spawning items")
-            for item_type in self.item_config.values():
-                for i in range(item_type["item_count"]):
-                    if (i % 250) == 0:
-                        gevent.sleep(0.00001)
-                    self.grid.spawn_item(item_id=item_type["item_id"])
+            for item_type in grid.item_config.values():
+                grid.spawn_items(item_type["item_count"], item_type["item_id"])
+                gevent.sleep(0.00001)
+
+    def tick_room(self, room, now):
+        """Advance the game in ``room`` by one tick of the game loop."""
+        grid = room.grid
+        scheduler = self.tick_scheduler
+        if room.persistence is None:
+            # Persistence runs on its own schedule, starting with the
+            # room's first tick
+            snapshot_interval = room.snapshot_policy.interval
+            room.persistence = Interval(snapshot_interval, now - snapshot_interval)
+            room.timed_events = Interval(1.0, grid.start_timestamp)
+
+        if room.persistence.due(now):
+            # Record grid state to database
+            with scheduler.phase("persistence"):
+                self.record_snapshot(room, now)
+                grid.walls_updated = False
+                grid.items_updated = False
 
-        while not self.grid.game_started:
-            gevent.sleep(0.01)
+        if room.move_queue is not None:
+            with scheduler.phase("moves"):
+                self.resolve_moves(room)
 
-        previous_second_timestamp = self.grid.start_timestamp
-        count = 0
+        # TODO: Most of this code belongs in Gridworld; we're just looking
+        # at properties of that class and then telling it to do things based
+        # on the values.
 
-        while not self.grid.game_over:
-            # Record grid state to database
-            state_data = self.grid.serialize(
-                include_walls=self.grid.walls_updated,
-                include_items=self.grid.items_updated,
-            )
-            state = self.environment.update(json.dumps(state_data), details=state_data)
-            self.socket_session.add(state)
-            self.socket_session.commit()
-            count += 1
-            self.grid.walls_updated = False
-            self.grid.items_updated = False
-            gevent.sleep(0.010)
-
-            # TODO: Most of this code belongs in Gridworld; we're just looking
-            # at properties of that class and then telling it to do things based
-            # on the values.
-
-            # Log item updates every hundred rounds to capture maturity changes
-            if self.grid.includes_maturing_items and (count % 100) == 0:
-                self.grid.items_updated = True
-            now = time.time()
-
-            # Update motion.
-            if self.grid.motion_auto:
-                for player in self.grid.players.values():
+        # Update motion.
+        if grid.motion_auto:
+            with scheduler.phase("motion"):
+                for player in grid.players.values():
                     player.move(player.motion_direction, tremble_rate=0)
 
-            # Consume the food.
-            if self.grid.consumption_active:
-                self.grid.consume()
-
-            # Spread through contagion.
-            if self.grid.contagion > 0:
-                self.grid.spread_contagion()
-
-            # Trigger time-based events.
-            if (now - previous_second_timestamp) > 1.000:
-                # Grow or shrink the item stores.
-                self.grid.replenish_items()
-                # Trigger automatic transitions.
-                self.grid.trigger_transitions()
-
-                abundances = {}
-                for player in self.grid.players.values():
-                    # Apply tax.
-                    player.score = max(player.score - self.grid.tax, 0)
-                    if player.color not in abundances:
-                        abundances[player.color] = 0
-                    abundances[player.color] += 1
-
-                # Apply frequency-dependent payoff.
-                if self.grid.frequency_dependence:
-                    for player in self.grid.players.values():
-                        relative_frequency = (
-                            1.0 * abundances[player.color] / len(self.grid.players)
-                        )
-                        payoff = (
-                            fermi(
-                                beta=self.grid.frequency_dependence,
-                                p1=relative_frequency,
-                                p2=0.5,
-                            )
-                            * self.grid.frequency_dependent_payoff_rate
-                        )
-
-                        player.score = max(player.score + payoff, 0)
-
-                previous_second_timestamp = now
-
-            self.grid.compute_payoffs()
-            game_round = self.grid.round
-            self.grid.check_round_completion()
-            if self.grid.round != game_round and not self.grid.game_over:
-                self.publish({"type": "new_round", "round": self.grid.round})
-                self.record_event({"type": "new_round", "round": self.grid.round})
-
-        self.publish({"type": "stop"})
+        # Consume the food.
+        if grid.consumption_active:
+            with scheduler.phase("consume"):
+                grid.consume()
+
+        # Spread through contagion.
+        if grid.contagion > 0:
+            with scheduler.phase("contagion"):
+                grid.spread_contagion()
+
+        # Trigger time-based events.
+        if room.timed_events.due(now):
+            with scheduler.phase("replenish"):
+                grid.apply_timed_events()
+
+        with scheduler.phase("payoffs"):
+            grid.compute_payoffs()
+            game_round = grid.round
+            grid.check_round_completion()
+        if grid.round != game_round and not grid.game_over:
+            self.publish({"type": "new_round", "round": grid.round}, room)
+            self.record_event({"type": "new_round", "round": grid.round})
+
+    def record_snapshot(self, room, now, force=False):
+        """Record the grid state of ``room`` as a State of its environment,
+        if its ``snapshot_policy`` calls for one.
+        """
+        state_data = room.snapshot_policy.snapshot(room.grid, now, force=force)
+        if state_data is None:
+            return
+        if room.environment is None:
+            room.environment = self.environment_for(room.network_id)
+        state = room.environment.update(encoding.dumps(state_data), details=state_data)
+        self.socket_session.add(state)
         self.socket_session.commit()
-        return
 
     def player_feedback(self, data):
         engagement = int(json.loads(data.questions.list[-1][-1])["engagement"])
@@ -1845,7 +2791,70 @@ class Griduniverse(Experiment):
             return engagement, difficulty
 
     def replay_start(self):
-        self.grid = Gridworld(log_event=self.record_event, **self.config.as_dict())
+        """Make the room of the dataset being replayed the experiment's only
+        room, with a new grid for its states to be applied to.
+
+        The grid replaces any of the same name in ``gridworlds``, so that
+        the handlers of the events replayed, which look up the room of each
+        player, act on it.
+        """
+        networks = sorted(
+            self.import_session.query(dallinger.models.Network),
+            key=lambda network: network.id,
+        )
+        names = [self._room_name(network.id, len(networks)) for network in networks]
+        name = self.config.get("replay_room", "") or names[0]
+        if name not in names:
+            raise ValueError("There is no room {} to replay".format(name))
+        network_id = networks[names.index(name)].id
+
+        gridworlds.remove(name)
+        room = self._make_room(name, network_id)
+        # The node the room's states were recorded against
+        room.environment = (
+            self.import_session.query(dallinger.nodes.Environment)
+            .filter_by(network_id=network_id)
+            .one()
+        )
+        self.rooms = {name: room}
+        self.room_by_player_id = {}
+        self.grid = room.grid
+
+    @property
+    def replay_room(self):
+        """The room being replayed, set up by ``replay_start``: the one
+        named ``replay_room`` in the dataset, or else its first room.
+        """
+        return self.first_room
+
+    @cached_property
+    def replay_index(self):
+        """Keyframes of the room being replayed, built on first use and kept
+        in ``replay_index_dir`` for later replays of the same room.
+        """
+        index_dir = self.config.get("replay_index_dir", "") or os.path.join(
+            tempfile.gettempdir(), "griduniverse-replay"
+        )
+        os.makedirs(index_dir, exist_ok=True)
+        room = self.replay_room
+        return ReplayIndex.load_or_build(
+            self.import_session,
+            os.path.join(index_dir, f"{self.original_app_id}-{room.name}.index"),
+            keyframe_interval=self.config.get("replay_keyframe_interval", 10.0),
+            origin_id=room.environment.id,
+        )
+
+    def _seek_to_keyframe(self, target):
+        """Load the latest keyframe before ``target``, if it is after the
+        state already replayed, and return whether one was loaded.
+        """
+        keyframe = self.replay_index.keyframe_before(target)
+        if keyframe is None or keyframe[0] <= self._replay_time_index:
+            return False
+        keyframe_time, state = keyframe
+        self.grid.apply_state(state)
+        self._replay_time_index = keyframe_time
+        return True
 
     def replay_started(self):
         return self.grid.game_started
@@ -1859,10 +2868,15 @@ class Griduniverse(Experiment):
         events = Experiment.events_for_replay(
             self, session=session, target=target
         ).order_by(False)
+        # Only replay the states and events of one room
+        events = events.filter(info_cls.network_id == self.replay_room.network_id)
         if target is None:
             # If we don't have a specific target time we can't optimise some states away
             return events
 
+        # Skip straight to the nearest keyframe if it's ahead of us
+        self._seek_to_keyframe(target)
+
         # We never care about events after the target time or before the current state
         events = events.filter(
             info_cls.creation_time <= target,
@@ -1879,6 +2893,16 @@ class Griduniverse(Experiment):
             .limit(1)
         )
 
+        # Get the item changes recorded by delta snapshots, to be applied on
+        # top of the most recent complete set of items
+        item_delta_events = events.filter(
+            info_cls.type == "state",
+            or_(
+                Event.details["items_changed"] != None,  # noqa: E711
+                Event.details["items_removed"] != None,  # noqa: E711
+            ),
+        )
+
         # Get the most recent eligible update that changed the wall positions
         wall_events = (
             events.filter(
@@ -1905,9 +2929,9 @@ class Griduniverse(Experiment):
             info_cls.type == "event", Event.details["type"].astext.in_(event_types)
         )
 
-        # Merge the above four queries, discarding duplicates, and put them in time ascending order
+        # Merge the above queries, discarding duplicates, and put them in time ascending order
         merged_events = item_events.union(
-            wall_events, update_events, typed_events
+            item_delta_events, wall_events, update_events, typed_events
         ).order_by(Event.creation_time.asc())
 
         # Limit the query to the type, the effective time and the JSONB field containing the data
@@ -1943,15 +2967,25 @@ class Griduniverse(Experiment):
                 "remaining_time": self.grid.remaining_round_time,
                 "round": state["round"],
             }
-            self.grid.deserialize(state)
+            self.grid.apply_state(state)
+            if any(key in state for key in DELTA_KEYS):
+                # Send clients the complete items the delta was applied to
+                msg["grid"] = dict(
+                    state,
+                    items=[
+                        item.serialize() for item in self.grid.item_locations.values()
+                    ],
+                )
             self.publish(msg)
 
     @property
     def usable_replay_range(self):
         # Start when the first player connects
+        events = self.import_session.query(Event).filter(
+            Event.network_id == self.replay_room.network_id
+        )
         start_time = (
-            self.import_session.query(Event)
-            .filter(Event.details["type"].astext == "connect")
+            events.filter(Event.details["type"].astext == "connect")
             .order_by(Event.creation_time)[0]
             .creation_time
         )
@@ -1959,8 +2993,7 @@ class Griduniverse(Experiment):
         start_time += datetime.timedelta(seconds=1)
         # End at the last move
         end_time = (
-            self.import_session.query(Event)
-            .filter(Event.details["type"].astext == "move")
+            events.filter(Event.details["type"].astext == "move")
             .order_by(Event.creation_time.desc())[0]
             .creation_time
         )
@@ -1975,6 +3008,8 @@ class Griduniverse(Experiment):
         self.grid.players = {}
         self.grid.item_locations = {}
         self.grid.wall_locations = {}
+        if target is not None:
+            self._seek_to_keyframe(target)
 
     def replay_finish(self):
         self.publish({"type": "stop"})
@@ -2107,7 +3142,16 @@ class Griduniverse(Experiment):
         return float(sum(scores)) / len(scores)
 
     def _last_state_for_player(self, player_id):
-        most_recent_grid_state = self.environment.state()
+        environment = self.environment
+        if len(self.rooms) > 1:
+            node = (
+                self.session.query(dallinger.models.Node)
+                .filter_by(participant_id=player_id)
+                .first()
+            )
+            if node is not None:
+                environment = self.environment_for(node.network_id)
+        most_recent_grid_state = environment.state()
         if most_recent_grid_state is not None:
             players = json.loads(most_recent_grid_state.contents)["players"]
             id_matches = [p for p in players if int(p["id"]) == player_id]
@@ -0,0 +1,49 @@
+"""Batching of the moves players send, to resolve them once per tick."""
+
+
+class MoveQueue(object):
+    """Collects the moves sent by the players in a room between ticks.
+
+    ``drain`` returns them in the order they are to be resolved: in rounds
+    of each player's first move, then each player's second move, and so on.
+    Within a round, players take turns in order of id, starting from a
+    player which rotates with each tick so that nobody always goes first.
+    That order only depends on which moves arrived during the tick, not on
+    when, so conflicting moves, such as two players moving into the same
+    cell, are resolved deterministically.
+    """
+
+    def __init__(self):
+        self._moves = {}
+        self.ticks = 0
+        self.stats = {"moves": 0, "batches": 0, "max_batch": 0}
+
+    def __len__(self):
+        return sum(len(moves) for moves in self._moves.values())
+
+    def add(self, msg):
+        """Queue the ``move`` message ``msg``."""
+        self._moves.setdefault(msg["player_id"], []).append(msg)
+
+    def drain(self):
+        """Return the queued moves in the order to resolve them, and empty
+        the queue.
+        """
+        moves, self._moves = self._moves, {}
+        players = sorted(moves)
+        if players:
+            start = self.ticks % len(players)
+            players = players[start:] + players[:start]
+        self.ticks += 1
+
+        ordered = []
+        for turn in range(max([len(queued) for queued in moves.values()] or [0])):
+            for player_id in players:
+                if turn < len(moves[player_id]):
+                    ordered.append(moves[player_id][turn])
+
+        if ordered:
+            self.stats["moves"] += len(ordered)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(ordered))
+        return ordered
@@ -0,0 +1,202 @@
+"""Area-of-interest filtering of the state sent to each player.
+
+Clients only draw the ``window_rows`` by ``window_columns`` window of the
+grid around their player, and dim it beyond the player's ``visibility``.
+When a room manages interest, each player is sent the state of the players,
+items and walls in or near their window only, by a ``PlayerView`` which
+publishes it on a channel of the player's own. Spectators share a view of
+the whole grid.
+
+Players and items come into view within ``margin`` cells of the window,
+and only go out of view when they are over twice as far, so that those
+near the edge don't flap in and out of view as players move. Walls never
+go out of view until the next keyframe, as clients keep the walls they
+have been sent.
+"""
+import math
+
+import numpy
+
+from .broadcast import StateTracker
+from .encoding import StateEncoder
+
+# The number of standard deviations of a player's visibility beyond which
+# the client dims cells to black
+VISIBILITY_SIGMAS = 3
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def visible_region(grid, position, margin=0):
+    """Return the bounds ``(top, left, bottom, right)`` of the cells a
+    player at ``position`` can see on ``grid``, extended by ``margin``
+    cells. The bottom and right bounds are exclusive.
+
+    The region is the window the client draws around the player (see
+    ``getWindowPosition`` in demo.js), clipped to where the player's
+    visibility leaves anything to see.
+    """
+    row, column = position
+    top = _clamp(row - grid.window_rows // 2, 0, grid.rows - grid.window_rows)
+    left = _clamp(
+        column - grid.window_columns // 2, 0, grid.columns - grid.window_columns
+    )
+    bottom = top + grid.window_rows
+    right = left + grid.window_columns
+
+    radius = int(math.ceil(VISIBILITY_SIGMAS * grid.visibility))
+    top = max(top, row - radius)
+    left = max(left, column - radius)
+    bottom = min(bottom, row + radius + 1)
+    right = min(right, column + radius + 1)
+
+    return (
+        max(top - margin, 0),
+        max(left - margin, 0),
+        min(bottom + margin, grid.rows),
+        min(right + margin, grid.columns),
+    )
+
+
+def _inside(region, position):
+    top, left, bottom, right = region
+    return top <= position[0] < bottom and left <= position[1] < right
+
+
+def _positions(layer, region, empty=0):
+    """Return the positions of the cells of ``layer`` in ``region`` which
+    aren't ``empty``.
+    """
+    top, left, bottom, right = region
+    rows, columns = numpy.nonzero(layer[top:bottom, left:right] != empty)
+    return [(int(r) + top, int(c) + left) for r, c in zip(rows, columns)]
+
+
+class IndexedState(object):
+    """The serialized state of a gridworld, with its players indexed by id
+    and its items and walls by position, for ``PlayerView``s to pick from.
+
+    Items are only serialized again when they change, and walls when some
+    are added.
+    """
+
+    def __init__(self):
+        self.state = {}
+        self.players = {}
+        self.items = {}
+        self.walls = {}
+        self._item_generation = None
+        self._wall_count = None
+
+    def update(self, grid):
+        self.state = grid.serialize(include_walls=False, include_items=False)
+        self.players = {player["id"]: player for player in self.state.pop("players")}
+
+        changes = grid.item_changes_since(self._item_generation)
+        if changes is None:
+            self.items = {
+                tuple(position): item.serialize()
+                for position, item in grid.item_locations.items()
+            }
+        else:
+            for position in changes:
+                item = grid.item_locations.get(position)
+                if item is None:
+                    self.items.pop(position, None)
+                else:
+                    self.items[position] = item.serialize()
+        self._item_generation = grid.item_generation
+
+        if len(grid.wall_locations) != self._wall_count:
+            self.walls = {
+                tuple(position): wall.serialize()
+                for position, wall in grid.wall_locations.items()
+            }
+            self._wall_count = len(grid.wall_locations)
+
+
+class PlayerView(object):
+    """The part of a room's state which is sent to the player ``player_id``
+    on ``channel``, or to spectators if ``player_id`` is None.
+
+    Each view tracks what its clients have been sent, and encodes its
+    messages, separately.
+    """
+
+    def __init__(
+        self, player_id, channel, state_tracker=None, state_encoder=None, margin=2
+    ):
+        self.player_id = player_id
+        self.channel = channel
+        self.state_tracker = state_tracker or StateTracker()
+        self.state_encoder = state_encoder or StateEncoder()
+        self.margin = margin
+        self._players = set()
+        self._items = set()
+
+    def __repr__(self):
+        return "<PlayerView {}>".format(self.channel)
+
+    def grid_state(self, grid, indexed):
+        """Return the part of the state of ``grid``, as indexed by
+        ``indexed``, which the player can see, or None if they aren't on the
+        grid.
+        """
+        state = dict(indexed.state)
+        if self.player_id is None:
+            state["players"] = list(indexed.players.values())
+            state["items"] = list(indexed.items.values())
+            state["walls"] = list(indexed.walls.values())
+            return state
+
+        ego = indexed.players.get(self.player_id)
+        if ego is None:
+            return None
+        keyframe = self.state_tracker.keyframe_due
+        if keyframe:
+            self._players = set()
+            self._items = set()
+        inner = visible_region(grid, ego["position"], self.margin)
+        outer = visible_region(grid, ego["position"], 2 * self.margin)
+
+        state["players"] = [
+            player
+            for player_id, player in indexed.players.items()
+            if player_id == self.player_id
+            or _inside(inner, player["position"])
+            or (player_id in self._players and _inside(outer, player["position"]))
+        ]
+        self._players = {player["id"] for player in state["players"]}
+
+        items = [
+            position
+            for position in _positions(grid.layers.item_index, outer, empty=-1)
+            if position in indexed.items
+            and (position in self._items or _inside(inner, position))
+        ]
+        state["items"] = [indexed.items[position] for position in items]
+        self._items = set(items)
+
+        walls = {}
+        if not keyframe:
+            walls = {
+                key: indexed.walls[key]
+                for key in self.state_tracker.walls
+                if key in indexed.walls
+            }
+        for position in _positions(grid.layers.walls, inner):
+            if position in indexed.walls:
+                walls[position] = indexed.walls[position]
+        state["walls"] = list(walls.values())
+        return state
+
+    def update(self, grid, indexed):
+        """Return the payload to send the view's clients, as from
+        ``StateTracker.update``, or None if there is nothing to send.
+        """
+        grid_state = self.grid_state(grid, indexed)
+        if grid_state is None:
+            return None
+        return self.state_tracker.update(grid_state)
@@ -85,13 +85,15 @@ class ExperimentWidget(DallingerExperimentWidget):
             player_positions = {
                 tuple(p.position): p.color for p in self.exp.grid.players.values()
             }
+            walls = self.exp.grid.layers.walls
+            items = self.exp.grid.layers.item_index >= 0
             for row_idx in range(self.exp.grid.rows):
                 row = []
                 for col_idx in range(self.exp.grid.columns):
                     position = NOTHING
-                    if (row_idx, col_idx) in self.exp.grid.wall_locations:
+                    if walls[row_idx, col_idx]:
                         position = WALL
-                    if (row_idx, col_idx) in self.exp.grid.food_locations:
+                    if items[row_idx, col_idx]:
                         position = FOOD
                     if (row_idx, col_idx) in player_positions.keys():
                         position = PLAYER % player_positions[(row_idx, col_idx)]
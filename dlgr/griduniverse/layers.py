@@ -0,0 +1,115 @@
+"""Dense array representations of what occupies each cell of the grid."""
+import numpy
+
+
+class GridLayers(object):
+    """Arrays of shape (rows, columns) mirroring a Gridworld's walls and items.
+
+    ``walls`` is 1 where there is a wall. ``item_type`` holds the code of the
+    type of the item in each cell, or 0 if there is none; ``type_code`` and
+    ``item_ids`` translate between codes and ``item_id``s. ``item_index``
+    holds the slot in ``items`` of the item in each cell, or -1. ``vacant``
+    is true where there is neither a wall nor an item.
+
+    Gridworld keeps the layers up to date as walls and items are added and
+    removed. Players move too often for this to pay off, so their layer is
+    built on demand by ``player_layer``, and ``empty_mask`` masks out only
+    their cells.
+    """
+
+    def __init__(self, rows, columns):
+        self.shape = (rows, columns)
+        self.walls = numpy.zeros(self.shape, dtype=numpy.uint8)
+        self.item_type = numpy.zeros(self.shape, dtype=numpy.int32)
+        self.item_index = numpy.full(self.shape, -1, dtype=numpy.int32)
+        self.vacant = numpy.ones(self.shape, dtype=bool)
+        self.items = []
+        self.item_ids = [None]
+        self._type_codes = {}
+        self._free_slots = []
+
+    def type_code(self, item_id):
+        """Return the code of ``item_id`` in the ``item_type`` layer."""
+        code = self._type_codes.get(item_id)
+        if code is None:
+            code = self._type_codes[item_id] = len(self.item_ids)
+            self.item_ids.append(item_id)
+        return code
+
+    def set_walls(self, positions):
+        self.walls[:] = 0
+        for position in positions:
+            self.walls[tuple(position)] = 1
+        self.vacant = (self.walls == 0) & (self.item_index < 0)
+
+    def add_wall(self, position):
+        self.walls[tuple(position)] = 1
+        self.vacant[tuple(position)] = False
+
+    def set_items(self, items_by_position):
+        self.item_type[:] = 0
+        self.item_index[:] = -1
+        self.vacant = self.walls == 0
+        self.items = []
+        self._free_slots = []
+        for position, item in items_by_position.items():
+            self.add_item(position, item)
+
+    def add_item(self, position, item):
+        position = tuple(position)
+        self.remove_item(position)
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self.items[slot] = item
+        else:
+            slot = len(self.items)
+            self.items.append(item)
+        self.item_index[position] = slot
+        self.item_type[position] = self.type_code(item.item_id)
+        self.vacant[position] = False
+
+    def remove_item(self, position):
+        position = tuple(position)
+        slot = self.item_index[position]
+        if slot >= 0:
+            self.items[slot] = None
+            self._free_slots.append(slot)
+            self.item_index[position] = -1
+            self.item_type[position] = 0
+            self.vacant[position] = not self.walls[position]
+
+    def player_layer(self, players):
+        """Return the number of ``players`` in each cell."""
+        layer = numpy.zeros(self.shape, dtype=numpy.int32)
+        if players:
+            rows, columns = numpy.array([p.position for p in players]).T
+            numpy.add.at(layer, (rows, columns), 1)
+        return layer
+
+    def empty_mask(self, players=()):
+        """Return a boolean array which is true for cells holding no wall,
+        no item and none of ``players``.
+        """
+        mask = self.vacant.copy()
+        if players:
+            rows, columns = numpy.array([p.position for p in players]).T
+            mask[rows, columns] = False
+        return mask
+
+    def item_counts(self):
+        """Return the number of items on the grid of each ``item_id``."""
+        counts = numpy.bincount(self.item_type.ravel(), minlength=len(self.item_ids))
+        return {
+            item_id: int(count)
+            for item_id, count in zip(self.item_ids[1:], counts[1:])
+            if count
+        }
+
+    def neighborhood(self, layer, position, d=1):
+        """Return the square of ``layer`` within ``d`` cells of ``position``
+        in each direction, clipped to the edges of the grid.
+        """
+        row, column = position
+        rows = slice(max(row - d, 0), row + d + 1)
+        columns = slice(max(column - d, 0), column + d + 1)
+        return layer[rows, columns]
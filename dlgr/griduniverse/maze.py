@@ -23,23 +23,24 @@ class Wall(object):
             return self.position
 
 
-def labyrinth(columns=25, rows=25, density=1.0, contiguity=1.0):
+def labyrinth(columns=25, rows=25, density=1.0, contiguity=1.0, rng=random):
     """Builds a labyrinth of Wall objects of a given size, with a given
     density and contiguity. A density of 1.0 will produce a maze that
     is 50% Wall and 50% open space. A contiguity of 1.0 will produce a maze with
     no neighborless Walls. A contiguity < 1 will be increasingly likely to
-    contain neighborless Walls.
+    contain neighborless Walls. The maze is drawn with ``rng``, a
+    ``random.Random``, or else the ``random`` module.
     """
     if density:
-        walls = [Wall(position=pos) for pos in _generate(rows, columns)]
+        walls = [Wall(position=pos) for pos in _generate(rows, columns, rng)]
         # Add sleep to avoid timeouts
         gevent.sleep(0.00001)
-        return _prune(walls, density, contiguity)
+        return _prune(walls, density, contiguity, rng)
     else:
         return []
 
 
-def _generate(rows, columns):
+def _generate(rows, columns, rng=random):
     """Generate an initial maze with 50% wall and 50% space."""
     c = (columns - 1) // 2
     r = (rows - 1) // 2
@@ -48,15 +49,15 @@ def _generate(rows, columns):
     hor = [["**"] * c + ["*"] for _ in range(r + 1)]
 
     # Select a starting position at random, and mark it as visited:
-    sx = random.randrange(c)
-    sy = random.randrange(r)
+    sx = rng.randrange(c)
+    sy = rng.randrange(r)
     visited[sy][sx] = 1
 
     stack = [(sx, sy)]
     while len(stack) > 0:
         (x, y) = stack.pop()
         d = [(x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)]
-        random.shuffle(d)
+        rng.shuffle(d)
         for xx, yy in d:
             if visited[yy][xx]:
                 continue
@@ -79,7 +80,7 @@ def _generate(rows, columns):
     return positions
 
 
-def _prune(walls, density, contiguity):
+def _prune(walls, density, contiguity, rng=random):
     """Prune walls to a labyrinth with the given density and contiguity."""
     num_to_prune = int(round(len(walls) * (1 - density)))
     num_pruned = 0
@@ -91,7 +92,7 @@ def _prune(walls, density, contiguity):
         num_pruned += len(to_prune)
 
     num_to_prune = int(round(len(walls) * (1 - contiguity)))
-    to_prune = set(random.sample(range(len(walls)), num_to_prune))
+    to_prune = set(rng.sample(range(len(walls)), num_to_prune))
     walls = [w for i, w in enumerate(walls) if i not in to_prune]
 
     return walls
@@ -0,0 +1,98 @@
+"""Buffered publishing of the messages sent to clients."""
+import collections
+import logging
+
+logger = logging.getLogger("griduniverse")
+
+
+def batch_message(messages):
+    """Return the JSON encoded ``messages`` wrapped in a single ``batch``
+    message, which clients unpack and handle in order.
+    """
+    return '{"type":"batch","messages":[' + ",".join(messages) + "]}"
+
+
+class Outbox(object):
+    """Publishes messages to Redis channels in batches.
+
+    ``publish`` appends a message, already encoded as JSON, to an in-memory
+    queue, and ``flush`` publishes everything queued in a single pipelined
+    round trip to Redis. The messages queued for the same channel are sent
+    together as one ``batch_message``. While the outbox is ``running`` its
+    owner flushes it, once per tick of the game loop; otherwise each message
+    is published as soon as it is queued.
+
+    The queue is bounded: once it holds ``max_queue_size`` messages it is
+    flushed straight away. How often that happens, how deep the queue has
+    grown, and how many messages went out in how many publishes, is counted
+    in ``stats``.
+    """
+
+    def __init__(self, redis_conn, max_queue_size=1000):
+        self.redis_conn = redis_conn
+        self.max_queue_size = max_queue_size
+        self.queue = collections.deque()
+        self.running = False
+        self.stats = collections.Counter()
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def publish(self, channel, message):
+        """Queue the JSON encoded ``message`` for ``channel``."""
+        self.queue.append((channel, message))
+        depth = len(self.queue)
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth)
+        if not self.running:
+            self.flush()
+        elif depth >= self.max_queue_size:
+            self.stats["backpressure_flushes"] += 1
+            self.flush()
+
+    def flush(self):
+        """Publish all queued messages, returning how many were published."""
+        if not self.queue:
+            return 0
+        count = len(self.queue)
+        by_channel = {}
+        for channel, message in self.queue:
+            by_channel.setdefault(channel, []).append(message)
+        self.queue.clear()
+
+        try:
+            if count == 1:
+                ((channel, (message,)),) = by_channel.items()
+                self.redis_conn.publish(channel, message)
+            else:
+                pipeline = self.redis_conn.pipeline(transaction=False)
+                for channel, messages in by_channel.items():
+                    if len(messages) > 1:
+                        pipeline.publish(channel, batch_message(messages))
+                        self.stats["batches"] += 1
+                    else:
+                        pipeline.publish(channel, messages[0])
+                pipeline.execute()
+        except Exception:
+            logger.exception("Failed to publish {} messages".format(count))
+            self.stats["messages_dropped"] += count
+            return 0
+        self.stats["messages_published"] += count
+        self.stats["publishes"] += len(by_channel)
+        self.stats["flushes"] += 1
+        return count
+
+    def start(self):
+        """Queue messages until ``stop`` is called."""
+        self.running = True
+
+    def stop(self):
+        """Stop batching and publish any queued messages."""
+        self.running = False
+        self.flush()
+        logger.info(
+            "Published {messages_published} messages in {publishes} publishes "
+            "and {flushes} flushes; {batches} batches, maximum queue depth "
+            "{max_queue_depth}, {backpressure_flushes} backpressure "
+            "flushes".format_map(self.stats)
+        )
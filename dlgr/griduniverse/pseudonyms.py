@@ -0,0 +1,36 @@
+"""Fake identities for players."""
+import collections
+
+from faker import Factory
+
+
+class PseudonymService(object):
+    """Hands out fake profiles for players.
+
+    Creating a Faker is slow, so one is kept per locale, and profiles are
+    generated ``pool_size`` at a time and handed out from the pool. Each
+    profile is only handed out once.
+    """
+
+    def __init__(self, pool_size=50):
+        self.pool_size = pool_size
+        self._fakers = {}
+        self._pools = collections.defaultdict(list)
+
+    def faker(self, locale):
+        """Return the Faker for ``locale``."""
+        fake = self._fakers.get(locale)
+        if fake is None:
+            fake = self._fakers[locale] = Factory.create(locale)
+        return fake
+
+    def profile(self, locale="en_US", sex=None):
+        """Return a new profile from ``locale``, of ``sex`` if given."""
+        pool = self._pools[(locale, sex)]
+        if not pool:
+            fake = self.faker(locale)
+            pool.extend(fake.simple_profile(sex=sex) for _ in range(self.pool_size))
+        return pool.pop()
+
+
+pseudonyms = PseudonymService()
@@ -0,0 +1,123 @@
+"""Buffered recording of game events to the database."""
+import collections
+import logging
+
+from dallinger.models import Node, timenow
+from gevent.event import Event as Signal
+
+from .models import Event
+
+logger = logging.getLogger("griduniverse")
+
+
+class EventRecorder(object):
+    """Writes ``Event`` infos to the database in batches.
+
+    ``record`` appends events to an in-memory queue, and ``flush`` writes
+    everything queued with a single bulk insert. While ``run`` is active in
+    a background greenlet the queue is flushed every ``flush_interval``
+    seconds, or as soon as it holds ``batch_size`` events; otherwise each
+    event is written as soon as it is recorded.
+
+    The queue is bounded: once it holds ``max_queue_size`` events the caller
+    flushes it synchronously, slowing producers down until the database
+    catches up. How often that happens, and how deep the queue has grown,
+    is counted in ``stats``.
+    """
+
+    def __init__(
+        self, session, batch_size=500, flush_interval=0.25, max_queue_size=10000
+    ):
+        self.session = session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.queue = collections.deque()
+        self.running = False
+        self.stats = collections.Counter()
+        self._batch_ready = Signal()
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def record(self, origin_id, network_id, details):
+        """Queue an event from the node ``origin_id``."""
+        self.queue.append(
+            {
+                "type": "event",
+                "origin_id": origin_id,
+                "network_id": network_id,
+                "details": details,
+                "creation_time": timenow(),
+            }
+        )
+        depth = len(self.queue)
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth)
+        if not self.running:
+            self.flush()
+        elif depth >= self.max_queue_size:
+            self.stats["backpressure_flushes"] += 1
+            self.flush()
+        elif depth >= self.batch_size:
+            self._batch_ready.set()
+
+    def flush(self):
+        """Write all queued events, returning how many were written."""
+        if not self.queue:
+            return 0
+        rows = list(self.queue)
+        self.queue.clear()
+
+        # Events from nodes which have since failed are not recorded
+        failed = self._failed_origins({row["origin_id"] for row in rows})
+        if failed:
+            for row in rows:
+                if row["origin_id"] in failed:
+                    logger.info(
+                        "Tried to record an event after node#{} failure: {}".format(
+                            row["origin_id"], row["details"]
+                        )
+                    )
+            kept = [row for row in rows if row["origin_id"] not in failed]
+            self.stats["events_dropped"] += len(rows) - len(kept)
+            rows = kept
+        if not rows:
+            return 0
+
+        try:
+            self.session.execute(Event.__table__.insert(), rows)
+            self.session.commit()
+        except Exception:
+            logger.exception("Failed to record {} events".format(len(rows)))
+            self.session.rollback()
+            self.stats["events_dropped"] += len(rows)
+            return 0
+        self.stats["events_recorded"] += len(rows)
+        self.stats["flushes"] += 1
+        return len(rows)
+
+    def _failed_origins(self, origin_ids):
+        query = self.session.query(Node.id).filter(
+            Node.id.in_(origin_ids), Node.failed == True  # noqa: E712
+        )
+        return {node_id for (node_id,) in query}
+
+    def run(self):
+        """Flush the queue periodically until ``stop`` is called."""
+        self.running = True
+        while self.running:
+            self._batch_ready.wait(self.flush_interval)
+            self._batch_ready.clear()
+            self.flush()
+
+    def stop(self):
+        """Stop batching and write any queued events."""
+        self.running = False
+        self._batch_ready.set()
+        self.flush()
+        logger.info(
+            "Recorded {events_recorded} events in {flushes} flushes; "
+            "maximum queue depth {max_queue_depth}, "
+            "{backpressure_flushes} backpressure flushes".format_map(self.stats)
+        )
@@ -0,0 +1,115 @@
+"""A seekable index of the grid states recorded in a dataset.
+
+Replaying to an arbitrary time would otherwise mean replaying every state
+from the start of the session. ``ReplayIndex`` holds complete grid states,
+keyframes, at fixed intervals of the recorded session, so that seeking only
+needs to load the nearest keyframe and apply the few states after it.
+
+The keyframes are stored in a local file, as a sequence of compressed JSON
+blobs followed by a table of the time, offset and length of each, so that
+loading a keyframe reads only that keyframe.
+"""
+import bisect
+import datetime
+import json
+import os
+import struct
+import zlib
+
+from .snapshots import apply_snapshot
+
+# The footer holds the offset of the table of keyframes
+FOOTER = struct.Struct(">Q")
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class ReplayIndex(object):
+    """Keyframes of the grid state, read from the file at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as index_file:
+            footer_offset = index_file.seek(-FOOTER.size, os.SEEK_END)
+            (table_offset,) = FOOTER.unpack(index_file.read(FOOTER.size))
+            index_file.seek(table_offset)
+            table_blob = index_file.read(footer_offset - table_offset)
+        table = json.loads(zlib.decompress(table_blob))
+        self.keyframe_interval = table["keyframe_interval"]
+        self.times = [
+            datetime.datetime.strptime(t, TIME_FORMAT) for t in table["times"]
+        ]
+        self.offsets = table["offsets"]
+
+    def __len__(self):
+        return len(self.times)
+
+    def keyframe_before(self, target):
+        """Return the time and complete grid state of the latest keyframe
+        at or before ``target``, or None if there is none.
+        """
+        i = bisect.bisect_right(self.times, target) - 1
+        if i < 0:
+            return None
+        offset, length = self.offsets[i]
+        with open(self.path, "rb") as index_file:
+            index_file.seek(offset)
+            state = json.loads(zlib.decompress(index_file.read(length)))
+        return self.times[i], state
+
+    @classmethod
+    def build(
+        cls, session, path, keyframe_interval=10.0, batch_size=500, origin_id=None
+    ):
+        """Write an index of the states recorded in ``session`` to ``path``,
+        with a keyframe every ``keyframe_interval`` seconds, and return it.
+
+        If ``origin_id`` is given, only the states recorded against that
+        node, the environment of one room, are indexed.
+        """
+        from dallinger.models import Info
+
+        states = session.query(Info.creation_time, Info.details, Info.contents).filter(
+            Info.type == "state"
+        )
+        if origin_id is not None:
+            states = states.filter(Info.origin_id == origin_id)
+        states = states.order_by(Info.creation_time, Info.id).yield_per(batch_size)
+        times = []
+        offsets = []
+        current = None
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as index_file:
+            for creation_time, details, contents in states:
+                current = apply_snapshot(current, details or json.loads(contents))
+                if times and (
+                    (creation_time - times[-1]).total_seconds() < keyframe_interval
+                ):
+                    continue
+                blob = zlib.compress(json.dumps(current).encode("utf-8"))
+                offsets.append((index_file.tell(), len(blob)))
+                times.append(creation_time)
+                index_file.write(blob)
+
+            table = {
+                "keyframe_interval": keyframe_interval,
+                "times": [t.strftime(TIME_FORMAT) for t in times],
+                "offsets": offsets,
+            }
+            table_offset = index_file.tell()
+            index_file.write(zlib.compress(json.dumps(table).encode("utf-8")))
+            index_file.write(FOOTER.pack(table_offset))
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @classmethod
+    def load_or_build(cls, session, path, keyframe_interval=10.0, origin_id=None):
+        """Return the index at ``path``, building it first if there is no
+        index there with the same ``keyframe_interval``.
+        """
+        if os.path.exists(path):
+            index = cls(path)
+            if index.keyframe_interval == keyframe_interval:
+                return index
+        return cls.build(
+            session, path, keyframe_interval=keyframe_interval, origin_id=origin_id
+        )
@@ -0,0 +1,122 @@
+"""The games hosted by one Griduniverse experiment.
+
+An experiment can host several games at once, each in its own room, so
+that many small groups can play on one deployment. Each room has its own
+network, gridworld and Redis channel, on which its state and messages are
+broadcast. Clients first listen on ``LOBBY_CHANNEL``; when a player
+connects, the experiment routes them to a room and tells them to listen on
+its channel instead. All players send their messages on the experiment's
+control channel, and the experiment routes them by player id.
+
+The experiment runs every room's ticks and state broadcasts on shared
+schedules rather than in greenlets of their own.
+
+Each player also has a channel of their own in their room, on which they
+are sent the messages meant for them only, such as the rejection of their
+moves. Rooms which manage interest send each player only the part of the
+state near them on that channel, rather than broadcasting all of it. See
+``interest``.
+"""
+from .broadcast import StateTracker
+from .encoding import STATE_ENCODERS
+from .interest import IndexedState, PlayerView
+from .snapshots import SnapshotPolicy
+
+# The channel clients listen on until they are routed to a room
+LOBBY_CHANNEL = "griduniverse"
+
+
+class Room(object):
+    """A game hosted by the experiment, played on ``grid`` by the
+    participants in the network ``network_id``.
+
+    The room's name is also the Redis channel its state is broadcast on.
+    Channels are prefixed to socket messages with a ":", so names can't
+    contain one. Its state is sent in ``state_format``, one of
+    ``encoding.STATE_ENCODERS``.
+
+    Unless ``interest_margin`` is None, the room manages interest, sending
+    its state through a ``PlayerView`` for each player, with that margin.
+    """
+
+    def __init__(
+        self,
+        name,
+        grid,
+        network_id=None,
+        state_tracker=None,
+        snapshot_policy=None,
+        state_format="json",
+        interest_margin=None,
+    ):
+        if ":" in name:
+            raise ValueError("Room names can't contain ':', not {}".format(name))
+        self.name = name
+        self.grid = grid
+        self.network_id = network_id
+        self.state_tracker = state_tracker or StateTracker()
+        self.snapshot_policy = snapshot_policy or SnapshotPolicy()
+        self.interest_margin = interest_margin
+        self.views = {}
+        self.indexed_state = IndexedState()
+        self.set_state_format(state_format)
+        # The environment node the room's snapshots are recorded against
+        self.environment = None
+        # The state of the room's broadcasts and ticks, kept by the
+        # experiment's shared loops
+        self.state_count = 0
+        self.last_generation = None
+        self.persistence = None
+        self.timed_events = None
+        # The moves to resolve on the next tick, while the game loop runs
+        self.move_queue = None
+
+    def __repr__(self):
+        return "<Room {}>".format(self.name)
+
+    def set_state_format(self, state_format):
+        """Send the room's state in ``state_format`` from now on."""
+        if state_format not in STATE_ENCODERS:
+            raise ValueError("Unknown state format: {}".format(state_format))
+        self.state_format = state_format
+        self.state_encoder = STATE_ENCODERS[state_format]()
+        for view in self.views.values():
+            view.state_encoder = STATE_ENCODERS[state_format]()
+
+    @property
+    def manages_interest(self):
+        return self.interest_margin is not None
+
+    def view_for(self, player_id):
+        """Return the view of the player ``player_id``, or of spectators if
+        None, creating it if needed.
+        """
+        view = self.views.get(player_id)
+        if view is None:
+            if player_id is None:
+                channel = "{}_spectators".format(self.channel)
+            else:
+                channel = self.player_channel(player_id)
+            view = self.views[player_id] = PlayerView(
+                player_id,
+                channel,
+                state_tracker=StateTracker(
+                    keyframe_interval=self.state_tracker.keyframe_interval
+                ),
+                state_encoder=STATE_ENCODERS[self.state_format](),
+                margin=self.interest_margin,
+            )
+        return view
+
+    def remove_view(self, player_id):
+        """Stop sending the state of the room to the player ``player_id``."""
+        self.views.pop(player_id, None)
+
+    def player_channel(self, player_id):
+        """The Redis channel of the messages meant for ``player_id`` only."""
+        return "{}_player_{}".format(self.channel, player_id)
+
+    @property
+    def channel(self):
+        """The Redis channel the room's messages are published on."""
+        return self.name
@@ -0,0 +1,96 @@
+"""Fixed-timestep scheduling of the game simulation."""
+import collections
+import contextlib
+import time
+
+import gevent
+
+
+class Interval(object):
+    """A recurring deadline, every ``interval`` seconds after ``start``.
+
+    Deadlines missed while the simulation was busy are skipped rather than
+    made up, so a slow tick doesn't cause a burst of work.
+    """
+
+    def __init__(self, interval, start):
+        self.interval = interval
+        self.next_due = start + interval
+
+    def due(self, now):
+        """Is the deadline due at ``now``? If so, schedule the next one."""
+        if now < self.next_due:
+            return False
+        self.next_due += self.interval
+        if self.next_due <= now:
+            self.next_due = now + self.interval
+        return True
+
+
+class TickScheduler(object):
+    """Runs a simulation at a fixed rate of ``hz`` ticks per second.
+
+    When a tick overruns its budget, the following ticks run back to back
+    to catch up, unless the simulation has fallen more than
+    ``max_catch_up`` ticks behind, in which case the missed ticks are
+    skipped. Counts of ticks, overruns and skipped ticks are kept in
+    ``stats``, and the time spent in each phase of a tick, as marked with
+    ``phase``, in ``timings``.
+    """
+
+    def __init__(self, hz=100, max_catch_up=5, clock=time.time, sleep=gevent.sleep):
+        self.period = 1.0 / hz
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = collections.Counter()
+        self.timings = collections.defaultdict(collections.Counter)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the enclosed part of a tick as the phase ``name``."""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            timing = self.timings[name]
+            timing["count"] += 1
+            timing["total"] += elapsed
+            timing["max"] = max(timing["max"], elapsed)
+
+    def run(self, tick, until):
+        """Call ``tick(now)`` once per period until ``until()`` is true."""
+        next_tick = self.clock()
+        while not until():
+            now = self.clock()
+            if now < next_tick:
+                self.sleep(next_tick - now)
+                now = self.clock()
+            else:
+                # Let other greenlets run even when catching up
+                self.sleep(0)
+
+            with self.phase("tick"):
+                tick(now)
+            self.stats["ticks"] += 1
+
+            next_tick += self.period
+            behind = self.clock() - next_tick
+            if behind > 0:
+                self.stats["overruns"] += 1
+                if behind > self.period * self.max_catch_up:
+                    missed = int(behind / self.period)
+                    next_tick += missed * self.period
+                    self.stats["skipped_ticks"] += missed
+
+    def summary(self):
+        """Return the mean and maximum milliseconds spent in each phase."""
+        return {
+            name: {
+                "mean_ms": 1000 * timing["total"] / timing["count"],
+                "max_ms": 1000 * timing["max"],
+            }
+            for name, timing in self.timings.items()
+            if timing["count"]
+        }
@@ -0,0 +1,222 @@
+"""Headless simulation of Griduniverse games.
+
+``Simulation`` drives a ``Gridworld`` directly, in process, without
+Dallinger, a database or Redis. Players are controlled by policies acting on
+the in-memory grid, and time is kept by a virtual clock which advances one
+tick per step, so games run as fast as they can be computed::
+
+    simulation = Simulation(
+        [FoodSeekingPolicy(), RandomPolicy()],
+        config={"time_per_round": 30.0, "num_rounds": 2},
+        seed=1,
+    )
+    summary = simulation.run()
+"""
+import collections
+import copy
+import random
+
+# Importing dallinger first loads the experiment module through its entry
+# point, which would otherwise be a circular import.
+import dallinger  # noqa: F401
+import numpy
+
+from .experiment import Gridworld, IllegalMove, parse_game_config, read_game_config
+from .scheduler import Interval
+
+DIRECTIONS = ("up", "down", "left", "right")
+
+
+def build_grid(config=None, game_config=None, **kwargs):
+    """Return a new ``Gridworld`` with the experiment parameters in
+    ``config`` and the items, transitions and players in ``game_config``,
+    by default those in game_config.yml.
+    """
+    # The grid updates the item configuration as the game goes on
+    item_config, transition_config, player_config = parse_game_config(
+        copy.deepcopy(game_config) if game_config else read_game_config()
+    )
+    return Gridworld(
+        item_config=item_config,
+        transition_config=transition_config,
+        player_config=player_config,
+        **dict(config or {}, **kwargs),
+    )
+
+
+class VirtualClock(object):
+    """A clock which only moves when advanced."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class Policy(object):
+    """Decides what one player does on each tick.
+
+    Subclasses implement ``act``, returning the direction to move the
+    player in, or None to stay put. Random choices are drawn from the
+    grid's ``rng``, so that seeded games are reproducible.
+    """
+
+    def act(self, player, grid):
+        raise NotImplementedError()
+
+
+class RandomPolicy(Policy):
+    """Moves in a random direction."""
+
+    def act(self, player, grid):
+        return grid.rng.choice(DIRECTIONS)
+
+
+class FoodSeekingPolicy(Policy):
+    """Moves towards the nearest edible item, by Manhattan distance, or
+    randomly if there is none or the way is blocked.
+    """
+
+    def act(self, player, grid):
+        row, column = player.position
+        target = None
+        best = None
+        for position, item in grid.item_locations.items():
+            if item.interactive or not item.calories:
+                continue
+            distance = abs(position[0] - row) + abs(position[1] - column)
+            if best is None or distance < best:
+                target, best = position, distance
+        if best is None:
+            return grid.rng.choice(DIRECTIONS)
+
+        moves = []
+        if target[0] < row:
+            moves.append(("up", [row - 1, column]))
+        elif target[0] > row:
+            moves.append(("down", [row + 1, column]))
+        if target[1] < column:
+            moves.append(("left", [row, column - 1]))
+        elif target[1] > column:
+            moves.append(("right", [row, column + 1]))
+        if not moves:
+            # On the item already, so wait for it to be consumed
+            return None
+        open_moves = [direction for direction, to in moves if not grid.has_wall(to)]
+        return grid.rng.choice(open_moves or DIRECTIONS)
+
+
+class Simulation(object):
+    """A game of Griduniverse between players controlled by ``policies``.
+
+    ``config`` overrides the experiment parameters passed to ``Gridworld``,
+    and ``game_config`` the contents of game_config.yml. The simulation
+    advances ``1 / tick_rate`` seconds of game time per ``step``. Given a
+    ``seed``, the game is reproducible: the grid draws its random numbers
+    from generators of its own seeded with it, rather than from the global
+    ones.
+    """
+
+    def __init__(
+        self, policies, config=None, game_config=None, tick_rate=10.0, seed=None
+    ):
+        self.tick_rate = tick_rate
+        self.clock = VirtualClock()
+        self.stats = collections.Counter()
+        self.event_counts = collections.Counter()
+
+        config = dict(config or {})
+        config.setdefault("max_participants", len(policies))
+        self.grid = build_grid(
+            config,
+            game_config,
+            log_event=self._log_event,
+            clock=self.clock,
+            rng=random.Random(seed),
+            numpy_rng=numpy.random.default_rng(seed),
+        )
+
+        map_csv_path = config.get("map_csv")
+        if map_csv_path is not None:
+            self.grid.load_map(map_csv_path)
+        else:
+            self.grid.build_labyrinth()
+            for item_type in self.grid.item_config.values():
+                self.grid.spawn_items(item_type["item_count"], item_type["item_id"])
+
+        self.policies = {}
+        for player_id, policy in enumerate(policies, 1):
+            self.grid.spawn_player(id=player_id)
+            self.policies[player_id] = policy
+        self._timed_events = Interval(1.0, self.clock())
+
+    def _log_event(self, event):
+        self.event_counts[event.get("type")] += 1
+
+    def step(self):
+        """Advance the game by one tick."""
+        grid = self.grid
+        now = self.clock()
+
+        for player_id, policy in self.policies.items():
+            player = grid.players[player_id]
+            direction = policy.act(player, grid)
+            if direction is None:
+                continue
+            try:
+                player.move(direction)
+            except IllegalMove:
+                self.stats["rejected_moves"] += 1
+            else:
+                self.stats["moves"] += 1
+
+        # The same phases as ``Griduniverse.game_loop``
+        if grid.motion_auto:
+            for player in grid.players.values():
+                try:
+                    player.move(player.motion_direction, tremble_rate=0)
+                except IllegalMove:
+                    pass
+        if grid.consumption_active:
+            grid.consume()
+        if grid.contagion > 0:
+            grid.spread_contagion()
+        if self._timed_events.due(now):
+            grid.apply_timed_events()
+        grid.compute_payoffs()
+        grid.check_round_completion()
+
+        self.stats["ticks"] += 1
+        self.clock.advance(1.0 / self.tick_rate)
+
+    def run(self, max_ticks=None):
+        """Step until the game is over, or ``max_ticks`` ticks have been
+        run, and return the ``summary``.
+        """
+        while not self.grid.game_over:
+            if max_ticks is not None and self.stats["ticks"] >= max_ticks:
+                break
+            self.step()
+        return self.summary()
+
+    def summary(self):
+        """Return the outcome of the game so far."""
+        players = list(self.grid.players.values())
+        scores = [player.score for player in players]
+        payoffs = [player.payoff for player in players]
+        return {
+            "rounds": self.grid.round,
+            "game_time": self.clock(),
+            "ticks": self.stats["ticks"],
+            "moves": self.stats["moves"],
+            "rejected_moves": self.stats["rejected_moves"],
+            "items_consumed": len(self.grid.items_consumed),
+            "scores": {player.id: player.score for player in players},
+            "payoffs": {player.id: player.payoff for player in players},
+            "average_score": float(numpy.mean(scores)) if scores else 0.0,
+            "average_payoff": float(numpy.mean(payoffs)) if payoffs else 0.0,
+        }
@@ -0,0 +1,241 @@
+"""Policies for persisting snapshots of the grid state.
+
+``game_loop`` records the grid as ``State`` infos. Rather than a complete
+copy of the grid on every iteration, ``SnapshotPolicy`` writes periodic
+keyframes holding everything, and in between delta snapshots holding the
+players and only the items and walls which changed. Iterations where
+nothing changed are not recorded at all.
+
+Run this module to compact the states recorded by older versions::
+
+    python -m dlgr.griduniverse.snapshots --keyframe-interval 10
+"""
+import argparse
+import collections
+import json
+
+DELTA_KEYS = ("items_changed", "items_removed")
+
+
+def _position(item):
+    return tuple(item["position"])
+
+
+def apply_snapshot(state, details):
+    """Apply a recorded snapshot to a complete ``state``, returning the new
+    complete state.
+
+    Keyframes and older snapshots hold complete sections, which replace
+    those in ``state``; deltas hold the changes to its items.
+    """
+    merged = dict(state or {})
+    merged.update({k: v for k, v in details.items() if k not in DELTA_KEYS})
+    if "items" not in details and any(key in details for key in DELTA_KEYS):
+        items = {_position(item): item for item in merged.get("items", [])}
+        for position in details.get("items_removed", ()):
+            items.pop(tuple(position), None)
+        for item in details.get("items_changed", ()):
+            items[_position(item)] = item
+        merged["items"] = list(items.values())
+    merged.pop("keyframe", None)
+    return merged
+
+
+def delta_snapshot(previous, state):
+    """Return the snapshot recording the change from complete state
+    ``previous`` to complete state ``state``, or None if nothing changed.
+    """
+    details = {k: v for k, v in state.items() if k not in ("items", "walls")}
+    changed = any(previous.get(k) != v for k, v in details.items())
+
+    if state.get("walls", []) != previous.get("walls", []):
+        details["walls"] = state.get("walls", [])
+        changed = True
+
+    old_items = {_position(item): item for item in previous.get("items", [])}
+    new_items = {_position(item): item for item in state.get("items", [])}
+    items_changed = [
+        item for key, item in new_items.items() if old_items.get(key) != item
+    ]
+    items_removed = [list(key) for key in old_items if key not in new_items]
+    if items_changed:
+        details["items_changed"] = items_changed
+    if items_removed:
+        details["items_removed"] = items_removed
+
+    if not (changed or items_changed or items_removed):
+        return None
+    return details
+
+
+class SnapshotPolicy(object):
+    """Decides when, and in what form, ``game_loop`` records the grid.
+
+    A snapshot is taken at most every ``interval`` seconds, and only if
+    something changed. Every ``keyframe_interval`` seconds the snapshot is
+    a keyframe holding the complete grid; otherwise it holds the players
+    and the changes to the items and walls since the previous snapshot.
+    Counts of each outcome are kept in ``stats``.
+    """
+
+    def __init__(self, interval=0.0, keyframe_interval=10.0):
+        self.interval = interval
+        self.keyframe_interval = keyframe_interval
+        self.stats = collections.Counter()
+        self._last_snapshot_time = None
+        self._last_keyframe_time = None
+        self._last_state = None
+        self._item_generation = None
+        self._wall_count = None
+
+    def snapshot(self, grid, now, force=False):
+        """Return the details of the snapshot to record for ``grid`` at
+        time ``now``, or None if no snapshot is needed.
+
+        ``force`` records a keyframe regardless of the schedule.
+        """
+        if (
+            not force
+            and self._last_snapshot_time is not None
+            and now - self._last_snapshot_time < self.interval
+        ):
+            return None
+
+        keyframe = (
+            force
+            or self._last_keyframe_time is None
+            or now - self._last_keyframe_time >= self.keyframe_interval
+        )
+        if keyframe:
+            details = grid.serialize()
+            details["keyframe"] = True
+            self._last_keyframe_time = now
+            self.stats["keyframes"] += 1
+        else:
+            details = self._delta(grid)
+            if details is None:
+                self.stats["skipped"] += 1
+                return None
+            self.stats["deltas"] += 1
+
+        self._last_snapshot_time = now
+        self._last_state = {
+            k: v for k, v in details.items() if k not in ("items", "walls")
+        }
+        self._item_generation = grid.item_generation
+        self._wall_count = len(grid.wall_locations)
+        return details
+
+    def _delta(self, grid):
+        walls_changed = len(grid.wall_locations) != self._wall_count
+        changes = grid.item_changes_since(self._item_generation)
+        details = grid.serialize(
+            include_walls=walls_changed, include_items=changes is None
+        )
+        if changes:
+            locations = grid.item_locations
+            items_changed = [
+                locations[position].serialize()
+                for position in changes
+                if position in locations
+            ]
+            items_removed = [
+                list(position) for position in changes if position not in locations
+            ]
+            if items_changed:
+                details["items_changed"] = items_changed
+            if items_removed:
+                details["items_removed"] = items_removed
+        elif not walls_changed and changes is not None:
+            if all(self._last_state.get(k) == v for k, v in details.items()):
+                return None
+        return details
+
+
+def compact_states(session, keyframe_interval=10.0, batch_size=500):
+    """Rewrite the ``State`` infos recorded by each environment as
+    keyframes every ``keyframe_interval`` seconds with deltas in between,
+    deleting those which record no change. Returns counts of each.
+    """
+    from dallinger.information import State
+
+    table = State.__table__
+    stats = collections.Counter()
+    origin_ids = [
+        origin_id for (origin_id,) in session.query(State.origin_id).distinct()
+    ]
+    for origin_id in origin_ids:
+        state_ids = [
+            state_id
+            for (state_id,) in session.query(State.id)
+            .filter(State.origin_id == origin_id)
+            .order_by(State.creation_time, State.id)
+        ]
+        current = None
+        last_keyframe_time = None
+        for start in range(0, len(state_ids), batch_size):
+            end = start + batch_size
+            batch = state_ids[start:end]
+            rows = {
+                row.id: row
+                for row in session.query(
+                    State.id, State.creation_time, State.details, State.contents
+                ).filter(State.id.in_(batch))
+            }
+            for state_id in batch:
+                row = rows[state_id]
+                details = row.details or json.loads(row.contents)
+                previous, current = current, apply_snapshot(current, details)
+                if previous is None or (
+                    (row.creation_time - last_keyframe_time).total_seconds()
+                    >= keyframe_interval
+                ):
+                    compacted = dict(current, keyframe=True)
+                    last_keyframe_time = row.creation_time
+                    stats["keyframes"] += 1
+                else:
+                    compacted = delta_snapshot(previous, current)
+                    if compacted is None:
+                        session.execute(table.delete().where(table.c.id == state_id))
+                        stats["deleted"] += 1
+                        continue
+                    stats["deltas"] += 1
+                if compacted != details:
+                    session.execute(
+                        table.update()
+                        .where(table.c.id == state_id)
+                        .values(details=compacted, contents=json.dumps(compacted))
+                    )
+            session.commit()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compact the grid states recorded in a Griduniverse database."
+    )
+    parser.add_argument(
+        "--db-url", help="Database to compact; defaults to Dallinger's database."
+    )
+    parser.add_argument(
+        "--keyframe-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between keyframes (default: %(default)s).",
+    )
+    args = parser.parse_args(argv)
+
+    from dallinger.db import db_url
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    session = sessionmaker(bind=create_engine(args.db_url or db_url))()
+    stats = compact_states(session, keyframe_interval=args.keyframe_interval)
+    print(
+        "Kept {keyframes} keyframes and {deltas} deltas; "
+        "deleted {deleted} unchanged states.".format_map(stats)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -130,6 +130,8 @@
   var isSpectator = false;
   var start = performance.now();
   var gridItems = new itemlib.GridItems();
+  var gridState = null;
+  var requestStateResync = _.noop;
   var walls = [];
   var wall_map = {};
   var transitionsUsed = new Set();
@@ -382,6 +384,12 @@
       return this._players.size;
     }
 
+    remove(playerIds) {
+      for (const id of playerIds) {
+        this._players.delete(id);
+      }
+    }
+
     update(allPlayersData) {
       let freshPlayerData, existingPlayer, i;
 
@@ -805,6 +813,10 @@
   }
 
   function chatName(player_id) {
+    if (_.isUndefined(players.get(player_id))) {
+      // The player is out of view, so we don't know their name or color
+      return '<span class="name">Player ' + player_id + "</span>";
+    }
     var ego = players.ego(),
       entry = "<span class='name'>",
       id = parseInt(player_id) - 1,
@@ -856,7 +868,8 @@
     var entry = chatName(msg.player_id);
     if (
       settings.spatial_chat &&
-      players.get(msg.player_id).dimness < settings.chat_visibility_threshold
+      (_.isUndefined(players.get(msg.player_id)) ||
+        players.get(msg.player_id).dimness < settings.chat_visibility_threshold)
     ) {
       return;
     }
@@ -872,7 +885,8 @@
     store.set("color", msg.new_color);
     if (
       settings.spatial_chat &&
-      players.get(msg.player_id).dimness < settings.chat_visibility_threshold
+      (_.isUndefined(players.get(msg.player_id)) ||
+        players.get(msg.player_id).dimness < settings.chat_visibility_threshold)
     ) {
       return;
     }
@@ -888,8 +902,11 @@
   }
 
   function onMoveRejected(msg) {
-    var offendingPlayerId = msg.player_id,
-      ego = players.ego();
+    markMoveRejected(msg.player_id);
+  }
+
+  function markMoveRejected(offendingPlayerId) {
+    var ego = players.ego();
 
     if (ego && offendingPlayerId === ego.id) {
       ego.positionInSync = false;
@@ -1062,6 +1079,72 @@
     $("#inventory-item").text(displayValue);
   }
 
+  /**
+   * Apply a state payload from the server to the complete grid state we
+   * hold. Deltas only carry what changed since the version they are based
+   * on; keyframes carry everything.
+   *
+   * @param {Object} current  the complete state, or null
+   * @param {Object} payload  the decoded state payload
+   * @returns {Object|null} the new complete state, or null if the payload
+   *   is a delta we can't apply and we need a keyframe
+   */
+  function applyGridState(current, payload) {
+    var merged, players, items;
+
+    if (_.isUndefined(payload.version)) {
+      // Unversioned states (e.g. from replays) only omit unchanged sections
+      return Object.assign({}, current, payload);
+    }
+    if (payload.keyframe) {
+      return payload;
+    }
+    if (_.isNil(current) || current.version !== payload.base_version) {
+      return null;
+    }
+
+    merged = _.omit(payload, [
+      "players",
+      "players_removed",
+      "items_changed",
+      "items_removed",
+      "walls_added",
+    ]);
+    merged = Object.assign({}, current, merged);
+
+    players = new Map(current.players.map((player) => [player.id, player]));
+    for (const id of payload.players_removed || []) {
+      players.delete(id);
+    }
+    for (const player of payload.players) {
+      players.set(player.id, player);
+    }
+    merged.players = Array.from(players.values());
+
+    items = new Map(
+      current.items.map((item) => [JSON.stringify(item.position), item]),
+    );
+    for (const position of payload.items_removed || []) {
+      items.delete(JSON.stringify(position));
+    }
+    for (const item of payload.items_changed || []) {
+      items.set(JSON.stringify(item.position), item);
+    }
+    merged.items = Array.from(items.values());
+
+    merged.walls = current.walls.concat(payload.walls_added || []);
+    return merged;
+  }
+
+  function gridItemFromState(item) {
+    return new itemlib.Item(
+      item.id,
+      item.item_id,
+      item.maturity,
+      item.remaining_uses,
+    );
+  }
+
   function onGameStateChange(msg) {
     var $donationButtons = $(
         "#individual-donate, #group-donate, #public-donate, #ingroup-donate",
@@ -1069,7 +1152,9 @@
       $timeElement = $("#time"),
       $loading = $(".grid-loading"),
       cur_wall,
+      newWalls,
       ego,
+      payload,
       state,
       j,
       k;
@@ -1090,52 +1175,57 @@
       $("#round").html(msg.round + 1);
     }
 
+    // The grid is sent as an object, or as a JSON string by older servers.
+    payload = typeof msg.grid === "string" ? JSON.parse(msg.grid) : msg.grid;
+    state = applyGridState(gridState, payload);
+    if (state === null) {
+      // We missed an update, so ask for the complete state.
+      requestStateResync();
+      return;
+    }
+    gridState = state;
+
     // Update players.
-    state = JSON.parse(msg.grid);
-    players.update(state.players);
+    players.update(payload.players);
+    if (!_.isUndefined(payload.players_removed)) {
+      players.remove(payload.players_removed);
+    }
     ego = players.ego();
 
     updateDonationStatus(state.donation_active);
 
     // Update gridItems
-    if (!_.isNil(state.items)) {
+    if (!_.isNil(payload.items)) {
       gridItems = new itemlib.GridItems();
-      for (j = 0; j < state.items.length; j++) {
+      for (j = 0; j < payload.items.length; j++) {
         gridItems.add(
-          new itemlib.Item(
-            state.items[j].id,
-            state.items[j].item_id,
-            state.items[j].maturity,
-            state.items[j].remaining_uses,
-          ),
-          state.items[j].position,
+          gridItemFromState(payload.items[j]),
+          payload.items[j].position,
         );
       }
-    }
-    // Update walls if they haven't been created yet.
-    if (!_.isUndefined(state.walls) && walls.length === 0) {
-      for (k = 0; k < state.walls.length; k++) {
-        cur_wall = state.walls[k];
-        if (cur_wall instanceof Array) {
-          cur_wall = {
-            position: cur_wall,
-            color: [0.5, 0.5, 0.5],
-          };
-        }
-        walls.push(
-          new Wall({
-            position: cur_wall.position,
-            color: cur_wall.color,
-          }),
-        );
-        wall_map[[cur_wall.position[1], cur_wall.position[0]]] = cur_wall.color;
+    } else {
+      for (const position of payload.items_removed || []) {
+        gridItems.remove(position);
+      }
+      for (const item of payload.items_changed || []) {
+        gridItems.remove(item.position);
+        gridItems.add(gridItemFromState(item), item.position);
       }
     }
-
-    // If new walls have been added, draw them
-    if (!_.isUndefined(state.walls) && walls.length < state.walls.length) {
-      for (k = walls.length; k < state.walls.length; k++) {
-        cur_wall = state.walls[k];
+    // Draw the walls we haven't been sent before. With interest
+    // management, walls are sent as they come into view.
+    newWalls = (payload.walls || []).concat(payload.walls_added || []);
+    for (k = 0; k < newWalls.length; k++) {
+      cur_wall = newWalls[k];
+      if (cur_wall instanceof Array) {
+        cur_wall = {
+          position: cur_wall,
+          color: [0.5, 0.5, 0.5],
+        };
+      }
+      if (
+        _.isUndefined(wall_map[[cur_wall.position[1], cur_wall.position[0]]])
+      ) {
         walls.push(
           new Wall({
             position: cur_wall.position,
@@ -1150,7 +1240,7 @@
     if (!_.isUndefined(ego)) {
       $("#score").html(Math.round(ego.score));
       $("#dollars").html(ego.payoff.toFixed(2));
-      window.state = msg.grid;
+      window.state = JSON.stringify(state);
       window.ego = ego.id;
       if (
         settings.donation_active &&
@@ -1276,7 +1366,8 @@
     isSpectator = _.isUndefined(player_id);
     var socketSettings = {
       endpoint: "chat",
-      broadcast: CHANNEL,
+      // Spectators can watch a room other than the first
+      broadcast: dallinger.getUrlParameter("room") || CHANNEL,
       control: CONTROL_CHANNEL,
       lagTolerance: 0.001,
       callbackMap: {
@@ -1288,14 +1379,52 @@
         stop: gameOverHandler(player_id),
         wall_built: addWall,
         move_rejection: onMoveRejected,
+        room: onRoomAssigned,
+        player_channel: onOwnChannel,
+        state_channel: onOwnChannel,
       },
     };
     const socket = new socketlib.GUSocket(socketSettings);
+    requestStateResync = function () {
+      socket.send({
+        type: "state_resync",
+        player_id: isSpectator ? "spectator" : player_id,
+      });
+    };
+
+    // The server routed a player to a room, which has a channel of its own
+    function onRoomAssigned(msg) {
+      if (isSpectator || String(msg.player_id) !== String(player_id)) {
+        return;
+      }
+      socket.listen(msg.channel).done(requestStateResync);
+    }
+
+    // The server sends players the messages meant for them only, and
+    // spectators their view of the grid, on a channel of their own
+    var ownChannel = null;
+    function onOwnChannel(msg) {
+      var id = isSpectator ? "spectator" : player_id;
+      if (String(msg.player_id) !== String(id) || msg.channel === ownChannel) {
+        return;
+      }
+      if (ownChannel !== null) {
+        if (isSpectator) {
+          // Spectators watch the room of the channel they listen on
+          return;
+        }
+        socket.unfollow(ownChannel);
+      }
+      ownChannel = msg.channel;
+      socket.follow(msg.channel).done(requestStateResync);
+    }
 
     socket.open().done(function () {
       var data = {
         type: "connect",
         player_id: isSpectator ? "spectator" : player_id,
+        // The formats of state messages we can decode
+        formats: ["json", "binary"],
       };
       socket.send(data);
     });
@@ -5,23 +5,151 @@
 
 import ReconnectingWebSocket from "reconnecting-websocket";
 
+const NULL_INT = -2147483648;
+const NULL_POS = 0xffff;
+
+/**
+ * Unpack a grid state packed by the server's encoding.pack_grid, given the
+ * schema it was packed with. values holds the table of values received so
+ * far, and is updated with those added by this grid.
+ */
+export function unpackGrid(encoded, schema, values) {
+  const binary = atob(encoded);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  const view = new DataView(bytes.buffer);
+  const length = view.getUint32(0, true);
+  const header = JSON.parse(
+    new TextDecoder().decode(bytes.subarray(4, 4 + length)),
+  );
+  values.length = header.values_start;
+  for (const value of header.values) {
+    values.push(value);
+  }
+  let offset = 4 + length;
+
+  function unpack(kind) {
+    let value;
+    if (schema.records[kind] !== undefined) {
+      const present = view.getUint8(offset);
+      offset += 1;
+      return present ? unpackRecord(kind) : null;
+    }
+    switch (kind) {
+      case "int":
+        value = view.getInt32(offset, true);
+        offset += 4;
+        return value === NULL_INT ? null : value;
+      case "num":
+        value = view.getFloat64(offset, true);
+        offset += 8;
+        return isNaN(value) ? null : value;
+      case "bool":
+        value = view.getUint8(offset);
+        offset += 1;
+        return value === 2 ? null : value === 1;
+      case "val":
+        value = values[view.getUint16(offset, true)];
+        offset += 2;
+        return value === undefined ? null : value;
+      case "pos":
+        value = [
+          view.getUint16(offset, true),
+          view.getUint16(offset + 2, true),
+        ];
+        offset += 4;
+        return value[0] === NULL_POS ? null : value;
+    }
+    throw new Error(`Unknown field kind ${kind}`);
+  }
+
+  function unpackRecord(kind) {
+    const record = {};
+    for (const [name, fieldKind] of schema.records[kind]) {
+      record[name] = unpack(fieldKind);
+    }
+    const bare = schema.bare[kind];
+    if (bare !== undefined) {
+      const others = Object.keys(record).filter((name) => name !== bare);
+      if (others.every((name) => record[name] === null)) {
+        return record[bare];
+      }
+    }
+    return record;
+  }
+
+  const grid = Object.assign({}, header.state);
+  for (const [key, count] of header.sections) {
+    const kind = schema.sections[key];
+    const isRecord = schema.records[kind] !== undefined;
+    grid[key] = [];
+    for (let i = 0; i < count; i++) {
+      grid[key].push(isRecord ? unpackRecord(kind) : unpack(kind));
+    }
+  }
+  return grid;
+}
+
 export class GUSocket {
   constructor(settings) {
     const tolerance =
       settings.lagTolerance === undefined ? 0.1 : settings.lagTolerance;
 
+    this.endpoint = settings.endpoint;
+    this.tolerance = tolerance;
     this.broadcastChannel = settings.broadcast;
     this.controlChannel = settings.control;
     this.callbackMap = settings.callbackMap;
+    // The schema of binary state, sent by the server when we connect
+    this.stateSchema = null;
+    this.stateValues = [];
+    // Sockets listening on further channels, by channel
+    this.followed = {};
     this.socket = this._makeSocket(
-      settings.endpoint,
+      this.endpoint,
       this.broadcastChannel,
-      tolerance,
+      this.tolerance,
     );
+  }
 
-    this.socket.onmessage = (event) => {
-      this._dispatch(event);
+  /**
+   * Listen on another broadcast channel, such as the channel of the room
+   * the server routed us to, reconnecting if it isn't the current one.
+   */
+  listen(channel) {
+    if (channel === this.broadcastChannel) {
+      return $.Deferred().resolve();
+    }
+    this.socket.close();
+    this.broadcastChannel = channel;
+    this.socket = this._makeSocket(this.endpoint, channel, this.tolerance);
+    return this.open();
+  }
+
+  /**
+   * Listen on another channel as well as the broadcast channel, such as
+   * the channel our view of the grid is sent on.
+   */
+  follow(channel) {
+    if (this.followed[channel] !== undefined) {
+      return $.Deferred().resolve();
+    }
+    const socket = this._makeSocket(this.endpoint, channel, this.tolerance);
+    const isOpen = $.Deferred();
+    socket.onopen = () => {
+      isOpen.resolve();
     };
+    this.followed[channel] = socket;
+    return isOpen;
+  }
+
+  unfollow(channel) {
+    if (this.followed[channel] !== undefined) {
+      this.followed[channel].close();
+      delete this.followed[channel];
+    }
   }
 
   open() {
@@ -54,19 +182,40 @@ export class GUSocket {
     const socketUrl = `${app_root}${endpoint}?channel=${channel}&tolerance=${tolerance}`;
     const socket = new ReconnectingWebSocket(socketUrl);
     socket.debug = true;
+    socket.onmessage = (event) => {
+      this._dispatch(event, channel);
+    };
 
     return socket;
   }
 
-  _dispatch(event) {
-    const marker = `${this.broadcastChannel}:`;
+  _dispatch(event, channel) {
+    const marker = `${channel}:`;
     if (!event.data.startsWith(marker)) {
-      console.log(
-        `Message was not on channel ${this.broadcastChannel}. Ignoring.`,
-      );
+      console.log(`Message was not on channel ${channel}. Ignoring.`);
       return;
     }
-    const msg = JSON.parse(event.data.substring(marker.length));
+    this._handle(JSON.parse(event.data.substring(marker.length)));
+  }
+
+  _handle(msg) {
+    if (msg.type === "batch") {
+      // The server sends the messages of one tick together, in order
+      for (const message of msg.messages) {
+        this._handle(message);
+      }
+      return;
+    }
+    if (msg.type === "state_schema") {
+      this.stateSchema = msg.schema;
+    }
+    if (msg.format === "binary") {
+      if (this.stateSchema === null) {
+        console.log("Received binary state before its schema. Ignoring.");
+        return;
+      }
+      msg.grid = unpackGrid(msg.grid, this.stateSchema, this.stateValues);
+    }
     const callback = this.callbackMap[msg.type];
     if (callback !== undefined) {
       callback(msg);
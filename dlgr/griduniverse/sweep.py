@@ -0,0 +1,198 @@
+"""Parameter sweeps over headless Griduniverse games.
+
+A sweep runs one ``simulation.Simulation`` for every combination of the
+values given for each parameter and every seed, spread over a pool of
+processes. The summary of each game is appended to a CSV file as soon as it
+finishes, one row per game and one column per parameter and metric, so an
+interrupted sweep can be resumed by running it again with the same output
+file.
+
+Run this module with a YAML file describing the sweep::
+
+    python -m dlgr.griduniverse.sweep sweep.yml --output results.csv
+
+where sweep.yml holds, for example::
+
+    seeds: 10
+    policies: [FoodSeekingPolicy, FoodSeekingPolicy, RandomPolicy]
+    params:
+      time_per_round: [30.0, 60.0]
+      rows: [25, 50]
+      items.gooseberry.calories: [3, 5]
+
+Parameters named ``items.<item_id>.<property>`` set properties of an item
+type in game_config.yml; the rest are experiment parameters.
+"""
+import argparse
+import concurrent.futures
+import copy
+import csv
+import itertools
+import logging
+import os
+
+import yaml
+
+from . import simulation
+
+logger = logging.getLogger(__file__)
+
+# The columns of the summary of each game, after the parameters
+METRICS = (
+    "seed",
+    "rounds",
+    "game_time",
+    "ticks",
+    "moves",
+    "rejected_moves",
+    "items_consumed",
+    "average_score",
+    "average_payoff",
+)
+
+
+def param_grid(params):
+    """Return every combination of the values listed for each parameter in
+    ``params``, as a list of dicts.
+    """
+    names = sorted(params)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(params[name] for name in names))
+    ]
+
+
+def _apply_item_params(game_config, params):
+    """Split ``params`` into experiment parameters, returning those, and
+    item properties, which are set in ``game_config``.
+    """
+    config = {}
+    items = {str(item["item_id"]): item for item in game_config.get("items", ())}
+    for name, value in params.items():
+        if name.startswith("items."):
+            _, item_id, prop = name.split(".", 2)
+            items[item_id][prop] = value
+        else:
+            config[name] = value
+    return config
+
+
+def run_game(params, seed, policies, game_config=None):
+    """Run one headless game and return its summary as a row of the
+    results file.
+    """
+    game_config = copy.deepcopy(game_config or simulation.read_game_config())
+    config = _apply_item_params(game_config, params)
+    game = simulation.Simulation(
+        [getattr(simulation, policy)() for policy in policies],
+        config=config,
+        game_config=game_config,
+        seed=seed,
+    )
+    summary = game.run()
+    row = dict(params, seed=seed)
+    row.update((name, summary[name]) for name in METRICS if name in summary)
+    return row
+
+
+def _key(row, names):
+    return tuple(str(row[name]) for name in names) + (str(row["seed"]),)
+
+
+def run_sweep(
+    params, seeds, policies, output, game_config=None, workers=None, resume=True
+):
+    """Run a game for each combination of ``params`` and each of ``seeds``,
+    appending the summaries to the CSV file ``output``, and return the
+    number of games run.
+
+    With ``resume``, games already in ``output`` are skipped. ``workers``
+    is the number of processes, by default one per CPU; with 0, games run
+    in this process.
+    """
+    names = sorted(params)
+    fieldnames = names + list(METRICS)
+    done = set()
+    if resume and os.path.exists(output):
+        with open(output, newline="") as results:
+            reader = csv.DictReader(results)
+            if reader.fieldnames != fieldnames:
+                raise ValueError(
+                    "{} holds the results of a different sweep".format(output)
+                )
+            done = {_key(row, names) for row in reader}
+
+    tasks = [
+        (combination, seed)
+        for combination in param_grid(params)
+        for seed in seeds
+        if _key(dict(combination, seed=seed), names) not in done
+    ]
+    logger.info("Running {} games, {} already done".format(len(tasks), len(done)))
+
+    write_header = not (resume and os.path.exists(output))
+    with open(output, "a" if resume else "w", newline="") as results:
+        writer = csv.DictWriter(results, fieldnames=fieldnames)
+        if write_header:
+            writer.writeheader()
+
+        def write(row):
+            writer.writerow(row)
+            results.flush()
+
+        if workers == 0:
+            for combination, seed in tasks:
+                write(run_game(combination, seed, policies, game_config))
+            return len(tasks)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_game, combination, seed, policies, game_config)
+                for combination, seed in tasks
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                write(future.result())
+    return len(tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a parameter sweep of headless Griduniverse games."
+    )
+    parser.add_argument("sweep", help="YAML file describing the sweep.")
+    parser.add_argument(
+        "--output",
+        default="results.csv",
+        help="CSV file to append results to (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes to use (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Overwrite the output file rather than resuming.",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.sweep) as sweep_file:
+        sweep = yaml.safe_load(sweep_file)
+    seeds = sweep.get("seeds", 1)
+    if isinstance(seeds, int):
+        seeds = list(range(seeds))
+    count = run_sweep(
+        sweep.get("params", {}),
+        seeds,
+        sweep.get("policies", ["FoodSeekingPolicy"]),
+        args.output,
+        workers=args.workers,
+        resume=not args.restart,
+    )
+    print("Ran {} games; results are in {}.".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -84,6 +84,9 @@ setup_args = dict(
             "pip-tools",
             "pre-commit",
         ],
+        "fast": [
+            "orjson",
+        ],
     },
 )
 setup(**setup_args)
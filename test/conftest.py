@@ -184,15 +184,13 @@ def pubsub(exp):
 
 @pytest.fixture
 def fresh_gridworld():
-    from dlgr.griduniverse.experiment import Gridworld
+    from dlgr.griduniverse.experiment import gridworlds
 
-    if hasattr(Gridworld, "instance"):
-        delattr(Gridworld, "instance")
+    gridworlds.clear()
 
     yield
 
-    if hasattr(Gridworld, "instance"):
-        delattr(Gridworld, "instance")
+    gridworlds.clear()
 
 
 @pytest.fixture
@@ -17,7 +17,7 @@ class TestAutoTransition(object):
                 "n_uses": 1,
             }
         )
-        exp.grid.item_locations[(2, 2)] = item
+        exp.grid.add_item(item, (2, 2))
 
         exp.grid.trigger_transitions(time=lambda: time.time() + 5)
         assert exp.grid.item_locations[(2, 2)].item_id == "sunflower_bud"
@@ -33,7 +33,7 @@ class TestAutoTransition(object):
                 "n_uses": 1,
             }
         )
-        exp.grid.item_locations[(2, 2)] = item
+        exp.grid.add_item(item, (2, 2))
 
         exp.item_config["sunflower_sprout"]["auto_transition_target"] = None
         exp.grid.trigger_transitions(time=lambda: time.time() + 5)
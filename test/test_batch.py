@@ -0,0 +1,215 @@
+import random
+
+import numpy
+import pytest
+
+from dlgr.griduniverse.batch import ACTIONS, BatchEnvironment
+from dlgr.griduniverse.experiment import read_game_config, softmax
+
+
+@pytest.fixture
+def game_config(item_config):
+    food = dict(
+        item_config[1],
+        limit_quantity=False,
+        item_count=5,
+        maturation_threshold=0.0,
+        respawn=True,
+    )
+    return dict(read_game_config(), items=[food], transitions=[])
+
+
+def make_env(game_config, num_envs=4, num_players=2, seed=1, **config):
+    config = dict(
+        {
+            "rows": 8,
+            "columns": 8,
+            "walls_density": 0.0,
+            "time_per_round": 1.0,
+            "num_rounds": 2,
+            "motion_speed_limit": 0,
+        },
+        **config
+    )
+    env = BatchEnvironment(
+        num_envs, num_players, config=config, game_config=game_config, seed=seed
+    )
+    env.reset()
+    return env
+
+
+def stay(env):
+    return numpy.zeros(env.action_shape, dtype=int)
+
+
+def clear(env):
+    env.items[:] = 0
+    env.walls[:] = False
+
+
+class TestReset(object):
+    def test_observation_shapes(self, game_config):
+        env = make_env(game_config)
+        observation = env.reset()
+        assert observation["walls"].shape == (4, 8, 8)
+        assert observation["items"].shape == (4, 8, 8)
+        assert observation["positions"].shape == (4, 2, 2)
+        assert observation["scores"].shape == (4, 2)
+
+    def test_places_items_and_players_on_distinct_cells(self, game_config):
+        env = make_env(game_config, walls_density=0.5)
+        assert ((env.items > 0).sum(axis=(1, 2)) == 5).all()
+        for walls, items, positions in zip(env.walls, env.items, env.positions):
+            cells = {tuple(position) for position in positions}
+            assert len(cells) == 2
+            for cell in cells:
+                assert not walls[cell] and not items[cell]
+            assert not (walls & (items > 0)).any()
+
+    def test_seed_makes_batches_reproducible(self, game_config):
+        first = make_env(game_config, seed=3)
+        second = make_env(game_config, seed=3)
+        numpy.testing.assert_array_equal(first.items, second.items)
+        numpy.testing.assert_array_equal(first.positions, second.positions)
+
+    def test_seeded_walls_are_reproducible(self, game_config):
+        first = make_env(game_config, seed=3, walls_density=1.0)
+        second = make_env(game_config, seed=3, walls_density=1.0)
+        numpy.testing.assert_array_equal(first.walls, second.walls)
+
+    def test_seed_leaves_global_random_state_alone(self, game_config):
+        random.seed(3)
+        numpy.random.seed(3)
+        expected = (random.random(), numpy.random.random())
+        random.seed(3)
+        numpy.random.seed(3)
+        env = make_env(game_config, seed=7, walls_density=1.0)
+        env.step(numpy.ones(env.action_shape, dtype=int))
+        assert (random.random(), numpy.random.random()) == expected
+
+    def test_no_room_for_players(self, game_config):
+        game_config["items"][0]["item_count"] = 64
+        with pytest.raises(ValueError):
+            make_env(game_config)
+
+
+class TestStep(object):
+    def test_checks_shape_of_actions(self, game_config):
+        env = make_env(game_config)
+        with pytest.raises(ValueError):
+            env.step(numpy.zeros((4, 3), dtype=int))
+
+    def test_moves_players(self, game_config):
+        env = make_env(game_config)
+        clear(env)
+        env.positions[:] = [[2, 2], [5, 5]]
+        actions = stay(env)
+        actions[:, 0] = ACTIONS.index("up")
+        actions[:, 1] = ACTIONS.index("right")
+        observation, rewards, dones, info = env.step(actions)
+        assert (observation["positions"][:, 0] == [1, 2]).all()
+        assert (observation["positions"][:, 1] == [5, 6]).all()
+        assert info["moved"].all()
+
+    def test_moves_are_blocked(self, game_config):
+        env = make_env(game_config, num_envs=3)
+        clear(env)
+        env.positions[:] = [[0, 2], [4, 4]]
+        env.positions[1, 1] = [1, 2]
+        env.walls[2, 1, 2] = True
+        actions = stay(env)
+        actions[:, 0] = ACTIONS.index("up")
+        actions[1:, 0] = ACTIONS.index("down")
+        env.step(actions)
+        # Off the edge, into another player and into a wall
+        assert (env.positions[:, 0] == [[0, 2], [0, 2], [0, 2]]).all()
+
+    def test_speed_limit(self, game_config):
+        env = make_env(game_config, num_envs=1, motion_speed_limit=5)
+        clear(env)
+        env.positions[:] = [[2, 2], [5, 5]]
+        actions = numpy.full(env.action_shape, ACTIONS.index("left"))
+        moves = [env.step(actions)[3]["moved"].all() for _ in range(5)]
+        assert moves == [False, False, False, True, False]
+
+    def test_player_overlap(self, game_config):
+        env = make_env(game_config, num_envs=1, player_overlap=True)
+        clear(env)
+        env.positions[:] = [[0, 2], [1, 2]]
+        actions = stay(env)
+        actions[:, 0] = ACTIONS.index("down")
+        env.step(actions)
+        assert (env.positions[0] == [[1, 2], [1, 2]]).all()
+
+    def test_motion_cost(self, game_config):
+        env = make_env(game_config, motion_cost=1.0, initial_score=1)
+        clear(env)
+        env.positions[:] = [[2, 2], [5, 5]]
+        actions = numpy.full(env.action_shape, ACTIONS.index("left"))
+        __, rewards, __, __ = env.step(actions)
+        assert (rewards == -1.0).all()
+        __, __, __, info = env.step(actions)
+        assert not info["moved"].any()
+
+    def test_consumes_and_respawns_items(self, game_config):
+        env = make_env(game_config)
+        code = 1
+        calories = env.calories[code]
+        env.positions[:] = [[2, 2], [5, 5]]
+        env.items[:] = 0
+        env.items[:, 2, 3] = code
+        env.colors[:] = 1
+        actions = stay(env)
+        actions[:, 0] = ACTIONS.index("right")
+        __, rewards, __, __ = env.step(actions)
+        assert (rewards[:, 0] == calories).all()
+        assert (rewards[:, 1] == 0).all()
+        assert (env.items_consumed == 1).all()
+        assert ((env.items > 0).sum(axis=(1, 2)) == 1).all()
+        assert not env.items[:, 2, 3].any()
+
+    def test_immature_items_are_not_consumed(self, game_config):
+        game_config["items"][0].update(maturation_threshold=0.5, maturation_speed=0.1)
+        env = make_env(game_config)
+        env.positions[:] = [[2, 2], [5, 5]]
+        env.items[:] = 0
+        env.items[:, 2, 3] = 1
+        actions = stay(env)
+        actions[:, 0] = ACTIONS.index("right")
+        env.step(actions)
+        assert (env.items_consumed == 0).all()
+
+    def test_payoffs_match_gridworld(self, game_config):
+        env = make_env(
+            game_config, num_envs=1, num_players=4, intragroup_competition=2.0
+        )
+        env.scores[:] = [[1.0, 2.0, 3.0, 4.0]]
+        env.colors[:] = [[0, 0, 1, 2]]
+        env.step(stay(env))
+
+        grid = env.grid
+        scores = env.scores[0]
+        colors = env.colors[0]
+        group_scores = [
+            scores[colors == g].sum() for g in range(len(grid.player_colors))
+        ]
+        inter = softmax(group_scores, temperature=grid.intergroup_competition)
+        expected = []
+        for score, color in zip(scores, colors):
+            group = list(scores[colors == color])
+            intra = softmax(group, temperature=2.0)[group.index(score)]
+            expected.append(
+                scores.sum() * intra * inter[color] * grid.dollars_per_point
+            )
+        numpy.testing.assert_allclose(env.payoffs[0], expected)
+
+    def test_rounds_end_the_game(self, game_config):
+        env = make_env(game_config)
+        steps = 0
+        dones = numpy.zeros(env.num_envs, dtype=bool)
+        while not dones.all():
+            __, __, dones, info = env.step(stay(env))
+            steps += 1
+        assert info["round"] == 2
+        assert env.time >= 2.0
+        assert steps == pytest.approx(20, abs=2)
@@ -146,6 +146,42 @@ class TestRandomMovementBot(object):
             {"type": "move", "player_id": "", "move": "down"}
         )
 
+    def test_listens_on_channel_of_its_room(self, bot):
+        bot.participant_id = 1
+        with mock.patch(
+            "dallinger.experiment_server.sockets.chat_backend"
+        ) as chat_backend:
+            bot.send('griduniverse:{"type": "room", "player_id": 2, "channel": "gu_2"}')
+            chat_backend.subscribe.assert_not_called()
+            bot.send('griduniverse:{"type": "room", "player_id": 1, "channel": "gu_1"}')
+            chat_backend.subscribe.assert_called_once_with(bot, "gu_1")
+
+    def test_listens_on_its_own_channel(self, bot):
+        bot.participant_id = 1
+        with mock.patch(
+            "dallinger.experiment_server.sockets.chat_backend"
+        ) as chat_backend:
+            bot.send(
+                'griduniverse:{"type": "player_channel", "player_id": 1, '
+                '"channel": "gu_player_1"}'
+            )
+            chat_backend.subscribe.assert_called_once_with(bot, "gu_player_1")
+
+    def test_handles_each_message_of_batch(self, bot):
+        bot.handle_state = mock.Mock()
+        bot.handle_stop = mock.Mock()
+        bot.send(
+            'griduniverse:{"type": "batch", "messages": '
+            '[{"type": "state", "count": 1}, {"type": "stop"}]}'
+        )
+        bot.handle_state.assert_called_once_with({"type": "state", "count": 1})
+        bot.handle_stop.assert_called_once_with({"type": "stop"})
+
+    def test_accepts_grid_sent_as_object(self, bot, grid_state):
+        bot.grid = {}
+        bot.handle_state({"grid": json.loads(grid_state), "remaining_time": 60})
+        assert bot.grid["grid"] == json.loads(grid_state)
+
     def test_skips_experiment_if_overrecruited(self, bot, overrecruited_response):
         bot.on_signup(overrecruited_response)
 
@@ -0,0 +1,131 @@
+import pytest
+
+from dlgr.griduniverse.broadcast import StateTracker, apply_state
+
+
+def player(id, position):
+    return {"id": id, "position": position, "score": 0}
+
+
+def item(id, position, maturity=1.0):
+    return {"id": id, "item_id": "food", "position": position, "maturity": maturity}
+
+
+def grid_state(players=(), items=(), walls=(), **kw):
+    state = {
+        "players": list(players),
+        "items": list(items),
+        "walls": list(walls),
+        "round": 0,
+        "rows": 10,
+        "columns": 10,
+    }
+    state.update(kw)
+    return state
+
+
+class TestStateTracker(object):
+    @pytest.fixture
+    def tracker(self):
+        return StateTracker(keyframe_interval=3)
+
+    def test_first_update_is_keyframe(self, tracker):
+        state = grid_state(players=[player(1, [0, 0])], walls=[[1, 1]])
+        payload = tracker.update(state)
+        assert payload["keyframe"] is True
+        assert payload["version"] == 1
+        assert payload["players"] == state["players"]
+        assert payload["walls"] == [[1, 1]]
+
+    def test_delta_only_includes_changes(self, tracker):
+        tracker.update(
+            grid_state(
+                players=[player(1, [0, 0]), player(2, [5, 5])],
+                items=[item(1, [2, 2]), item(2, [3, 3])],
+            )
+        )
+        payload = tracker.update(
+            grid_state(
+                players=[player(1, [0, 1]), player(2, [5, 5])],
+                items=[item(1, [2, 2], maturity=0.5), item(3, [4, 4])],
+                walls=[[7, 7]],
+            )
+        )
+        assert payload["keyframe"] is False
+        assert payload["base_version"] == 1
+        assert payload["players"] == [player(1, [0, 1])]
+        assert payload["items_changed"] == [
+            item(1, [2, 2], maturity=0.5),
+            item(3, [4, 4]),
+        ]
+        assert payload["items_removed"] == [[3, 3]]
+        assert payload["walls_added"] == [[7, 7]]
+
+    def test_delta_reports_removed_players(self, tracker):
+        tracker.update(grid_state(players=[player(1, [0, 0]), player(2, [1, 1])]))
+        payload = tracker.update(grid_state(players=[player(1, [0, 0])]))
+        assert payload["players"] == []
+        assert payload["players_removed"] == [2]
+
+    def test_unchanged_sections_can_be_omitted(self, tracker):
+        tracker.update(grid_state(items=[item(1, [2, 2])]))
+        state = grid_state()
+        del state["items"]
+        del state["walls"]
+        payload = tracker.update(state)
+        assert "items_removed" not in payload
+        assert tracker.items
+
+    def test_periodic_keyframes(self, tracker):
+        payloads = [tracker.update(grid_state()) for i in range(6)]
+        assert [p["keyframe"] for p in payloads] == [
+            True,
+            False,
+            False,
+            False,
+            True,
+            False,
+        ]
+
+    def test_request_keyframe(self, tracker):
+        tracker.update(grid_state())
+        assert not tracker.keyframe_due
+        tracker.request_keyframe()
+        assert tracker.keyframe_due
+        assert tracker.update(grid_state())["keyframe"] is True
+
+
+class TestApplyState(object):
+    def test_deltas_reconstruct_full_state(self):
+        tracker = StateTracker()
+        states = [
+            grid_state(players=[player(1, [0, 0])], items=[item(1, [2, 2])]),
+            grid_state(
+                players=[player(1, [0, 1]), player(2, [3, 3])],
+                items=[item(2, [4, 4])],
+                walls=[[1, 1]],
+            ),
+            grid_state(players=[player(2, [3, 4])], items=[], walls=[[1, 1]]),
+        ]
+        current = None
+        for state in states:
+            current = apply_state(current, tracker.update(state))
+            assert current["players"] == state["players"]
+            assert current["items"] == state["items"]
+            assert current["walls"] == state["walls"]
+
+    def test_missed_delta_returns_none(self):
+        tracker = StateTracker()
+        current = apply_state(None, tracker.update(grid_state()))
+        tracker.update(grid_state())
+        assert apply_state(current, tracker.update(grid_state())) is None
+
+    def test_delta_without_state_returns_none(self):
+        tracker = StateTracker()
+        tracker.update(grid_state())
+        assert apply_state(None, tracker.update(grid_state())) is None
+
+    def test_unversioned_state_is_merged(self):
+        current = {"players": [], "walls": [[1, 1]]}
+        merged = apply_state(current, {"players": [player(1, [0, 0])]})
+        assert merged == {"players": [player(1, [0, 0])], "walls": [[1, 1]]}
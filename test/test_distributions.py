@@ -0,0 +1,63 @@
+import numpy
+
+from dlgr.griduniverse import distributions
+from dlgr.griduniverse.distributions import get_distribution
+
+
+class TestDistributions(object):
+    def test_weights_cover_the_grid(self):
+        for name in distributions.DISTRIBUTIONS:
+            distribution = get_distribution(name, 10, 12)
+            assert distribution.weights.shape == (10, 12)
+            assert (distribution.weights >= 0).all()
+
+    def test_distributions_are_shared(self):
+        assert get_distribution("sinusoidal", 10, 10) is get_distribution(
+            "sinusoidal", 10, 10
+        )
+        assert get_distribution("sinusoidal", 10, 10) is not get_distribution(
+            "sinusoidal", 10, 10, "15"
+        )
+
+    def test_distributions_with_arguments_are_not_cached(self):
+        first = get_distribution("sinusoidal", 10, 10, "15")
+        second = get_distribution("sinusoidal", 10, 10, "15")
+        assert first is not second
+        assert (first.weights == second.weights).all()
+
+    def test_probability_distribution_functions(self):
+        for name in distributions.DISTRIBUTIONS:
+            function = getattr(distributions, f"{name}_probability_distribution")
+            row, column = function(5, 7)
+            assert 0 <= row < 5 and 0 <= column < 7
+        row, column = distributions.sinusoidal_probability_distribution(5, 7, "15")
+        assert 0 <= row < 5 and 0 <= column < 7
+
+    def test_unknown_distribution(self):
+        assert get_distribution("nonexistent", 10, 10) is None
+
+    def test_sample(self):
+        positions = get_distribution("vertical_gradient", 5, 5).sample(100)
+        assert len(positions) == 100
+        assert all(0 <= row < 5 and 0 <= column < 5 for row, column in positions)
+
+    def test_masked_sample_gives_distinct_allowed_cells(self):
+        mask = numpy.zeros((5, 5), dtype=bool)
+        mask[1, :] = True
+        positions = get_distribution("center_bias", 5, 5).sample(10, mask=mask)
+        assert sorted(positions) == [[1, column] for column in range(5)]
+
+    def test_custom_function(self, monkeypatch):
+        def corner_probability_distribution(rows, columns, *args):
+            return [0, 0]
+
+        monkeypatch.setattr(
+            distributions,
+            "corner_probability_distribution",
+            corner_probability_distribution,
+            raising=False,
+        )
+        distribution = get_distribution("corner", 3, 3)
+        assert distribution.weights is None
+        assert distribution.sample(2) == [[0, 0], [0, 0]]
+        assert distribution.sample(2, mask=numpy.ones((3, 3), dtype=bool)) == [[0, 0]]
@@ -0,0 +1,203 @@
+import base64
+import json
+
+import mock
+import numpy
+import pytest
+
+from dlgr.griduniverse import encoding
+from dlgr.griduniverse.broadcast import StateTracker
+from dlgr.griduniverse.encoding import (
+    BinaryStateEncoder,
+    StateEncoder,
+    ValueTable,
+    pack_grid,
+    unpack_grid,
+)
+
+
+def player(id, position):
+    return {"id": id, "position": position, "score": 0}
+
+
+def grid_state(players=(), walls=()):
+    return {
+        "players": list(players),
+        "items": [],
+        "walls": [{"position": position} for position in walls],
+        "round": 0,
+    }
+
+
+def state_message(grid):
+    return {"type": "state", "grid": grid, "count": 1, "remaining_time": 30.0}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request):
+    if request.param == "orjson":
+        if encoding.orjson is None:
+            pytest.skip("orjson is not installed")
+        yield
+    else:
+        with mock.patch.object(encoding, "orjson", None):
+            yield
+
+
+@pytest.mark.usefixtures("backend")
+class TestDumps(object):
+    def test_round_trips(self):
+        value = {"a": [1, 2.5, "b", None, True], "c": {"d": []}}
+        assert encoding.loads(encoding.dumps(value)) == value
+
+    def test_returns_str(self):
+        assert encoding.dumps({"a": 1}) == '{"a":1}'
+
+    def test_large_integers_fall_back_to_json(self):
+        assert encoding.loads(encoding.dumps({"a": 2**70})) == {"a": 2**70}
+
+
+class TestORJSON(object):
+    def test_encodes_numpy_values(self):
+        if encoding.orjson is None:
+            pytest.skip("orjson is not installed")
+        value = {"position": numpy.array([1, 2])}
+        assert encoding.loads(encoding.dumps(value)) == {"position": [1, 2]}
+
+
+@pytest.mark.usefixtures("backend")
+class TestStateEncoder(object):
+    @pytest.fixture
+    def encoder(self):
+        return StateEncoder()
+
+    def test_encodes_grid_as_object(self, encoder):
+        message = state_message(
+            StateTracker().update(grid_state([player(1, [0, 0])], walls=[[1, 1]]))
+        )
+        assert json.loads(encoder.encode(message)) == message
+
+    def test_encodes_grid_without_other_fields(self, encoder):
+        message = {"grid": {"round": 1}}
+        assert json.loads(encoder.encode(message)) == message
+
+    def test_reuses_encoding_of_unchanged_walls(self, encoder):
+        state = grid_state(walls=[[1, 1], [1, 2]])
+        encoder.encode(state_message({"keyframe": True, "walls": state["walls"]}))
+        with mock.patch.object(encoding, "dumps", wraps=encoding.dumps) as dumps:
+            walls = [dict(wall) for wall in state["walls"]]
+            message = state_message({"keyframe": True, "walls": walls})
+            assert json.loads(encoder.encode(message)) == message
+        assert walls not in [call.args[0] for call in dumps.call_args_list]
+
+
+def full_player(id, position, **kw):
+    state = {
+        "id": id,
+        "position": position,
+        "score": 1.5,
+        "payoff": 0,
+        "color": "BLUE",
+        "motion_auto": False,
+        "motion_direction": "right",
+        "motion_speed_limit": 8,
+        "motion_timestamp": 0,
+        "name": "Player {}".format(id),
+        "identity_visible": True,
+        "recruiter_id": "",
+        "current_item": None,
+    }
+    state.update(kw)
+    return state
+
+
+def full_item(id, position):
+    return {
+        "id": id,
+        "item_id": "food",
+        "position": position,
+        "maturity": 0.5,
+        "creation_timestamp": 1000.25,
+        "remaining_uses": 1,
+    }
+
+
+class TestPackGrid(object):
+    def test_round_trips_keyframe(self):
+        payload = StateTracker().update(
+            {
+                "players": [
+                    full_player(1, [0, 0]),
+                    full_player(2, [3, 4], current_item=full_item(5, None)),
+                ],
+                "items": [full_item(3, [1, 1])],
+                "walls": [[2, 2], {"position": [2, 3], "color": [0.1, 0.2, 0.3]}],
+                "round": 0,
+                "rows": 10,
+                "columns": 10,
+            }
+        )
+        assert unpack_grid(pack_grid(payload)) == payload
+
+    def test_round_trips_delta(self):
+        payload = {
+            "version": 2,
+            "base_version": 1,
+            "keyframe": False,
+            "players": [full_player(1, [0, 1])],
+            "players_removed": [2],
+            "items_changed": [full_item(4, [5, 5])],
+            "items_removed": [[1, 1]],
+        }
+        assert unpack_grid(pack_grid(payload)) == payload
+
+    def test_sends_values_once_per_table(self):
+        table = ValueTable()
+        values = []
+        first = pack_grid({"players": [full_player(1, [0, 0])]}, table)
+        second = pack_grid({"players": [full_player(1, [0, 1])]}, table)
+        assert b"Player 1" in first
+        assert b"Player 1" not in second
+        unpack_grid(first, values)
+        assert unpack_grid(second, values)["players"][0]["name"] == "Player 1"
+
+    def test_payload_which_does_not_fit_schema_is_refused(self):
+        table = ValueTable()
+        player = full_player(1, [0, 0], name="Unsent", extra=True)
+        with pytest.raises(ValueError):
+            pack_grid({"players": [player]}, table)
+        assert len(table) == 0
+
+    def test_packs_many_players_compactly(self):
+        payload = {"players": [full_player(i, [i, i]) for i in range(100)]}
+        table = ValueTable()
+        pack_grid(payload, table)
+        assert len(pack_grid(payload, table)) * 4 < len(json.dumps(payload))
+
+
+class TestBinaryStateEncoder(object):
+    @pytest.fixture
+    def encoder(self):
+        return BinaryStateEncoder()
+
+    def test_encodes_grid_in_base64(self, encoder):
+        message = state_message(
+            StateTracker().update(grid_state([full_player(1, [0, 0])]))
+        )
+        encoded = json.loads(encoder.encode(message))
+        assert encoded["format"] == "binary"
+        assert unpack_grid(base64.b64decode(encoded["grid"])) == message["grid"]
+
+    def test_keyframes_restart_value_table(self, encoder):
+        tracker = StateTracker()
+        players = [full_player(1, [0, 0])]
+        encoder.encode(state_message(tracker.update(grid_state(players))))
+        encoder.encode(state_message(tracker.update(grid_state(players))))
+        tracker.request_keyframe()
+        encoded = encoder.encode(state_message(tracker.update(grid_state(players))))
+        packed = base64.b64decode(json.loads(encoded)["grid"])
+        assert unpack_grid(packed)["players"] == players
+
+    def test_falls_back_to_json(self, encoder):
+        message = state_message(StateTracker().update(grid_state([player(1, [0, 0])])))
+        assert json.loads(encoder.encode(message)) == message
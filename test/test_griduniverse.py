@@ -1,6 +1,7 @@
 """
 Tests for `dlgr.griduniverse` module.
 """
+import base64
 import collections
 import csv
 import json
@@ -9,7 +10,9 @@ import time
 import mock
 import pytest
 
+from dlgr.griduniverse import encoding
 from dlgr.griduniverse.experiment import Player
+from dlgr.griduniverse.inputs import MoveQueue
 
 
 class TestDependenciesLoaded(object):
@@ -93,6 +96,38 @@ class TestItem(object):
         with pytest.raises(TypeError):
             item.calories = 6
 
+    def test_instance_values_cannot_be_changed(self, item_config):
+        item = self.subject(item_config, id=42)
+
+        with pytest.raises(TypeError):
+            item.id = 43
+        with pytest.raises(TypeError):
+            item.creation_timestamp = 1.0
+        item.position = (1, 1)
+        item.remaining_uses = 0
+        assert item.position == (1, 1)
+        assert item.remaining_uses == 0
+
+    def test_items_can_share_a_type(self, item_config):
+        from dlgr.griduniverse.experiment import ItemType
+
+        item_type = ItemType(item_config)
+        item = self.subject(item_type)
+        other = self.subject(item_type)
+
+        assert item.item_type is other.item_type
+        assert item.item_config is item_config
+        assert item.remaining_uses == 3
+        assert not hasattr(item, "__dict__")
+
+    def test_equality_compares_fields(self, item_config):
+        item = self.subject(item_config, id=42, creation_timestamp=21.2)
+        same = self.subject(item_config, id=42, creation_timestamp=21.2)
+
+        assert item == same
+        same.position = (2, 2)
+        assert item != same
+
     def test_remaining_uses_default(self, item_config):
         item = self.subject(item_config)
 
@@ -121,6 +156,12 @@ class TestExperimentClass(object):
 
         assert isinstance(exp.grid, Gridworld)
 
+    def test_experiments_share_the_registered_grid(self, exp, db_session):
+        from dlgr.griduniverse.experiment import Griduniverse, gridworlds
+
+        assert Griduniverse(db_session).grid is exp.grid
+        assert gridworlds[exp.grid_name] is exp.grid
+
     def test_new_experiment_has_item_config_with_defaults(self, exp):
         item_config = exp.item_config
         assert isinstance(item_config, dict)
@@ -179,6 +220,7 @@ class TestGameLoops(object):
     def loop_exp_3x(self, exp):
         exp.grid.start_timestamp = time.time()
         exp.socket_session = mock.Mock()
+        exp.event_recorder = mock.Mock()
         exp.publish = mock.Mock()
 
         def count_down(counter):
@@ -220,6 +262,13 @@ class TestGameLoops(object):
             [i["item_count"] for i in exp.item_config.values()]
         )
 
+    def test_loop_batches_moves_while_running(self, loop_exp_3x):
+        exp = loop_exp_3x
+        with mock.patch.object(exp, "resolve_moves") as resolve_moves:
+            exp.game_loop()
+        assert resolve_moves.called
+        assert exp.first_room.move_queue is None
+
     def test_builds_grid_from_csv_if_specified(self, tmpdir, loop_exp_3x):
         exp = loop_exp_3x
         grid_config = [["w", "stone", "", "gooseberry_bush|3", "p1c2"]]
@@ -280,13 +329,16 @@ class TestGameLoops(object):
         }
 
     def test_loop_serialized_and_saves(self, loop_exp_3x):
-        # Grid serialized and added to DB session once per loop
+        # Grid serialized and added to DB session as a keyframe, skipped
+        # while unchanged, and saved as a keyframe again at the end
         exp = loop_exp_3x
         exp.game_loop()
 
-        assert exp.socket_session.add.call_count == 3
-        # Session commited once per loop and again at end
-        assert exp.socket_session.commit.call_count == 4
+        assert exp.socket_session.add.call_count == 2
+        assert exp.first_room.snapshot_policy.stats["keyframes"] == 2
+        assert exp.first_room.snapshot_policy.stats["skipped"] == 2
+        # Session commited once per snapshot and again at end
+        assert exp.socket_session.commit.call_count == 3
 
     def test_loop_resets_state(self, loop_exp_3x):
         # Wall and item state unset, item count reset during loop
@@ -321,7 +373,20 @@ class TestGameLoops(object):
         # publish called with stop event at end of round
         exp = loop_exp_3x
         exp.game_loop()
-        exp.publish.assert_called_once_with({"type": "stop"})
+        exp.publish.assert_called_once_with({"type": "stop"}, exp.first_room)
+
+    def test_loop_flushes_events_at_stop(self, loop_exp_3x):
+        exp = loop_exp_3x
+        exp.game_loop()
+        exp.event_recorder.stop.assert_called_once()
+
+    def test_loop_publishes_messages_in_batches(self, loop_exp_3x):
+        exp = loop_exp_3x
+        exp.outbox = mock.Mock()
+        exp.game_loop()
+        exp.outbox.start.assert_called_once()
+        exp.outbox.flush.assert_called()
+        exp.outbox.stop.assert_called_once()
 
     def test_send_state_thread(self, loop_exp_3x):
         exp = loop_exp_3x
@@ -331,6 +396,22 @@ class TestGameLoops(object):
         # and publish called with grid state message once per loop
         assert exp.publish.call_count == 4
 
+    def test_send_state_thread_sends_keyframe_then_deltas(self, loop_exp_3x):
+        exp = loop_exp_3x
+        exp.send_state_thread()
+
+        grids = [
+            json.loads(call.args[0])["grid"] for call in exp.publish.call_args_list
+        ]
+        assert [grid["keyframe"] for grid in grids] == [True, False, False, False]
+        assert [grid["version"] for grid in grids] == [1, 2, 3, 4]
+
+    def test_state_resync_requests_keyframe(self, exp):
+        exp.first_room.state_tracker.update(exp.grid.serialize())
+        assert not exp.first_room.state_tracker.keyframe_due
+        exp.handle_state_resync({"type": "state_resync"})
+        assert exp.first_room.state_tracker.keyframe_due
+
 
 @pytest.mark.usefixtures("env")
 class TestPlayerConnects(object):
@@ -354,6 +435,18 @@ class TestPlayerConnects(object):
         assert len(exp.grid.players) == 1
         assert len(exp.node_by_player_id) == 1
 
+    def test_handle_connect_to_a_full_grid(self, exp, a):
+        from dlgr.griduniverse.maze import Wall
+
+        for row in range(exp.grid.rows):
+            for column in range(exp.grid.columns):
+                exp.grid.add_wall(Wall(position=[row, column]))
+        participant = a.participant()
+        exp.handle_connect({"player_id": participant.id})
+        assert exp.node_by_player_id == {}
+        assert participant.id not in exp.grid.players
+        assert not participant.nodes()
+
     def test_handle_connect_is_noop_for_spectators(self, exp):
         exp.handle_connect({"player_id": "spectator"})
         assert exp.node_by_player_id == {}
@@ -382,6 +475,139 @@ class TestPlayerConnects(object):
         assert colors == {0: 5, 1: 4}
 
 
+@pytest.mark.usefixtures("env")
+class TestMoveBatching(object):
+    @pytest.fixture
+    def moving_exp(self, exp, participants):
+        exp.publish = mock.Mock()
+        exp.event_recorder = mock.Mock()
+        exp.grid.motion_speed_limit = 0
+        exp.grid.player_overlap = False
+        for participant in participants[:2]:
+            exp.handle_connect({"player_id": participant.id})
+            exp.grid.players[participant.id].motion_speed_limit = 0
+        exp.grid.players[participants[0].id].position = [5, 4]
+        exp.grid.players[participants[1].id].position = [5, 6]
+        exp.publish.reset_mock()
+        return exp
+
+    def send_move(self, exp, player_id, direction):
+        exp.send(
+            "griduniverse_ctrl:"
+            '{{"type":"move","player_id":{},"move":"{}"}}'.format(player_id, direction)
+        )
+
+    def test_moves_are_handled_immediately_without_game_loop(
+        self, moving_exp, participants
+    ):
+        self.send_move(moving_exp, participants[0].id, "right")
+        assert moving_exp.grid.players[participants[0].id].position == [5, 5]
+
+    def test_moves_wait_for_tick_while_game_loop_runs(self, moving_exp, participants):
+        room = moving_exp.first_room
+        room.move_queue = MoveQueue()
+        self.send_move(moving_exp, participants[0].id, "right")
+        assert moving_exp.grid.players[participants[0].id].position == [5, 4]
+        moving_exp.event_recorder.record.assert_not_called()
+
+        moving_exp.resolve_moves(room)
+
+        assert moving_exp.grid.players[participants[0].id].position == [5, 5]
+        details = moving_exp.event_recorder.record.call_args.args[2]
+        assert details["actual"] == "right"
+
+    def test_conflicting_moves_are_resolved_deterministically(
+        self, moving_exp, participants
+    ):
+        room = moving_exp.first_room
+        room.move_queue = MoveQueue()
+        first, second = (participant.id for participant in participants[:2])
+        # The second player's move arrives first, but the first goes first
+        self.send_move(moving_exp, second, "left")
+        self.send_move(moving_exp, first, "right")
+
+        moving_exp.resolve_moves(room)
+
+        assert moving_exp.grid.players[first].position == [5, 5]
+        assert moving_exp.grid.players[second].position == [5, 6]
+        moving_exp.publish.assert_called_once_with(
+            {"type": "move_rejection", "player_id": second},
+            channel="griduniverse_player_{}".format(second),
+        )
+
+    def test_queued_moves_are_resolved_when_queue_stops(self, moving_exp, participants):
+        room = moving_exp.first_room
+        room.move_queue = MoveQueue()
+        self.send_move(moving_exp, participants[0].id, "right")
+
+        moving_exp._stop_move_queue(room)
+
+        assert room.move_queue is None
+        assert moving_exp.grid.players[participants[0].id].position == [5, 5]
+        details = moving_exp.event_recorder.record.call_args.args[2]
+        assert details["actual"] == "right"
+
+    def test_nothing_is_published_without_moves(self, moving_exp):
+        room = moving_exp.first_room
+        room.move_queue = MoveQueue()
+        moving_exp.resolve_moves(room)
+        moving_exp.publish.assert_not_called()
+
+
+@pytest.fixture
+def binary_exp(db_session, active_config, fresh_gridworld):
+    from dallinger.experiments import Griduniverse
+
+    active_config.extend({"state_format": "binary"}, strict=True)
+    gu = Griduniverse(db_session)
+    gu.app_id = "test app"
+    gu.exp_config = active_config
+    gu.publish = mock.Mock()
+
+    yield gu
+    gu.socket_session.rollback()
+    gu.socket_session.close()
+
+
+@pytest.mark.usefixtures("env")
+class TestStateFormat(object):
+    def test_json_is_default(self, exp, a):
+        participant = a.participant()
+        exp.handle_connect({"player_id": participant.id, "formats": ["binary"]})
+        assert exp.first_room.state_format == "json"
+
+    def test_binary_client_is_sent_schema(self, binary_exp, a):
+        participant = a.participant()
+        binary_exp.handle_connect(
+            {"player_id": participant.id, "formats": ["json", "binary"]}
+        )
+        assert binary_exp.first_room.state_format == "binary"
+        message = binary_exp.publish.call_args_list[0].args[0]
+        assert message["type"] == "state_schema"
+        assert message["schema"] == encoding.SCHEMA
+
+    def test_json_client_makes_room_send_json(self, binary_exp, participants):
+        binary_exp.handle_connect(
+            {"player_id": participants[0].id, "formats": ["json", "binary"]}
+        )
+        binary_exp.handle_connect({"player_id": participants[1].id})
+        assert binary_exp.first_room.state_format == "json"
+        binary_exp.send_state(binary_exp.first_room)
+        message = json.loads(binary_exp.publish.call_args.args[0])
+        assert "format" not in message
+        assert len(message["grid"]["players"]) == 2
+
+    def test_sends_binary_state(self, binary_exp, a):
+        participant = a.participant()
+        binary_exp.handle_connect({"player_id": participant.id, "formats": ["binary"]})
+        binary_exp.send_state(binary_exp.first_room)
+        message = json.loads(binary_exp.publish.call_args.args[0])
+        assert message["format"] == "binary"
+        grid = encoding.unpack_grid(base64.b64decode(message["grid"]))
+        assert grid["keyframe"]
+        assert grid["players"] == [binary_exp.grid.players[participant.id].serialize()]
+
+
 @pytest.mark.usefixtures("env")
 class TestRecordPlayerActivity(object):
     def test_records_player_events(self, exp, a):
@@ -411,41 +637,55 @@ class TestRecordPlayerActivity(object):
         assert results["average_score"] >= 0.0
         assert results["average_payoff"] >= 0.0
 
+    def recorded_events(self, exp):
+        from dlgr.griduniverse.models import Event
+
+        return exp.socket_session.query(Event).order_by(Event.id).all()
+
     def test_record_event_with_participant(self, exp, a):
         # Adds event to player node
         participant = a.participant()
         exp.handle_connect({"player_id": participant.id})
-        exp.socket_session.add = mock.Mock()
-        exp.socket_session.commit = mock.Mock()
         exp.record_event({"data": ["some data"]}, player_id=participant.id)
-        exp.socket_session.add.assert_called_once()
-        exp.socket_session.commit.assert_called_once()
-        info = exp.socket_session.add.call_args[0][0]
+        info = self.recorded_events(exp)[-1]
         assert info.details["data"] == ["some data"]
         assert info.origin.id == exp.node_by_player_id[participant.id]
 
     def test_record_event_without_participant(self, exp):
         # Adds event to enviroment node
         node = exp.environment
-        exp.socket_session.add = mock.Mock()
-        exp.socket_session.commit = mock.Mock()
         exp.record_event({"data": ["some data"]})
-        exp.socket_session.add.assert_called_once()
-        exp.socket_session.commit.assert_called_once()
-        info = exp.socket_session.add.call_args[0][0]
+        info = self.recorded_events(exp)[-1]
         assert info.details["data"] == ["some data"]
         assert info.origin.id == node.id
 
+    def test_record_event_is_queued_while_recorder_runs(self, exp):
+        exp.event_recorder.running = True
+        exp.record_event({"data": ["some data"]})
+        assert exp.event_recorder.queue_depth == 1
+        assert self.recorded_events(exp) == []
+
+        exp.event_recorder.stop()
+        assert exp.event_recorder.queue_depth == 0
+        assert len(self.recorded_events(exp)) == 1
+
+    def test_record_event_flushes_full_queue(self, exp):
+        exp.event_recorder.running = True
+        exp.event_recorder.max_queue_size = 2
+        exp.record_event({"data": ["some data"]})
+        exp.record_event({"data": ["more data"]})
+        assert exp.event_recorder.queue_depth == 0
+        assert exp.event_recorder.stats["backpressure_flushes"] == 1
+        assert exp.event_recorder.stats["max_queue_depth"] == 2
+        assert len(self.recorded_events(exp)) == 2
+
     def test_record_event_with_failed_node(self, exp, a):
         # Does not save event, but logs failure
         node = exp.environment
         node.failed = True
-        exp.socket_session.add = mock.Mock()
-        exp.socket_session.commit = mock.Mock()
-        with mock.patch("dlgr.griduniverse.experiment.logger.info") as logger:
+        with mock.patch("dlgr.griduniverse.recorder.logger.info") as logger:
             exp.record_event({"data": ["some data"]})
-            assert exp.socket_session.add.call_count == 0
-            assert exp.socket_session.commit.call_count == 0
+            assert self.recorded_events(exp) == []
             logger.assert_called_once()
             assert logger.call_args.startswith(
                 "Tried to record an event after node#{} failure:".format(node.id)
@@ -485,6 +725,7 @@ class TestChat(object):
     def test_does_not_republish_broadcasts(self, exp, a, pubsub):
         participant = a.participant()
         exp.handle_connect({"player_id": participant.id})
+        pubsub.publish.reset_mock()
 
         exp.send(
             "griduniverse_ctrl:"
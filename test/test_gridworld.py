@@ -1,4 +1,5 @@
 import mock
+import numpy
 import pytest
 
 
@@ -23,6 +24,69 @@ class TestItemSpawning(object):
         assert gridworld.items_updated is True
         assert len(gridworld.item_locations.keys()) == 1
 
+    def test_find_empty_positions_avoids_occupied_cells(self, gridworld):
+        from dlgr.griduniverse.maze import Wall
+
+        gridworld.add_wall(Wall(position=[0, 0]))
+        gridworld.spawn_item(position=(0, 1))
+        gridworld.spawn_player(id=1)
+        occupied = {(0, 0), (0, 1), tuple(gridworld.players[1].position)}
+
+        positions = gridworld.find_empty_positions(20, item_id=1)
+        assert len(positions) == 20
+        assert len({tuple(p) for p in positions}) == 20
+        assert not occupied & {tuple(p) for p in positions}
+
+    def test_find_empty_positions_on_a_full_grid(self, gridworld):
+        cells = gridworld.rows * gridworld.columns
+        positions = gridworld.find_empty_positions(cells + 5, item_id=1)
+        assert len(positions) == cells
+        for position in positions:
+            gridworld.spawn_item(position=position, item_id=1)
+        assert gridworld.find_empty_positions(1, item_id=1) == []
+        gridworld.spawn_item(item_id=1)
+        assert len(gridworld.item_locations) == cells
+
+    def test_spawn_player_on_a_full_grid(self, gridworld):
+        for position in gridworld.find_empty_positions(
+            gridworld.rows * gridworld.columns, item_id=1
+        ):
+            gridworld.spawn_item(position=position, item_id=1)
+        with pytest.raises(ValueError):
+            gridworld.spawn_player(id=1)
+        assert gridworld.players == {}
+
+    def test_spawn_items_records_one_event(self, gridworld):
+        gridworld.items_updated = False
+        items = gridworld.spawn_items(5, item_id=1)
+
+        assert len(items) == 5
+        assert len(gridworld.item_locations) == 5
+        assert len({item.id for item in items}) == 5
+        assert gridworld.items_updated is True
+        gridworld.log_event.assert_called_once()
+        event = gridworld.log_event.call_args[0][0]
+        assert event["type"] == "spawn items"
+        assert sorted(event["positions"]) == sorted(item.position for item in items)
+
+    def test_spawn_items_at_positions(self, gridworld):
+        gridworld.spawn_items(2, item_id=1, positions=[[1, 1], [2, 2]])
+        assert set(gridworld.item_locations) == {(1, 1), (2, 2)}
+
+    def test_consumed_items_respawn(self, gridworld):
+        gridworld.item_config[1]["maturation_threshold"] = 0.0
+        player = gridworld.spawn_player(id=1)
+        player.color_idx = 1
+        position = player.position
+        gridworld.spawn_items(1, item_id=1, positions=[position])
+        item_count = gridworld.item_config[1]["item_count"]
+
+        gridworld.consume()
+
+        assert len(gridworld.item_locations) == 1
+        assert tuple(position) not in gridworld.item_locations
+        assert gridworld.item_config[1]["item_count"] == item_count
+
     def test_replenish_items_boosts_item_count_to_target(self, gridworld):
         target = sum(item.get("item_count") for item in gridworld.item_config.values())
 
@@ -31,6 +95,205 @@ class TestItemSpawning(object):
         target == len(gridworld.item_locations)
 
 
+@pytest.mark.usefixtures("env")
+class TestItemTypes(object):
+    def test_items_of_an_item_id_share_a_type(self, gridworld):
+        gridworld.spawn_items(2, 1)
+        gridworld.spawn_item(item_id=1)
+        types = {id(item.item_type) for item in gridworld.item_locations.values()}
+        assert len(types) == 1
+        assert gridworld.item_type(1).config is gridworld.item_config[1]
+
+    def test_replaced_config_gets_a_new_type(self, gridworld):
+        item_type = gridworld.item_type(1)
+        gridworld.item_config = {1: dict(gridworld.item_config[1])}
+        assert gridworld.item_type(1) is not item_type
+        assert gridworld.item_type(1).config is gridworld.item_config[1]
+
+    def test_types_are_kept_per_grid(self, gridworld):
+        from dlgr.griduniverse.experiment import Gridworld
+
+        other = Gridworld(item_config=gridworld.item_config)
+        assert other.item_type(1) is not gridworld.item_type(1)
+
+
+@pytest.mark.usefixtures("env")
+class TestItemTracking(object):
+    def test_mutations_advance_generation(self, gridworld):
+        generation = gridworld.item_generation
+        assert not gridworld.items_changed_since(generation)
+
+        gridworld.spawn_item(position=(1, 1))
+        assert gridworld.items_changed_since(generation)
+        assert gridworld.item_changes_since(generation) == {(1, 1)}
+
+        generation = gridworld.item_generation
+        gridworld.remove_item((1, 1))
+        assert gridworld.item_changes_since(generation) == {(1, 1)}
+
+    def test_maturity_changes_are_scheduled(self, gridworld):
+        gridworld.spawn_item(position=(1, 1))
+        item = gridworld.item_locations[(1, 1)]
+        generation = gridworld.item_generation
+
+        # maturation_speed 0.01 first rounds up to 0.1 after ~5.1 seconds
+        gridworld.update_item_maturity(now=item.creation_timestamp + 5)
+        assert gridworld.item_generation == generation
+        gridworld.update_item_maturity(now=item.creation_timestamp + 6)
+        assert gridworld.item_changes_since(generation) == {(1, 1)}
+
+    def test_removed_items_are_not_rescheduled(self, gridworld):
+        gridworld.spawn_item(position=(1, 1))
+        item = gridworld.remove_item((1, 1))
+        generation = gridworld.item_generation
+
+        gridworld.update_item_maturity(now=item.creation_timestamp + 1000)
+        assert gridworld.item_generation == generation
+
+    def test_replacing_locations_forgets_changes(self, gridworld):
+        generation = gridworld.item_generation
+        gridworld.item_locations = {}
+
+        assert gridworld.items_changed_since(generation)
+        assert gridworld.item_changes_since(generation) is None
+
+
+@pytest.mark.usefixtures("env")
+class TestGridLayers(object):
+    def test_layers_follow_items(self, gridworld):
+        gridworld.spawn_item(position=(1, 2), item_id=1)
+        layers = gridworld.layers
+        assert layers.item_ids[layers.item_type[1, 2]] == 1
+        assert layers.items[layers.item_index[1, 2]] is gridworld.item_locations[(1, 2)]
+        assert gridworld.item_counts() == {1: 1}
+
+        gridworld.remove_item((1, 2))
+        assert layers.item_type[1, 2] == 0
+        assert layers.item_index[1, 2] == -1
+        assert gridworld.item_counts() == {}
+
+    def test_item_slots_are_reused(self, gridworld):
+        gridworld.spawn_item(position=(1, 1), item_id=1)
+        gridworld.remove_item((1, 1))
+        gridworld.spawn_item(position=(2, 2), item_id=1)
+        assert len(gridworld.layers.items) == 1
+
+    def test_layers_follow_walls(self, gridworld):
+        from dlgr.griduniverse.maze import Wall
+
+        gridworld.wall_locations = {(0, 1): Wall(position=[0, 1])}
+        gridworld.add_wall(Wall(position=[3, 3]))
+        assert gridworld.layers.walls.sum() == 2
+        assert gridworld.layers.walls[0, 1] and gridworld.layers.walls[3, 3]
+
+    def test_empty_mask(self, gridworld):
+        from dlgr.griduniverse.maze import Wall
+
+        gridworld.add_wall(Wall(position=[0, 0]))
+        gridworld.spawn_item(position=(0, 1), item_id=1)
+        gridworld.spawn_player(1).position = [0, 2]
+        mask = gridworld.empty_mask()
+        assert not mask[0, :3].any()
+        assert mask.sum() == gridworld.rows * gridworld.columns - 3
+
+    def test_vacant_layer_follows_walls_and_items(self, gridworld):
+        from dlgr.griduniverse.maze import Wall
+
+        layers = gridworld.layers
+        gridworld.add_wall(Wall(position=[0, 0]))
+        gridworld.spawn_item(position=(0, 1), item_id=1)
+        assert not layers.vacant[0, 0] and not layers.vacant[0, 1]
+        gridworld.remove_item((0, 1))
+        assert layers.vacant[0, 1]
+        gridworld.wall_locations = {}
+        assert layers.vacant.all()
+
+    def test_vacant_layer_follows_restored_state(self, gridworld):
+        def occupied_cells():
+            rows, columns = numpy.nonzero(~gridworld.layers.vacant)
+            return set(zip(rows.tolist(), columns.tolist()))
+
+        gridworld.walls_density = 0.5
+        gridworld.build_labyrinth()
+        gridworld.replenish_items()
+        state = gridworld.serialize()
+        occupied = set(gridworld.wall_locations) | set(gridworld.item_locations)
+
+        gridworld.wall_locations = {}
+        gridworld.item_locations = {}
+        gridworld.deserialize(state)
+        assert occupied_cells() == occupied
+
+        gridworld.wall_locations = {}
+        gridworld.item_locations = {}
+        gridworld.apply_state(state)
+        assert occupied_cells() == occupied
+
+    def test_player_layer_and_neighborhood(self, gridworld):
+        gridworld.spawn_player(1).position = [5, 5]
+        gridworld.spawn_player(2).position = [6, 6]
+        layer = gridworld.player_layer()
+        assert layer.sum() == 2
+        assert gridworld.layers.neighborhood(layer, (5, 5), d=1).sum() == 2
+        assert gridworld.layers.neighborhood(layer, (0, 0), d=1).shape == (2, 2)
+
+
+@pytest.mark.usefixtures("env")
+class TestPlayerIndex(object):
+    def test_has_player_at_spawn_position(self, gridworld):
+        player = gridworld.spawn_player(1)
+
+        assert gridworld.has_player(player.position)
+        assert gridworld.has_player(tuple(player.position))
+
+    def test_index_follows_player_moves(self, gridworld):
+        player = gridworld.spawn_player(1)
+        player.position = [3, 3]
+
+        assert gridworld.players_at([3, 3]) == [player]
+        player.position = [3, 4]
+
+        assert not gridworld.has_player([3, 3])
+        assert gridworld.players_at([3, 4]) == [player]
+
+    def test_removed_players_are_not_found(self, gridworld):
+        player = gridworld.spawn_player(1)
+        player.position = [3, 3]
+
+        gridworld.players.clear()
+
+        assert not gridworld.has_player([3, 3])
+
+    def test_players_near_uses_manhattan_distance(self, gridworld):
+        center = gridworld.spawn_player(1)
+        near = gridworld.spawn_player(2)
+        diagonal = gridworld.spawn_player(3)
+        far = gridworld.spawn_player(4)
+        center.position = [10, 10]
+        near.position = [10, 12]
+        diagonal.position = [11, 11]
+        far.position = [20, 20]
+
+        assert set(gridworld.players_near([10, 10], d=1)) == {center}
+        assert set(gridworld.players_near([10, 10], d=2)) == {center, near, diagonal}
+        assert set(gridworld.players_near([10, 10], d=20)) == {
+            center,
+            near,
+            diagonal,
+            far,
+        }
+
+    def test_deserialize_rebuilds_index(self, gridworld):
+        gridworld.spawn_player(1).position = [2, 2]
+        saved = gridworld.serialize()
+        saved["players"][0]["position"] = [4, 4]
+
+        gridworld.deserialize(saved)
+
+        assert not gridworld.has_player([2, 2])
+        assert gridworld.has_player([4, 4])
+
+
 @pytest.mark.usefixtures("env")
 class TestSerialize(object):
     def test_serializes_players(self, gridworld):
@@ -99,6 +362,52 @@ class TestDeserialize(object):
 
         assert saved == refetched
 
+    def test_apply_state_matches_deserialize(self, gridworld):
+        gridworld.walls_density = 0.0001
+        gridworld.build_labyrinth()
+        gridworld.replenish_items()
+        gridworld.spawn_player(1)
+        gridworld.spawn_player(2)
+        saved = gridworld.serialize()
+
+        gridworld.wall_locations = {}
+        gridworld.item_locations = {}
+        gridworld.players = {}
+        gridworld.round = None
+
+        gridworld.apply_state(saved)
+
+        assert gridworld.serialize() == saved
+
+    def test_apply_state_updates_in_place(self, gridworld):
+        player = gridworld.spawn_player(1)
+        gridworld.spawn_player(2).position = [8, 8]
+        gridworld.spawn_item(position=(1, 1))
+        gridworld.spawn_item(position=(2, 2))
+        item = gridworld.item_locations[(1, 1)]
+        state = gridworld.serialize()
+        state["players"] = [p for p in state["players"] if p["id"] == 1]
+        state["players"][0].update(position=[5, 5], score=7)
+        state["items"] = [i for i in state["items"] if i["position"] == [1, 1]]
+
+        gridworld.apply_state(state)
+
+        assert gridworld.players == {1: player}
+        assert player.position == [5, 5] and player.score == 7
+        assert gridworld.has_player([5, 5])
+        assert not gridworld.has_player([8, 8])
+        assert gridworld.item_locations == {(1, 1): item}
+        assert gridworld.item_locations[(1, 1)] is item
+        assert gridworld.layers.item_index[2, 2] == -1
+
+    def test_apply_state_without_walls_keeps_walls(self, gridworld):
+        from dlgr.griduniverse.maze import Wall
+
+        gridworld.add_wall(Wall(position=[3, 3]))
+        state = gridworld.serialize(include_walls=False)
+        gridworld.apply_state(state)
+        assert list(gridworld.wall_locations) == [(3, 3)]
+
 
 @pytest.mark.usefixtures("env")
 class TestRoundState(object):
@@ -159,6 +468,34 @@ class TestInstructions(object):
         assert "🫐 Gooseberry (3 points)" in html
 
 
+@pytest.mark.usefixtures("env", "fresh_gridworld")
+class TestGridworldRegistry(object):
+    def test_gridworlds_are_independent(self, gridworld, item_config):
+        from dlgr.griduniverse.experiment import Gridworld
+
+        other = Gridworld(item_config=item_config)
+        other.spawn_item(position=(0, 0))
+        assert other is not gridworld
+        assert gridworld.item_locations.get((0, 0)) is None
+
+    def test_get_or_create_shares_gridworld_by_name(self):
+        from dlgr.griduniverse.experiment import gridworlds
+
+        first = gridworlds.get_or_create("first", rows=10)
+        assert gridworlds.get_or_create("first", rows=20) is first
+        assert first.rows == 10
+        assert gridworlds.get_or_create("second") is not first
+        assert len(gridworlds) == 2
+
+    def test_remove(self):
+        from dlgr.griduniverse.experiment import gridworlds
+
+        gridworlds.get_or_create("game")
+        gridworlds.remove("game")
+        gridworlds.remove("game")
+        assert "game" not in gridworlds
+
+
 class TestMatrix2SerializedGridworld(object):
     """Tests for converting a list of lists extracted from matrix
     representation of initial grid state into the format used in
@@ -0,0 +1,55 @@
+from dlgr.griduniverse.inputs import MoveQueue
+
+
+def move(player_id, direction="up"):
+    return {"type": "move", "player_id": player_id, "move": direction}
+
+
+class TestMoveQueue(object):
+    def test_drain_empties_queue(self):
+        queue = MoveQueue()
+        queue.add(move(1))
+        assert len(queue) == 1
+        assert queue.drain() == [move(1)]
+        assert len(queue) == 0
+        assert queue.drain() == []
+
+    def test_order_does_not_depend_on_arrival(self):
+        first, second = MoveQueue(), MoveQueue()
+        for player_id in (3, 1, 2):
+            first.add(move(player_id))
+        for player_id in (2, 3, 1):
+            second.add(move(player_id))
+        assert first.drain() == second.drain()
+
+    def test_players_take_turns(self):
+        queue = MoveQueue()
+        queue.add(move(1, "up"))
+        queue.add(move(1, "down"))
+        queue.add(move(1, "left"))
+        queue.add(move(2, "right"))
+        assert queue.drain() == [
+            move(1, "up"),
+            move(2, "right"),
+            move(1, "down"),
+            move(1, "left"),
+        ]
+
+    def test_first_player_rotates_each_tick(self):
+        queue = MoveQueue()
+        firsts = []
+        for _ in range(3):
+            for player_id in (1, 2, 3):
+                queue.add(move(player_id))
+            firsts.append(queue.drain()[0]["player_id"])
+        assert firsts == [1, 2, 3]
+
+    def test_stats(self):
+        queue = MoveQueue()
+        queue.add(move(1))
+        queue.add(move(2))
+        queue.drain()
+        queue.drain()
+        queue.add(move(1))
+        queue.drain()
+        assert queue.stats == {"moves": 3, "batches": 2, "max_batch": 2}
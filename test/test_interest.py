@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from dlgr.griduniverse.broadcast import apply_state
+from dlgr.griduniverse.interest import IndexedState, PlayerView, visible_region
+from dlgr.griduniverse.maze import Wall
+from dlgr.griduniverse.simulation import build_grid
+
+
+@pytest.fixture
+def grid(fresh_gridworld):
+    grid = build_grid(
+        rows=100,
+        columns=100,
+        window_rows=11,
+        window_columns=11,
+        visibility=40,
+        num_players=3,
+        walls_density=0,
+    )
+    for player_id in (1, 2, 3):
+        grid.spawn_player(id=player_id)
+    return grid
+
+
+def place(grid, player_id, position):
+    grid.players[player_id].position = list(position)
+
+
+def update(view, grid):
+    indexed = IndexedState()
+    indexed.update(grid)
+    return view.update(grid, indexed)
+
+
+def visible_players(payload):
+    return sorted(player["id"] for player in payload["players"])
+
+
+class TestVisibleRegion(object):
+    def test_window_around_player(self, grid):
+        assert visible_region(grid, (50, 50)) == (45, 45, 56, 56)
+
+    def test_window_is_clamped_to_grid(self, grid):
+        assert visible_region(grid, (0, 99)) == (0, 89, 11, 100)
+
+    def test_margin_extends_window(self, grid):
+        assert visible_region(grid, (50, 50), margin=2) == (43, 43, 58, 58)
+
+    def test_visibility_limits_window(self, grid):
+        grid.visibility = 1
+        assert visible_region(grid, (50, 50)) == (47, 47, 54, 54)
+
+
+class TestPlayerView(object):
+    @pytest.fixture
+    def view(self):
+        return PlayerView(1, "griduniverse_player_1", margin=2)
+
+    def test_sees_only_nearby_players(self, view, grid):
+        place(grid, 1, (50, 50))
+        place(grid, 2, (52, 52))
+        place(grid, 3, (90, 90))
+        assert visible_players(update(view, grid)) == [1, 2]
+
+    def test_always_sees_itself(self, view, grid):
+        grid.visibility = 0
+        place(grid, 1, (50, 50))
+        assert visible_players(update(view, grid)) == [1]
+
+    def test_players_near_edge_do_not_flap(self, view, grid):
+        place(grid, 1, (50, 50))
+        place(grid, 3, (90, 90))
+        # The window ends at 55, and players come into view within 2 cells
+        place(grid, 2, (50, 58))
+        state = apply_state(None, update(view, grid))
+        assert visible_players(state) == [1]
+        place(grid, 2, (50, 57))
+        state = apply_state(state, update(view, grid))
+        assert visible_players(state) == [1, 2]
+        # Players leave view beyond 4 cells
+        place(grid, 2, (50, 59))
+        state = apply_state(state, update(view, grid))
+        assert visible_players(state) == [1, 2]
+        place(grid, 2, (50, 60))
+        state = apply_state(state, update(view, grid))
+        assert visible_players(state) == [1]
+
+    def test_sees_only_nearby_items(self, view, grid):
+        place(grid, 1, (50, 50))
+        grid.spawn_item(position=(51, 51))
+        grid.spawn_item(position=(80, 80))
+        payload = update(view, grid)
+        assert [item["position"] for item in payload["items"]] == [[51, 51]]
+
+    def test_items_leaving_view_are_removed(self, view, grid):
+        place(grid, 1, (50, 50))
+        grid.spawn_item(position=(51, 51))
+        update(view, grid)
+        place(grid, 1, (80, 80))
+        assert update(view, grid)["items_removed"] == [[51, 51]]
+
+    def test_walls_stay_in_view_until_keyframe(self, view, grid):
+        place(grid, 1, (50, 50))
+        grid.add_wall(Wall(position=[51, 51]))
+        grid.add_wall(Wall(position=[80, 80]))
+        assert update(view, grid)["walls"] == [[51, 51]]
+        place(grid, 1, (80, 81))
+        assert update(view, grid)["walls_added"] == [[80, 80]]
+        view.state_tracker.request_keyframe()
+        assert update(view, grid)["walls"] == [[80, 80]]
+
+    def test_sends_nothing_for_player_not_on_grid(self, grid):
+        view = PlayerView(4, "griduniverse_player_4")
+        assert update(view, grid) is None
+
+    def test_spectators_see_everything(self, grid):
+        view = PlayerView(None, "griduniverse_spectators")
+        place(grid, 1, (0, 0))
+        place(grid, 2, (99, 99))
+        grid.spawn_item(position=(50, 50))
+        payload = update(view, grid)
+        assert visible_players(payload) == [1, 2, 3]
+        assert len(payload["items"]) == 1
+
+    def test_cuts_payload_on_large_grid(self, fresh_gridworld):
+        grid = build_grid(
+            rows=200, columns=200, num_players=50, walls_density=0, num_food=400
+        )
+        for player_id in range(50):
+            grid.spawn_player(id=player_id)
+        for _ in range(400):
+            grid.spawn_item()
+        indexed = IndexedState()
+        indexed.update(grid)
+        full = PlayerView(None, "spectators").update(grid, indexed)
+        own = PlayerView(0, "player_0").update(grid, indexed)
+        assert len(json.dumps(own)) * 10 < len(json.dumps(full))
+
+
+class TestIndexedState(object):
+    def test_reserializes_changed_items_only(self, grid):
+        indexed = IndexedState()
+        grid.spawn_item(position=(1, 1))
+        indexed.update(grid)
+        first = indexed.items[(1, 1)]
+        grid.spawn_item(position=(2, 2))
+        indexed.update(grid)
+        assert indexed.items[(1, 1)] is first
+        assert set(indexed.items) == {(1, 1), (2, 2)}
+        grid.remove_item((1, 1))
+        indexed.update(grid)
+        assert set(indexed.items) == {(2, 2)}
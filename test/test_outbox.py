@@ -0,0 +1,81 @@
+import json
+
+import mock
+import pytest
+
+from dlgr.griduniverse.outbox import Outbox
+
+
+@pytest.fixture
+def redis_conn():
+    return mock.Mock()
+
+
+@pytest.fixture
+def outbox(redis_conn):
+    outbox = Outbox(redis_conn)
+    outbox.start()
+    return outbox
+
+
+def published(redis_conn):
+    pipeline = redis_conn.pipeline.return_value
+    return [call.args for call in pipeline.publish.call_args_list]
+
+
+class TestOutbox(object):
+    def test_publishes_immediately_unless_running(self, redis_conn):
+        outbox = Outbox(redis_conn)
+        outbox.publish("griduniverse", '{"type":"stop"}')
+        redis_conn.publish.assert_called_once_with("griduniverse", '{"type":"stop"}')
+        assert outbox.queue_depth == 0
+
+    def test_queues_while_running(self, outbox, redis_conn):
+        outbox.publish("griduniverse", '{"type":"stop"}')
+        assert outbox.queue_depth == 1
+        redis_conn.publish.assert_not_called()
+        assert outbox.flush() == 1
+        redis_conn.publish.assert_called_once_with("griduniverse", '{"type":"stop"}')
+
+    def test_batches_messages_for_each_channel(self, outbox, redis_conn):
+        outbox.publish("griduniverse", '{"type":"state","count":1}')
+        outbox.publish("griduniverse_player_1", '{"type":"move_rejection"}')
+        outbox.publish("griduniverse", '{"type":"new_round","round":2}')
+
+        assert outbox.flush() == 3
+
+        redis_conn.pipeline.return_value.execute.assert_called_once()
+        (room, batch), player = published(redis_conn)
+        assert room == "griduniverse"
+        assert json.loads(batch) == {
+            "type": "batch",
+            "messages": [
+                {"type": "state", "count": 1},
+                {"type": "new_round", "round": 2},
+            ],
+        }
+        assert player == ("griduniverse_player_1", '{"type":"move_rejection"}')
+        assert outbox.stats["publishes"] == 2
+        assert outbox.stats["batches"] == 1
+
+    def test_flushes_full_queue(self, outbox, redis_conn):
+        outbox.max_queue_size = 2
+        outbox.publish("griduniverse", "{}")
+        outbox.publish("griduniverse", "{}")
+        assert outbox.queue_depth == 0
+        assert outbox.stats["backpressure_flushes"] == 1
+        assert outbox.stats["max_queue_depth"] == 2
+
+    def test_stop_publishes_queued_messages(self, outbox, redis_conn):
+        outbox.publish("griduniverse", "{}")
+        outbox.stop()
+        assert not outbox.running
+        redis_conn.publish.assert_called_once_with("griduniverse", "{}")
+
+    def test_counts_messages_it_fails_to_publish(self, outbox, redis_conn):
+        redis_conn.pipeline.return_value.execute.side_effect = ConnectionError
+        outbox.publish("griduniverse", "{}")
+        outbox.publish("griduniverse", "{}")
+        assert outbox.flush() == 0
+        assert outbox.stats["messages_dropped"] == 2
+        assert outbox.queue_depth == 0
@@ -1,3 +1,4 @@
+import mock
 import pytest
 
 from dlgr.griduniverse.experiment import Player
@@ -19,6 +20,18 @@ class TestInstantiation(object):
         assert hasattr(player, "name")
         assert player.gender in ("F", "M")
 
+    def test_named_player_has_no_profile_until_used(self):
+        from dlgr.griduniverse import pseudonyms
+
+        with mock.patch.object(pseudonyms.pseudonyms, "profile") as profile:
+            player = Player(name="Jane Doe")
+            assert player.name == "Jane Doe"
+            profile.assert_not_called()
+
+    def test_players_get_distinct_profiles(self):
+        players = [Player() for _ in range(3)]
+        assert len({id(player.profile) for player in players}) == 3
+
     def test_can_assign_color_by_name(self):
         player = Player(color_name="BLUE")
         assert player.color == "BLUE"
@@ -47,6 +60,16 @@ class TestIsAwareOfOtherPlayersOnGrid(object):
 
         assert player2 in player1.neighbors()
 
+    def test_neighbors_respects_distance(self, gridworld):
+        player1 = gridworld.spawn_player("1")
+        player2 = gridworld.spawn_player("2")
+
+        player1.position = [0, 0]
+        player2.position = [0, 3]
+
+        assert player1.neighbors() == []
+        assert player1.neighbors(d=3) == [player2]
+
 
 class TestMovement(object):
     """Note: writing these tests deepened my suspicion that movement should
@@ -135,3 +158,20 @@ class TestMovement(object):
     def test_tremble_sends_player_in_another_direction(self):
         player = Player()
         assert player.tremble("up") in ("down", "left", "right")
+
+
+class TestPseudonymService(object):
+    def test_reuses_faker_per_locale(self):
+        from dlgr.griduniverse.pseudonyms import PseudonymService
+
+        service = PseudonymService(pool_size=2)
+        assert service.faker("en_US") is service.faker("en_US")
+
+    def test_profiles_come_from_pool(self):
+        from dlgr.griduniverse.pseudonyms import PseudonymService
+
+        service = PseudonymService(pool_size=2)
+        with mock.patch.object(service, "faker", wraps=service.faker) as faker:
+            profiles = [service.profile("en_US", "F") for _ in range(3)]
+        assert faker.call_count == 2
+        assert all(profile["sex"] == "F" for profile in profiles)
@@ -0,0 +1,117 @@
+import datetime
+import json
+
+import mock
+import pytest
+
+from dlgr.griduniverse.replay_index import ReplayIndex
+
+START = datetime.datetime(2024, 1, 1)
+
+
+def item(id, position):
+    return {
+        "id": id,
+        "item_id": "stone",
+        "position": position,
+        "maturity": 1.0,
+        "creation_timestamp": 0.0,
+        "remaining_uses": 1,
+    }
+
+
+def grid_state(round=0, items=(), **kwargs):
+    state = {
+        "players": [],
+        "round": round,
+        "rows": 25,
+        "columns": 25,
+        "items": list(items),
+        "walls": [],
+    }
+    state.update(kwargs)
+    return state
+
+
+@pytest.mark.usefixtures("env")
+class TestReplayIndex(object):
+    @pytest.fixture
+    def record_states(self, exp):
+        def record_states(history):
+            for seconds, details in history:
+                state = exp.environment.update(json.dumps(details), details=details)
+                state.creation_time = START + datetime.timedelta(seconds=seconds)
+                exp.socket_session.add(state)
+            exp.socket_session.commit()
+            return exp.socket_session
+
+        return record_states
+
+    @pytest.fixture
+    def index(self, record_states, tmp_path):
+        session = record_states(
+            [
+                (0, grid_state(items=[item(1, [1, 1])])),
+                (4, {"players": [], "round": 0, "items_changed": [item(2, [2, 2])]}),
+                (12, {"players": [], "round": 1, "items_removed": [[1, 1]]}),
+                (15, {"players": [], "round": 1}),
+            ]
+        )
+        return ReplayIndex.build(
+            session, str(tmp_path / "test.index"), keyframe_interval=10
+        )
+
+    def test_keyframes_at_interval(self, index):
+        assert index.times == [START, START + datetime.timedelta(seconds=12)]
+
+    def test_keyframes_hold_complete_state(self, index):
+        time, state = index.keyframe_before(START + datetime.timedelta(seconds=13))
+        assert time == START + datetime.timedelta(seconds=12)
+        assert state["round"] == 1
+        assert state["items"] == [item(2, [2, 2])]
+        assert "keyframe" not in state
+
+    def test_no_keyframe_before_start(self, index):
+        assert index.keyframe_before(START - datetime.timedelta(seconds=1)) is None
+
+    def test_load_reuses_file(self, index):
+        with mock.patch.object(ReplayIndex, "build") as build:
+            loaded = ReplayIndex.load_or_build(None, index.path, keyframe_interval=10)
+        build.assert_not_called()
+        assert loaded.times == index.times
+        assert loaded.offsets == index.offsets
+
+    def test_indexes_states_of_one_environment(self, exp, record_states, tmp_path):
+        from dallinger.nodes import Environment
+
+        session = record_states([(0, grid_state(round=1))])
+        environment = exp.environment
+        other = Environment(network=environment.network)
+        details = grid_state(round=2)
+        state = other.update(json.dumps(details), details=details)
+        state.creation_time = START + datetime.timedelta(seconds=20)
+        session.add(state)
+        session.commit()
+
+        index = ReplayIndex.build(
+            session,
+            str(tmp_path / "test.index"),
+            keyframe_interval=10,
+            origin_id=environment.id,
+        )
+
+        assert index.times == [START]
+        _, state = index.keyframe_before(START + datetime.timedelta(seconds=30))
+        assert state["round"] == 1
+
+    def test_revert_loads_keyframe(self, exp, index):
+        exp.__dict__["replay_index"] = index
+        exp._replay_time_index = START + datetime.timedelta(seconds=14)
+        replay_range = mock.PropertyMock(return_value=(START, START))
+
+        with mock.patch.object(type(exp), "usable_replay_range", replay_range):
+            exp.revert_to_time(target=START + datetime.timedelta(seconds=13))
+
+        assert exp._replay_time_index == START + datetime.timedelta(seconds=12)
+        assert exp.grid.round == 1
+        assert list(exp.grid.item_locations) == [(2, 2)]
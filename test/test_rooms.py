@@ -0,0 +1,326 @@
+import datetime
+import json
+
+import mock
+import pytest
+from dallinger.models import Node
+
+from dlgr.griduniverse.experiment import gridworlds
+from dlgr.griduniverse.rooms import LOBBY_CHANNEL, Room
+
+
+class TestRoom(object):
+    def test_name_is_channel(self):
+        room = Room("griduniverse_3", grid=None, network_id=3)
+        assert room.channel == "griduniverse_3"
+
+    def test_name_cannot_contain_channel_separator(self):
+        with pytest.raises(ValueError):
+            Room("griduniverse:3", grid=None)
+
+
+@pytest.fixture
+def rooms_exp(db_session, active_config, fresh_gridworld):
+    from dallinger.experiments import Griduniverse
+
+    active_config.extend({"num_rooms": 2, "max_participants": 2}, strict=True)
+    gu = Griduniverse(db_session)
+    gu.app_id = "test app"
+    gu.exp_config = active_config
+    gu.publish = mock.Mock()
+
+    yield gu
+    gu.socket_session.rollback()
+    gu.socket_session.close()
+
+
+def connect(exp, participants):
+    for participant in participants:
+        exp.handle_connect({"player_id": participant.id})
+    return [exp.room_for(participant.id) for participant in participants]
+
+
+@pytest.mark.usefixtures("env")
+class TestRooms(object):
+    def test_single_room_uses_lobby_channel(self, exp):
+        assert list(exp.rooms) == [LOBBY_CHANNEL]
+        assert exp.first_room.grid is exp.grid
+
+    def test_a_room_per_network(self, rooms_exp):
+        networks = sorted(rooms_exp.networks(), key=lambda network: network.id)
+        assert [room.network_id for room in rooms_exp.rooms.values()] == [
+            network.id for network in networks
+        ]
+        grids = [room.grid for room in rooms_exp.rooms.values()]
+        assert grids[0] is not grids[1]
+        assert all(":" not in name for name in rooms_exp.rooms)
+
+    def test_recruits_for_every_room(self, rooms_exp):
+        assert rooms_exp.initial_recruitment_size == 4
+
+    def test_connect_routes_players_to_rooms(self, rooms_exp, participants):
+        rooms = connect(rooms_exp, participants[:4])
+        assert len(set(rooms)) == 2
+        for participant, room in zip(participants, rooms):
+            assert participant.id in room.grid.players
+            node = rooms_exp.session.query(Node).get(
+                rooms_exp.node_by_player_id[participant.id]
+            )
+            assert room.network_id == node.network_id
+
+    def test_connect_tells_client_its_channels(self, rooms_exp, participants):
+        (room,) = connect(rooms_exp, participants[:1])
+        player_id = participants[0].id
+        assert [call.args for call in rooms_exp.publish.call_args_list] == [
+            (
+                {
+                    "type": "player_channel",
+                    "player_id": player_id,
+                    "room": room.name,
+                    "channel": "{}_player_{}".format(room.channel, player_id),
+                },
+            ),
+            (
+                {
+                    "type": "room",
+                    "player_id": player_id,
+                    "room": room.name,
+                    "channel": room.channel,
+                },
+            ),
+        ]
+
+    def test_errors_are_sent_to_player_only(self, rooms_exp, participants):
+        (room,) = connect(rooms_exp, participants[:1])
+        rooms_exp.publish.reset_mock()
+        player_id = participants[0].id
+        rooms_exp.handle_item_consume({"player_id": player_id})
+        ((message,), kwargs) = rooms_exp.publish.call_args
+        assert message["type"] == "consume_error"
+        assert kwargs == {"channel": room.player_channel(player_id)}
+
+    def test_reconnect_keeps_room(self, rooms_exp, participants):
+        (room,) = connect(rooms_exp, participants[:1])
+        (again,) = connect(rooms_exp, participants[:1])
+        assert again is room
+        assert len(rooms_exp.node_by_player_id) == 1
+
+    def test_messages_are_handled_in_players_room(self, rooms_exp, participants):
+        rooms = connect(rooms_exp, participants[:3])
+        # Two of the three participants share a room
+        first, first_room = participants[0], rooms[0]
+        second, second_room = next(
+            (participant, room)
+            for participant, room in zip(participants[1:3], rooms[1:])
+            if room is not first_room
+        )
+        rooms_exp.publish.reset_mock()
+
+        rooms_exp.handle_chat_message(
+            {"player_id": second.id, "contents": "hi", "server_time": 1.0}
+        )
+        ((message, room), _) = rooms_exp.publish.call_args
+        assert room is second_room
+        assert second_room.grid.chat_message_history
+        assert not first_room.grid.chat_message_history
+        assert first.id not in second_room.grid.players
+
+    def test_state_resync_requests_keyframe_in_players_room(
+        self, rooms_exp, participants
+    ):
+        (first,) = connect(rooms_exp, participants[:1])
+        second = next(room for room in rooms_exp.rooms.values() if room is not first)
+        for room in rooms_exp.rooms.values():
+            room.state_tracker.update(room.grid.serialize())
+        rooms_exp.handle_state_resync(
+            {"type": "state_resync", "player_id": participants[0].id}
+        )
+        assert first.state_tracker.keyframe_due
+        assert not second.state_tracker.keyframe_due
+
+    def test_state_is_sent_to_each_room(self, rooms_exp):
+        for room in rooms_exp.rooms.values():
+            rooms_exp.send_state(room)
+        calls = rooms_exp.publish.call_args_list
+        assert [call.args[1] for call in calls] == list(rooms_exp.rooms.values())
+        assert all(json.loads(call.args[0])["grid"]["keyframe"] for call in calls)
+
+    def test_game_loop_ticks_started_rooms(self, rooms_exp, participants, fake_gsleep):
+        first, second = rooms_exp.rooms.values()
+        rooms_exp.socket_session = mock.Mock()
+        rooms_exp.event_recorder = mock.Mock()
+        first.grid.start_timestamp = 0
+        first.grid.time_per_round = 0
+        second.grid.round = second.grid.num_rounds
+
+        rooms_exp.game_loop()
+
+        assert first.grid.game_over
+        # The first room's first tick, and the final keyframe of each room
+        assert first.snapshot_policy.stats["keyframes"] == 2
+        assert second.snapshot_policy.stats["keyframes"] == 1
+        stops = [
+            call.args[1]
+            for call in rooms_exp.publish.call_args_list
+            if call.args[0] == {"type": "stop"}
+        ]
+        assert set(stops) == {first, second}
+
+
+@pytest.mark.usefixtures("env")
+class TestReplayRoom(object):
+    @pytest.fixture
+    def replay_exp(self, rooms_exp):
+        rooms_exp.import_session = rooms_exp.session
+        for room in rooms_exp.rooms.values():
+            rooms_exp.record_snapshot(room, 0.0, force=True)
+        return rooms_exp
+
+    def test_first_room_is_replayed(self, replay_exp):
+        first = replay_exp.first_room
+        replay_exp.replay_start()
+        room = replay_exp.replay_room
+        assert list(replay_exp.rooms.values()) == [room]
+        assert room.name == first.name
+        assert room.environment.network_id == first.network_id
+
+    def test_replay_grid_replaces_rooms_grid(self, replay_exp):
+        first = replay_exp.first_room
+        replay_exp.replay_start()
+        assert replay_exp.grid is not first.grid
+        assert replay_exp.grid is gridworlds[first.name]
+        assert replay_exp.replay_room.grid is replay_exp.grid
+
+    def test_replays_room_by_name(self, replay_exp, active_config):
+        second = list(replay_exp.rooms.values())[1]
+        active_config.extend({"replay_room": second.name}, strict=True)
+        replay_exp.replay_start()
+        assert replay_exp.replay_room.network_id == second.network_id
+
+    def test_unknown_room_cannot_be_replayed(self, replay_exp, active_config):
+        active_config.extend({"replay_room": "nowhere"}, strict=True)
+        with pytest.raises(ValueError):
+            replay_exp.replay_start()
+
+    def test_only_replays_states_of_one_room(self, replay_exp):
+        replay_exp.replay_start()
+        events = replay_exp.events_for_replay().all()
+        assert [event.type for event in events] == ["state"]
+        assert events[0].origin_id == replay_exp.replay_room.environment.id
+
+    def test_replays_events(self, replay_exp, participants):
+        (room,) = connect(replay_exp, participants[:1])
+        state = room.grid.serialize()
+        player_id = participants[0].id
+        replay_exp.replay_start()
+
+        for type, details in [
+            ("state", state),
+            ("event", {"type": "connect", "player_id": player_id}),
+            ("event", {"type": "move", "player_id": player_id, "move": "up"}),
+            (
+                "event",
+                {"type": "chat", "player_id": player_id, "contents": "Hello"},
+            ),
+        ]:
+            replay_exp.replay_event(
+                mock.Mock(
+                    type=type, details=details, creation_time=datetime.datetime.now()
+                )
+            )
+
+        grid = replay_exp.grid
+        assert list(grid.players) == [player_id]
+        assert [contents for _, _, contents in grid.chat_message_history] == ["Hello"]
+
+
+@pytest.fixture
+def interest_exp(db_session, active_config, fresh_gridworld):
+    from dallinger.experiments import Griduniverse
+
+    active_config.extend(
+        {"interest_management": True, "interest_margin": 1}, strict=True
+    )
+    gu = Griduniverse(db_session)
+    gu.app_id = "test app"
+    gu.exp_config = active_config
+    gu.publish = mock.Mock()
+
+    yield gu
+    gu.socket_session.rollback()
+    gu.socket_session.close()
+
+
+@pytest.mark.usefixtures("env")
+class TestInterestManagement(object):
+    def test_rooms_broadcast_everything_by_default(self, exp):
+        assert not exp.first_room.manages_interest
+
+    def test_players_view_is_sent_on_their_channel(self, interest_exp, a):
+        participant = a.participant()
+        interest_exp.handle_connect({"player_id": participant.id})
+        view = interest_exp.first_room.views[participant.id]
+        assert view.margin == 1
+        assert view.channel == "griduniverse_player_{}".format(participant.id)
+        assert view.state_tracker.keyframe_due
+
+    def test_spectators_are_told_in_room(self, interest_exp):
+        interest_exp.handle_connect({"player_id": "spectator"})
+        ((message, room), _) = interest_exp.publish.call_args
+        assert message["channel"] == "griduniverse_spectators"
+        assert room is interest_exp.first_room
+
+    def test_state_is_sent_on_each_players_channel(self, interest_exp, participants):
+        for participant in participants[:2]:
+            interest_exp.handle_connect({"player_id": participant.id})
+        interest_exp.publish.reset_mock()
+        grid = interest_exp.grid
+        grid.window_rows = grid.window_columns = 3
+        grid.players[participants[0].id].position = [0, 0]
+        grid.players[participants[1].id].position = [grid.rows - 1, grid.columns - 1]
+
+        interest_exp.send_state(interest_exp.first_room)
+
+        calls = interest_exp.publish.call_args_list
+        assert [call.kwargs["channel"] for call in calls] == [
+            "griduniverse_player_{}".format(participant.id)
+            for participant in participants[:2]
+        ]
+        for call, participant in zip(calls, participants):
+            players = json.loads(call.args[0])["grid"]["players"]
+            assert [player["id"] for player in players] == [participant.id]
+
+    def test_state_resync_requests_keyframe_in_players_view(
+        self, interest_exp, participants
+    ):
+        for participant in participants[:2]:
+            interest_exp.handle_connect({"player_id": participant.id})
+        interest_exp.send_state(interest_exp.first_room)
+        interest_exp.handle_state_resync(
+            {"type": "state_resync", "player_id": participants[0].id}
+        )
+        views = interest_exp.first_room.views
+        assert views[participants[0].id].state_tracker.keyframe_due
+        assert not views[participants[1].id].state_tracker.keyframe_due
+
+    def test_disconnect_removes_players_view(self, interest_exp, participants):
+        for participant in participants[:2]:
+            interest_exp.handle_connect({"player_id": participant.id})
+        interest_exp.handle_disconnect(
+            {"type": "disconnect", "player_id": participants[0].id}
+        )
+        assert list(interest_exp.first_room.views) == [participants[1].id]
+
+        interest_exp.publish.reset_mock()
+        interest_exp.send_state(interest_exp.first_room)
+        assert [
+            call.kwargs["channel"] for call in interest_exp.publish.call_args_list
+        ] == ["griduniverse_player_{}".format(participants[1].id)]
+
+    def test_reconnect_restores_players_view(self, interest_exp, participants):
+        player_id = participants[0].id
+        interest_exp.handle_connect({"player_id": player_id})
+        interest_exp.handle_disconnect({"type": "disconnect", "player_id": player_id})
+        interest_exp.handle_connect({"player_id": player_id})
+        view = interest_exp.first_room.views[player_id]
+        assert view.state_tracker.keyframe_due
@@ -0,0 +1,89 @@
+import pytest
+
+from dlgr.griduniverse.scheduler import Interval, TickScheduler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestInterval(object):
+    def test_due_every_interval(self):
+        interval = Interval(1.0, start=0)
+        assert not interval.due(0.5)
+        assert interval.due(1.0)
+        assert not interval.due(1.5)
+        assert interval.due(2.0)
+
+    def test_missed_deadlines_are_skipped(self):
+        interval = Interval(1.0, start=0)
+        assert interval.due(5.5)
+        assert not interval.due(6.0)
+        assert interval.due(6.5)
+
+
+class TestTickScheduler(object):
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    def run(self, scheduler, ticks, tick=lambda now: None):
+        times = []
+
+        def record(now):
+            times.append(now)
+            tick(now)
+
+        scheduler.run(record, until=lambda: len(times) >= ticks)
+        return times
+
+    def test_ticks_at_fixed_rate(self, clock):
+        scheduler = TickScheduler(hz=10, clock=clock, sleep=clock.sleep)
+        times = self.run(scheduler, 3)
+        assert times == pytest.approx([100.0, 100.1, 100.2])
+        assert scheduler.stats["ticks"] == 3
+        assert scheduler.stats["overruns"] == 0
+
+    def test_catches_up_after_overrun(self, clock):
+        scheduler = TickScheduler(hz=10, clock=clock, sleep=clock.sleep)
+
+        def slow_first_tick(now):
+            if now == 100.0:
+                clock.now += 0.25
+
+        times = self.run(scheduler, 4, slow_first_tick)
+        # The ticks due during the slow one run immediately afterwards
+        assert times == pytest.approx([100.0, 100.25, 100.25, 100.3])
+        assert scheduler.stats["overruns"] == 2
+        assert scheduler.stats["skipped_ticks"] == 0
+
+    def test_skips_ticks_when_too_far_behind(self, clock):
+        scheduler = TickScheduler(hz=10, max_catch_up=2, clock=clock, sleep=clock.sleep)
+
+        def stalled_first_tick(now):
+            if now == 100.0:
+                clock.now += 1.0
+
+        times = self.run(scheduler, 3, stalled_first_tick)
+        assert times[1] == pytest.approx(101.0)
+        assert times[2] == pytest.approx(101.1)
+        assert scheduler.stats["skipped_ticks"] == 9
+
+    def test_phase_timing(self, clock):
+        scheduler = TickScheduler(hz=10, clock=clock, sleep=clock.sleep)
+
+        def tick(now):
+            with scheduler.phase("work"):
+                clock.now += 0.02
+
+        self.run(scheduler, 2, tick)
+        assert scheduler.timings["work"]["count"] == 2
+        assert scheduler.summary()["work"]["mean_ms"] == pytest.approx(20)
+        assert scheduler.summary()["work"]["max_ms"] == pytest.approx(20)
@@ -0,0 +1,95 @@
+import random
+
+import numpy
+import pytest
+
+from dlgr.griduniverse.experiment import gridworlds, read_game_config
+from dlgr.griduniverse.simulation import (
+    FoodSeekingPolicy,
+    RandomPolicy,
+    Simulation,
+    VirtualClock,
+)
+
+
+@pytest.fixture
+def game_config(item_config):
+    food = dict(
+        item_config[1], limit_quantity=False, item_count=30, maturation_threshold=0.0
+    )
+    return dict(read_game_config(), items=[food], transitions=[])
+
+
+def simulate(game_config, seed=1, **config):
+    config = dict({"time_per_round": 5.0, "num_rounds": 2}, **config)
+    return Simulation(
+        [FoodSeekingPolicy(), RandomPolicy()],
+        config=config,
+        game_config=game_config,
+        seed=seed,
+    )
+
+
+class TestSimulation(object):
+    def test_runs_game_on_virtual_clock(self, game_config):
+        summary = simulate(game_config).run()
+
+        assert summary["rounds"] == 2
+        assert summary["game_time"] >= 10.0
+        assert summary["ticks"] == round(summary["game_time"] * 10)
+        assert summary["moves"] > 0
+        assert set(summary["scores"]) == {1, 2}
+
+    def test_players_consume_food(self, game_config):
+        simulation = simulate(game_config, walls_density=0.0)
+        summary = simulation.run()
+        assert summary["items_consumed"] > 0
+        assert summary["average_score"] > 0
+
+    def test_seed_makes_games_reproducible(self, game_config):
+        first = simulate(game_config, seed=7).run()
+        second = simulate(game_config, seed=7).run()
+        assert first == second
+
+    def test_seed_leaves_global_random_state_alone(self, game_config):
+        random.seed(3)
+        numpy.random.seed(3)
+        expected = (random.random(), numpy.random.random())
+        random.seed(3)
+        numpy.random.seed(3)
+        simulate(game_config, seed=7).run(max_ticks=20)
+        assert (random.random(), numpy.random.random()) == expected
+
+    def test_items_mature_on_the_virtual_clock(self, game_config):
+        simulation = simulate(game_config)
+        item = next(iter(simulation.grid.item_locations.values()))
+        assert item.maturity == 0.0
+        simulation.clock.advance(100.0)
+        assert item.maturity == item.maturity_at(simulation.clock())
+
+    def test_max_ticks(self, game_config):
+        summary = simulate(game_config).run(max_ticks=3)
+        assert summary["ticks"] == 3
+        assert summary["rounds"] == 0
+
+    def test_each_simulation_has_its_own_grid(self, game_config, fresh_gridworld):
+        first = simulate(game_config)
+        second = simulate(game_config)
+        assert first.grid is not second.grid
+        assert len(gridworlds) == 0
+
+
+class TestFoodSeekingPolicy(object):
+    def test_stays_on_food(self, game_config):
+        grid = simulate(game_config, walls_density=0.0).grid
+        player = grid.players[1]
+        grid.spawn_item(position=tuple(player.position), item_id=1)
+        assert FoodSeekingPolicy().act(player, grid) is None
+
+
+class TestVirtualClock(object):
+    def test_only_moves_when_advanced(self):
+        clock = VirtualClock(start=10.0)
+        assert clock() == 10.0
+        clock.advance(0.5)
+        assert clock() == 10.5
@@ -0,0 +1,139 @@
+import datetime
+import json
+
+import pytest
+
+from dlgr.griduniverse.snapshots import (
+    SnapshotPolicy,
+    apply_snapshot,
+    compact_states,
+    delta_snapshot,
+)
+
+
+def item(id, position):
+    return {"id": id, "item_id": 1, "position": position, "maturity": 1.0}
+
+
+@pytest.mark.usefixtures("env")
+class TestSnapshotPolicy(object):
+    @pytest.fixture
+    def policy(self):
+        return SnapshotPolicy(interval=0.0, keyframe_interval=10.0)
+
+    def test_first_snapshot_is_keyframe(self, policy, gridworld):
+        gridworld.spawn_item(position=(1, 1))
+        details = policy.snapshot(gridworld, now=0)
+        assert details["keyframe"] is True
+        assert len(details["items"]) == 1
+        assert "walls" in details
+
+    def test_unchanged_grid_is_skipped(self, policy, gridworld):
+        policy.snapshot(gridworld, now=0)
+        assert policy.snapshot(gridworld, now=1) is None
+        assert policy.stats["skipped"] == 1
+
+    def test_delta_holds_item_changes(self, policy, gridworld):
+        gridworld.spawn_item(position=(1, 1))
+        policy.snapshot(gridworld, now=0)
+        gridworld.remove_item((1, 1))
+        gridworld.spawn_item(position=(2, 2))
+
+        details = policy.snapshot(gridworld, now=1)
+        assert "items" not in details
+        assert "walls" not in details
+        assert [i["position"] for i in details["items_changed"]] == [[2, 2]]
+        assert details["items_removed"] == [[1, 1]]
+        assert details["players"] == []
+
+    def test_player_changes_are_recorded(self, policy, gridworld):
+        player = gridworld.spawn_player(1)
+        policy.snapshot(gridworld, now=0)
+        player.score += 1
+
+        details = policy.snapshot(gridworld, now=1)
+        assert details["players"][0]["score"] == player.score
+
+    def test_keyframe_interval(self, policy, gridworld):
+        policy.snapshot(gridworld, now=0)
+        gridworld.spawn_item(position=(1, 1))
+        assert policy.snapshot(gridworld, now=10)["keyframe"] is True
+
+    def test_interval_limits_snapshots(self, gridworld):
+        policy = SnapshotPolicy(interval=1.0)
+        policy.snapshot(gridworld, now=0)
+        gridworld.spawn_item(position=(1, 1))
+        assert policy.snapshot(gridworld, now=0.5) is None
+        assert policy.snapshot(gridworld, now=1) is not None
+
+    def test_deltas_can_be_replayed(self, policy, gridworld):
+        gridworld.spawn_item(position=(1, 1))
+        keyframe = policy.snapshot(gridworld, now=0)
+        gridworld.remove_item((1, 1))
+        gridworld.spawn_item(position=(2, 2))
+        expected = gridworld.serialize()
+        delta = policy.snapshot(gridworld, now=1)
+
+        gridworld.deserialize(keyframe)
+        gridworld.deserialize(delta)
+        assert gridworld.serialize()["items"] == expected["items"]
+
+
+class TestSnapshotDetails(object):
+    def test_apply_delta(self):
+        state = {"players": [], "items": [item(1, [1, 1]), item(2, [2, 2])]}
+        merged = apply_snapshot(
+            state,
+            {
+                "players": [{"id": 1}],
+                "items_changed": [item(3, [3, 3])],
+                "items_removed": [[1, 1]],
+            },
+        )
+        assert merged["players"] == [{"id": 1}]
+        assert merged["items"] == [item(2, [2, 2]), item(3, [3, 3])]
+
+    def test_delta_round_trip(self):
+        previous = {"players": [], "round": 0, "items": [item(1, [1, 1])]}
+        state = {"players": [], "round": 1, "items": [item(2, [2, 2])]}
+        delta = delta_snapshot(previous, state)
+        assert "items" not in delta
+        assert apply_snapshot(previous, delta) == state
+
+    def test_no_change_gives_no_delta(self):
+        state = {"players": [], "round": 0, "items": [item(1, [1, 1])]}
+        assert delta_snapshot(state, dict(state)) is None
+
+
+@pytest.mark.usefixtures("env")
+class TestCompactStates(object):
+    def test_compacts_state_history(self, exp):
+        from dallinger.information import State
+
+        session = exp.socket_session
+        environment = exp.environment
+        start = datetime.datetime(2024, 1, 1)
+        full = {"players": [], "round": 0, "items": [item(1, [1, 1])], "walls": []}
+        history = [
+            full,
+            dict(full),
+            dict(full, items=[item(1, [1, 1]), item(2, [2, 2])]),
+            dict(full, round=1),
+        ]
+        for seconds, details in enumerate(history):
+            state = environment.update(json.dumps(details), details=details)
+            state.creation_time = start + datetime.timedelta(seconds=seconds * 4)
+            session.add(state)
+        session.commit()
+
+        stats = compact_states(session, keyframe_interval=10)
+
+        assert stats == {"keyframes": 2, "deltas": 1, "deleted": 1}
+        states = session.query(State).order_by(State.creation_time).all()
+        assert [s.details.get("keyframe", False) for s in states] == [
+            True,
+            False,
+            True,
+        ]
+        assert states[1].details["items_changed"] == [item(2, [2, 2])]
+        assert json.loads(states[1].contents) == states[1].details
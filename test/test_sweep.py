@@ -0,0 +1,125 @@
+import csv
+
+import pytest
+
+from dlgr.griduniverse.experiment import read_game_config
+from dlgr.griduniverse.sweep import main, param_grid, run_game, run_sweep
+
+
+@pytest.fixture
+def game_config(item_config):
+    food = dict(
+        item_config[1], limit_quantity=False, item_count=10, maturation_threshold=0.0
+    )
+    return dict(read_game_config(), items=[food], transitions=[])
+
+
+@pytest.fixture
+def params():
+    return {"time_per_round": [1.0, 2.0], "rows": [10], "columns": [10]}
+
+
+def read_rows(path):
+    with open(path, newline="") as results:
+        return list(csv.DictReader(results))
+
+
+class TestParamGrid(object):
+    def test_every_combination(self):
+        grid = param_grid({"b": [1, 2], "a": ["x", "y"]})
+        assert grid == [
+            {"a": "x", "b": 1},
+            {"a": "x", "b": 2},
+            {"a": "y", "b": 1},
+            {"a": "y", "b": 2},
+        ]
+
+    def test_no_params(self):
+        assert param_grid({}) == [{}]
+
+
+class TestRunGame(object):
+    def test_returns_params_and_metrics(self, game_config):
+        row = run_game(
+            {"time_per_round": 1.0, "rows": 10, "columns": 10},
+            3,
+            ["FoodSeekingPolicy"],
+            game_config,
+        )
+        assert row["time_per_round"] == 1.0
+        assert row["seed"] == 3
+        assert row["rounds"] == 1
+        assert "average_payoff" in row
+
+    def test_sets_item_properties(self, game_config):
+        run_game({"items.1.calories": 9}, 1, ["RandomPolicy"], game_config)
+        # The caller's game config is left alone
+        assert game_config["items"][0]["calories"] != 9
+
+
+class TestRunSweep(object):
+    def test_writes_a_row_per_game(self, tmpdir, game_config, params):
+        output = str(tmpdir.join("results.csv"))
+        count = run_sweep(
+            params, [1, 2], ["RandomPolicy"], output, game_config, workers=0
+        )
+        assert count == 4
+        rows = read_rows(output)
+        assert len(rows) == 4
+        assert {(row["time_per_round"], row["seed"]) for row in rows} == {
+            ("1.0", "1"),
+            ("1.0", "2"),
+            ("2.0", "1"),
+            ("2.0", "2"),
+        }
+
+    def test_resumes_skipping_finished_games(self, tmpdir, game_config, params):
+        output = str(tmpdir.join("results.csv"))
+        run_sweep(params, [1], ["RandomPolicy"], output, game_config, workers=0)
+        count = run_sweep(
+            params, [1, 2], ["RandomPolicy"], output, game_config, workers=0
+        )
+        assert count == 2
+        assert len(read_rows(output)) == 4
+
+    def test_restart_overwrites_results(self, tmpdir, game_config, params):
+        output = str(tmpdir.join("results.csv"))
+        run_sweep(params, [1], ["RandomPolicy"], output, game_config, workers=0)
+        count = run_sweep(
+            params,
+            [1],
+            ["RandomPolicy"],
+            output,
+            game_config,
+            workers=0,
+            resume=False,
+        )
+        assert count == 2
+        assert len(read_rows(output)) == 2
+
+    def test_refuses_results_of_another_sweep(self, tmpdir, game_config, params):
+        output = str(tmpdir.join("results.csv"))
+        run_sweep(params, [1], ["RandomPolicy"], output, game_config, workers=0)
+        with pytest.raises(ValueError):
+            run_sweep({"rows": [10]}, [1], [], output, game_config, workers=0)
+
+    def test_runs_games_in_processes(self, tmpdir, game_config, params):
+        output = str(tmpdir.join("results.csv"))
+        run_sweep(params, [1], ["RandomPolicy"], output, game_config, workers=2)
+        assert len(read_rows(output)) == 2
+
+
+class TestMain(object):
+    def test_runs_sweep_from_yaml(self, tmpdir):
+        spec = tmpdir.join("sweep.yml")
+        spec.write(
+            "seeds: 2\n"
+            "policies: [RandomPolicy]\n"
+            "params:\n"
+            "  time_per_round: [1.0]\n"
+            "  rows: [25]\n"
+            "  columns: [25]\n"
+        )
+        output = str(tmpdir.join("results.csv"))
+        main([str(spec), "--output", output, "--workers", "0"])
+        assert [row["seed"] for row in read_rows(output)] == ["0", "1"]
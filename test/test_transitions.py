@@ -6,7 +6,7 @@ class TestPickupDrop(object):
 
     @pytest.fixture(scope="function")
     def mocked_exp(self, exp):
-        def publish(error_msg):
+        def publish(error_msg, room=None, channel=None):
             self.messages.append(error_msg)
 
         exp.publish = publish
@@ -59,7 +59,7 @@ class TestHandleItemTransition(object):
 
     @pytest.fixture(scope="function")
     def mocked_exp(self, exp):
-        def publish(error_msg):
+        def publish(error_msg, room=None, channel=None):
             self.messages.append(error_msg)
 
         exp.publish = publish
@@ -71,7 +71,7 @@ class TestHandleItemTransition(object):
         stone = create_item(**mocked_exp.item_config["stone"])
         assert stone.name == "Stone"
         assert big_hard_rock.name == "Big Hard Rock"
-        mocked_exp.grid.item_locations[(0, 0)] = big_hard_rock
+        mocked_exp.grid.add_item(big_hard_rock, (0, 0))
         player.current_item = stone
         mocked_exp.handle_item_transition(
             msg={"player_id": player.id, "position": (0, 0)}
@@ -95,7 +95,7 @@ class TestHandleItemTransition(object):
         }
         big_hard_rock = create_item(**mocked_exp.item_config["big_hard_rock"])
         stone = create_item(**mocked_exp.item_config["stone"])
-        mocked_exp.grid.item_locations[(0, 0)] = big_hard_rock
+        mocked_exp.grid.add_item(big_hard_rock, (0, 0))
         player.current_item = stone
 
         mocked_exp.handle_item_transition(
@@ -113,7 +113,7 @@ class TestHandleItemTransition(object):
         gooseberry_bush = create_item(**mocked_exp.item_config["gooseberry_bush"])
         assert gooseberry_bush.name == "Gooseberry Bush"
         assert gooseberry_bush.remaining_uses == 6
-        mocked_exp.grid.item_locations[(0, 0)] = gooseberry_bush
+        mocked_exp.grid.add_item(gooseberry_bush, (0, 0))
         player.current_item = None
         mocked_exp.handle_item_transition(
             msg={"player_id": player.id, "position": (0, 0)}
@@ -133,7 +133,7 @@ class TestHandleItemTransition(object):
         # Reduce the remaining uses
         gooseberry_bush.remaining_uses = 1
         assert gooseberry_bush.name == "Gooseberry Bush"
-        mocked_exp.grid.item_locations[(0, 0)] = gooseberry_bush
+        mocked_exp.grid.add_item(gooseberry_bush, (0, 0))
         player.current_item = None
         mocked_exp.handle_item_transition(
             msg={"player_id": player.id, "position": (0, 0)}
@@ -152,7 +152,7 @@ class TestHandleItemTransition(object):
 
     def test_handle_item_transition_multiple_actors_error(self, mocked_exp, player):
         stone = create_item(**mocked_exp.item_config["stone"])
-        mocked_exp.grid.item_locations[(2, 2)] = stone
+        mocked_exp.grid.add_item(stone, (2, 2))
         mocked_exp.grid.players[player.id].position = [2, 2]
         mocked_exp.transition_config = TRANSITION_CONFIG
 
@@ -168,7 +168,7 @@ class TestHandleItemTransition(object):
         mocked_exp.transition_config = TRANSITION_CONFIG
         other_player = create_player(mocked_exp, a)
         stone = create_item(**mocked_exp.item_config["stone"])
-        mocked_exp.grid.item_locations[(2, 2)] = stone
+        mocked_exp.grid.add_item(stone, (2, 2))
         player.position = [2, 2]
         mocked_exp.handle_item_transition(
             msg={"player_id": player.id, "position": (2, 2)}
@@ -189,7 +189,7 @@ class TestHandleItemTransition(object):
         other_player = create_player(mocked_exp, a)
         player.current_item = create_item(**mocked_exp.item_config["sharp_stone"])
         stag = create_item(**mocked_exp.item_config["stag"])
-        mocked_exp.grid.item_locations[(2, 2)] = stag
+        mocked_exp.grid.add_item(stag, (2, 2))
         player.position = [2, 2]
         other_player.position = [2, 1]
         mocked_exp.handle_item_transition(
@@ -206,7 +206,7 @@ class TestHandleItemConsume(object):
 
     @pytest.fixture(scope="function")
     def mocked_exp(self, exp):
-        def publish(error_msg):
+        def publish(error_msg, room=None, channel=None):
             self.messages.append(error_msg)
 
         exp.publish = publish
@@ -262,7 +262,7 @@ class TestHandleItemConsume(object):
 @pytest.fixture
 def item(exp):
     item = create_item()
-    exp.grid.item_locations[(0, 0)] = item
+    exp.grid.add_item(item, (0, 0))
     return item
 
 